@@ -0,0 +1,338 @@
+"""
+Benchmark and accuracy-regression suite for the evaluator, the range parser and the equity engines.
+
+    python -m benchmarks.benchmark_suite                    # run, compare with baseline.json
+    python -m benchmarks.benchmark_suite --update-baseline  # run and store the results as the new baseline
+    python -m benchmarks.benchmark_suite --quick            # smaller workloads, no 7-card histogram
+
+Accuracy checks compare against references computed independently of the code under test: the published
+5-card (and, with numpy, 7-card) hand category histograms over every hand, and equities of reference
+matchups enumerated naively, pair of combinations by pair and runout by runout (brute_force_equity). Exact
+enumeration must match them and fixed-seed Monte Carlo fall within a few standard errors of them; seeded
+results must also reproduce the baseline exactly (a changed result means the sampling changed: check it,
+then update the baseline). Any accuracy failure exits with status 1.
+Throughput (evaluations/s, simulations/s) and peak memory are reported per engine and compared with the
+baseline; a throughput below baseline * (1 - tolerance) also fails, unless --no-perf-check is given
+(baselines are machine specific).
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+from itertools import combinations
+from math import comb
+
+from pypoker.utils import DECK, Hand
+from pypoker.analysis_tools.hand_evaluator import HandEvaluator
+from pypoker.analysis_tools.lookup_tables import evaluate_ids
+from pypoker.analysis_tools.range_parser import COMBO_CARDS, Range, RangeParser
+from pypoker.analysis_tools.range_vs_range_equity import EquityCalculator
+
+try:
+    import numpy as np
+    from pypoker.analysis_tools import numpy_backend
+except ImportError:  # The numpy engines are skipped without numpy
+    np = None
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+SEED = 20240601
+
+# Number of hands in each category (High Card ... Royal Flush) over all 5 and all 7 card hands
+HISTOGRAM_5 = [1302540, 1098240, 123552, 54912, 10200, 5108, 3744, 624, 36, 4]
+HISTOGRAM_7 = [23294460, 58627800, 31433400, 6461620, 6180020, 4047644, 3473184, 224848, 37260, 4324]
+
+# (name, range1, range2, board); the first three are the main.py examples
+EXACT_MATCHUPS = [
+    ('main_flop', "AKs, AQs, KQs, QJs", "AQo, KQo, JTs, T9s", "AhKhQd"),
+    ('main_turn', "JJ+, ATs+, KQs", "TT, 99, 88, AQo", "AsKd7c5h"),
+    ('set_vs_flush_draw', "77, 22", "AhQh, KhJh, Th9h", "7h2h4c"),
+    ('wide_vs_wide_turn', "22+, A2s+, K9s+, QTs+, JTs, ATo+, KJo+", "55+, A9s+, KTs+, AJo+, KQo", "Td8c3s2h"),
+    ('weighted_turn', "QQ+, AKs:0.5", "JJ+, AQo:0.5, KQs:0.25", "Ah7d2c5s"),
+]
+# (name, ranges, board, simulations); Monte Carlo scenarios timed per engine
+SIMULATION_SCENARIOS = [
+    ('main_preflop', ["AA, KK, QQ", "AKs, AKo, AQs, AQo"], '', 10000),
+    ('main_flop', ["AKs, AQs, KQs, QJs", "AQo, KQo, JTs, T9s"], 'AhKhQd', 10000),
+    ('main_turn', ["JJ+, ATs+, KQs", "TT, 99, 88, AQo"], 'AsKd7c5h', 10000),
+    ('wide_vs_wide_preflop', ["22+, A2s+, K9s+, QTs+, JTs, ATo+, KJo+", "55+, A9s+, KTs+, AJo+, KQo"], '', 20000),
+    ('multiway_6_preflop', ["QQ+, AKs", "JJ-99, AQs", "88-66, KQs", "A5s-A2s", "KJo+", "T9s, 98s, 87s"], '', 10000),
+    ('multiway_3_flop', ["TT+, AKs", "AQs, KQs, JTs", "99-66"], 'Td8c3s', 10000),
+]
+# evaluate_hand/s of the evaluator before the lookup tables (rank counting on Card objects), measured on the
+# machine of baseline.json; the report gives every evaluator's throughput as a multiple of it
+ORIGINAL_EVALUATE_HAND_PER_SECOND = 88000
+EVALUATORS = ('evaluate_hand', 'hand_strength', 'evaluate_ids', 'evaluate_batch_numpy')
+WIDE_RANGE = "22+, A2s+, K2s+, Q6s+, J7s+, T7s+, 97s+, 86s+, 76s, 65s, A2o+, K8o+, Q9o+, J9o+, T9o"
+
+
+def timed(function, *args, **kwargs):
+    """
+    Return (result, seconds, peak bytes allocated) of a call. The call is timed on its own and then repeated
+    under tracemalloc for its memory, since tracing slows Python code down.
+    """
+    started = time.perf_counter()
+    result = function(*args, **kwargs)
+    elapsed = time.perf_counter() - started
+    tracemalloc.start()
+    function(*args, **kwargs)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def histogram_5() -> list:
+    """Category histogram of every 5 card hand, with the pure Python evaluator."""
+    counts = [0] * 10
+    for hand in combinations(range(52), 5):
+        counts[evaluate_ids(hand) >> 20] += 1
+    return counts
+
+
+def histogram_7() -> list:
+    """
+    Category histogram of every 7 card hand, with the numpy evaluator. Hands are enumerated by their two
+    lowest cards; the other five come from a colex-ordered list of 5-subsets, whose subsets of range(m)
+    form a prefix.
+    """
+    subsets = np.array(list(combinations(range(50), 5)), dtype=np.int64)
+    subsets = subsets[np.lexsort(subsets.T)]  # Colex order: sorted by the largest element first
+    counts = np.zeros(10, dtype=np.int64)
+    for low in range(52):
+        for second in range(low + 1, 47):
+            remaining = 51 - second
+            rest = 51 - subsets[:comb(remaining, 5)]
+            cards = np.concatenate([np.full((len(rest), 2), (low, second), dtype=np.int64), rest], axis=1)
+            counts += np.bincount(numpy_backend.evaluate_batch(cards) >> 20, minlength=10)
+    return counts.tolist()
+
+
+def brute_force_equity(range1: str, range2: str, board: str) -> dict:
+    """
+    Reference equity of range1 against range2 on a flop or turn board, in the calculators' result format
+    (percentages), enumerated naively: every runout and every pair of combinations holding distinct cards,
+    each hand scored on its own by evaluate_ids and each pair weighted by the product of its range weights.
+    It shares nothing with the calculators but the 7 card evaluator, which check_accuracy tests against the
+    best of its 5 card subsets.
+    """
+    board_ids = Hand.from_string(board).ids
+    sides = []
+    for notation in (range1, range2):
+        hand_range = Range.parse(notation)
+        sides.append([(card1, card2, hand_range.weight(card1, card2)) for card1, card2 in COMBO_CARDS
+                      if hand_range.weight(card1, card2) > 0 and card1 not in board_ids and card2 not in board_ids])
+    pairs = [(hand1, hand2) for hand1 in sides[0] for hand2 in sides[1]
+             if not {hand1[0], hand1[1]} & {hand2[0], hand2[1]}]
+    wins1 = wins2 = ties = total = 0.0
+    for runout in combinations([card for card in range(52) if card not in board_ids], 5 - len(board_ids)):
+        cards = board_ids + list(runout)
+        strengths = {}
+        for hand1, hand2 in pairs:
+            if hand1[0] in runout or hand1[1] in runout or hand2[0] in runout or hand2[1] in runout:
+                continue
+            for card1, card2, _ in (hand1, hand2):
+                if (card1, card2) not in strengths:
+                    strengths[card1, card2] = evaluate_ids(cards + [card1, card2])
+            strength1, strength2 = strengths[hand1[:2]], strengths[hand2[:2]]
+            weight = hand1[2] * hand2[2]
+            total += weight
+            if strength1 > strength2:
+                wins1 += weight
+            elif strength1 < strength2:
+                wins2 += weight
+            else:
+                ties += weight
+    return {'range1': (wins1 + ties / 2) / total * 100, 'range2': (wins2 + ties / 2) / total * 100,
+            'ties': ties / total * 100}
+
+
+def calculate_equity(calculator: EquityCalculator, range1: str, range2: str, board: str, num_simulations: int,
+                     exact: bool) -> dict:
+    """Equity of range1 against range2 on board ('' preflop) through the calculator's public methods."""
+    if not board:
+        return calculator.calculate_preflop_equity(range1, range2, num_simulations)
+    if len(board) == 6:
+        return calculator.calculate_flop_equity(range1, range2, board, num_simulations, exact=exact)
+    return calculator.calculate_turn_equity(range1, range2, board, num_simulations, exact=exact)
+
+
+def check_accuracy(quick: bool) -> dict:
+    """Run the accuracy checks; returns {'checks': {name: details}, 'failures': [messages]}."""
+    checks, failures = {}, []
+
+    def check(name, ok, **details):
+        checks[name] = dict(details, ok=bool(ok))
+        if not ok:
+            failures.append(f"{name}: {details}")
+
+    counts = histogram_5()
+    check('histogram_5', counts == HISTOGRAM_5, counts=counts)
+    if np is not None and not quick:
+        counts = histogram_7()
+        check('histogram_7', counts == HISTOGRAM_7, counts=counts)
+
+    # A 7 card hand is worth its best 5 card subset; the numpy evaluator must agree with the Python one
+    rng = random.Random(SEED)
+    mismatches = 0
+    for _ in range(2000 if quick else 20000):
+        cards = rng.sample(DECK, 7)
+        ids = [card.id for card in cards]
+        if HandEvaluator.hand_strength(cards) != max(evaluate_ids(hand) for hand in combinations(ids, 5)):
+            mismatches += 1
+        if np is not None and int(numpy_backend.evaluate_batch(np.array([ids]))[0]) != evaluate_ids(ids):
+            mismatches += 1
+    check('evaluator_backends_agree', mismatches == 0, mismatches=mismatches)
+
+    expansions = {'ATs+': 16, 'KTo+': 36, '22-55': 24, 'A2s-A5s': 16, 'AK': 16, 'AhKh': 1, 'TT+, AKs:0.5': 34}
+    sizes = {notation: len(Range.parse(notation)) for notation in expansions}
+    check('range_notation', sizes == expansions, sizes=sizes)
+
+    calculator = EquityCalculator(seed=SEED, preflop_table=None, cache_size=0)
+    exact = {}
+    for name, range1, range2, board in EXACT_MATCHUPS:
+        reference = brute_force_equity(range1, range2, board)
+        result = calculate_equity(calculator, range1, range2, board, 0, exact=True)
+        exact[name] = result
+        difference = max(abs(result[key] - reference[key]) for key in ('range1', 'range2', 'ties'))
+        check(f'exact_{name}', difference < 1e-9, equity=result['range1'], reference=reference['range1'])
+
+        # Fixed-seed Monte Carlo must agree with the reference within 4 standard errors
+        for backend in ('python', 'numpy') if np is not None else ('python',):
+            simulated = calculate_equity(EquityCalculator(backend=backend, seed=SEED, preflop_table=None, cache_size=0),
+                                         range1, range2, board, 40000, exact=False)
+            stderr = 100 * (0.25 / simulated['simulations']) ** 0.5
+            check(f'simulated_{name}_{backend}', abs(simulated['range1'] - reference['range1']) < 4 * stderr,
+                  equity=simulated['range1'], reference=reference['range1'])
+    calculator.close()
+    return {'checks': checks, 'failures': failures, 'exact_matchups': exact}
+
+
+def run_benchmarks(quick: bool) -> dict:
+    """Throughput and peak memory of every engine; returns {benchmark name: metrics}."""
+    results = {}
+    scale = 0.1 if quick else 1
+    rng = random.Random(SEED)
+
+    hands = [rng.sample(DECK, 7) for _ in range(int(50000 * scale))]
+    _, elapsed, peak = timed(lambda: [HandEvaluator.evaluate_hand(hand) for hand in hands])
+    results['evaluate_hand'] = {'per_second': len(hands) / elapsed, 'peak_bytes': peak}
+    _, elapsed, peak = timed(lambda: [HandEvaluator.hand_strength(hand) for hand in hands])
+    results['hand_strength'] = {'per_second': len(hands) / elapsed, 'peak_bytes': peak}
+    id_hands = [[card.id for card in hand] for hand in hands]
+    _, elapsed, peak = timed(lambda: [evaluate_ids(hand) for hand in id_hands])
+    results['evaluate_ids'] = {'per_second': len(id_hands) / elapsed, 'peak_bytes': peak}
+    if np is not None:
+        batch = np.array([rng.sample(range(52), 7) for _ in range(int(200000 * scale))])
+        _, elapsed, peak = timed(numpy_backend.evaluate_batch, batch)
+        results['evaluate_batch_numpy'] = {'per_second': len(batch) / elapsed, 'peak_bytes': peak}
+
+    notations = [WIDE_RANGE, "22+, ATs+, KTo+", "QQ+, AKs:0.5, AhKh", "A2s-A5s, 22-55, KQ"]
+    repeats = int(200 * scale) or 1
+    _, elapsed, peak = timed(lambda: [Range.parse.__wrapped__(notation) for _ in range(repeats)
+                                      for notation in notations])
+    results['range_parse_uncached'] = {'per_second': repeats * len(notations) / elapsed, 'peak_bytes': peak}
+    _, elapsed, peak = timed(lambda: [RangeParser.generate_combinations(notation) for _ in range(repeats)
+                                      for notation in notations])
+    results['generate_combinations'] = {'per_second': repeats * len(notations) / elapsed, 'peak_bytes': peak}
+
+    for backend in ('python', 'numpy') if np is not None else ('python',):
+        for name, ranges, board, num_simulations in SIMULATION_SCENARIOS:
+            num_simulations = int(num_simulations * scale)
+            calculator = EquityCalculator(backend=backend, seed=SEED, preflop_table=None, cache_size=0)
+            if len(ranges) == 2:
+                call = (calculate_equity, calculator, ranges[0], ranges[1], board, num_simulations, False)
+            else:
+                call = (calculator.calculate_equity, ranges, board, num_simulations)
+            result, elapsed, peak = timed(*call)
+            results[f'{name}_{backend}'] = {'per_second': result['simulations'] / elapsed, 'peak_bytes': peak,
+                                            'range1': result['range1']}
+            calculator.close()
+
+    calculator = EquityCalculator(seed=SEED, preflop_table=None, cache_size=0)
+    result, elapsed, peak = timed(calculator.calculate_flop_equity, WIDE_RANGE, "55+, A9s+, KTs+, AJo+, KQo",
+                                  "Td8c3s", exact=True)
+    results['exact_wide_flop'] = {'per_second': result['simulations'] / elapsed, 'peak_bytes': peak}
+    return results
+
+
+def compare_performance(results: dict, baseline: dict, tolerance: float) -> list:
+    """Benchmarks whose throughput fell below baseline * (1 - tolerance)."""
+    failures = []
+    for name, metrics in results.items():
+        reference = baseline.get('benchmarks', {}).get(name)
+        if reference and metrics['per_second'] < reference['per_second'] * (1 - tolerance):
+            failures.append(f"{name}: {metrics['per_second']:.0f}/s, baseline {reference['per_second']:.0f}/s")
+    return failures
+
+
+def compare_seeded(results: dict, baseline: dict) -> list:
+    """Fixed-seed simulations whose result differs from the baseline, i.e. whose sampling has changed."""
+    failures = []
+    for name, metrics in results.items():
+        reference = baseline.get('benchmarks', {}).get(name, {}).get('range1')
+        if reference is not None and 'range1' in metrics and abs(metrics['range1'] - reference) > 1e-9:
+            failures.append(f"{name}: seeded equity {metrics['range1']}, baseline {reference}")
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark and accuracy-regression suite.")
+    parser.add_argument('--quick', action='store_true', help="Smaller workloads and no 7-card histogram.")
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--update-baseline', action='store_true', help="Store this run as the baseline.")
+    parser.add_argument('--tolerance', type=float, default=0.5,
+                        help="Allowed relative throughput drop before a benchmark fails (default 0.5).")
+    parser.add_argument('--no-perf-check', action='store_true', help="Report throughput without failing on it.")
+    parser.add_argument('--json', default=None, help="Also write the full report to this file.")
+    args = parser.parse_args(argv)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    accuracy = check_accuracy(args.quick)
+    for name, details in accuracy['checks'].items():
+        print(f"{'ok  ' if details['ok'] else 'FAIL'} {name}")
+    benchmarks = run_benchmarks(args.quick)
+    print(f"\n{'benchmark':32} {'per second':>14} {'peak memory':>14}")
+    for name, metrics in benchmarks.items():
+        print(f"{name:32} {metrics['per_second']:14,.0f} {metrics['peak_bytes'] / 1024:11,.0f} KiB")
+
+    failures = list(accuracy['failures'])
+    if not args.quick and not args.update_baseline:
+        failures += compare_seeded(benchmarks, baseline)
+        if not args.no_perf_check:
+            failures += compare_performance(benchmarks, baseline, args.tolerance)
+
+    speedups = {name: benchmarks[name]['per_second'] / ORIGINAL_EVALUATE_HAND_PER_SECOND
+                for name in EVALUATORS if name in benchmarks}
+    print("\nSpeedup over the original evaluator: "
+          + ', '.join(f"{name} {speedup:.1f}x" for name, speedup in speedups.items()))
+    report = {'benchmarks': benchmarks, 'evaluator_speedup': speedups}
+    if args.json:
+        exact = {name: {'range1': result['range1'], 'ties': result['ties']}
+                 for name, result in accuracy['exact_matchups'].items()}
+        with open(args.json, 'w') as f:
+            json.dump(dict(report, exact_matchups=exact, checks=accuracy['checks']), f, indent=1)
+    if args.update_baseline:
+        if accuracy['failures']:
+            print("\nNot updating the baseline: accuracy checks failed.", file=sys.stderr)
+        elif args.quick:
+            print("\nNot updating the baseline from a --quick run.", file=sys.stderr)
+        else:
+            with open(args.baseline, 'w') as f:
+                json.dump(report, f, indent=1, sort_keys=True)
+                f.write('\n')
+            print(f"\nWrote {args.baseline}")
+
+    if failures:
+        print("\nRegressions:", *failures, sep='\n  ', file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,130 @@
+import json
+import os
+import sys
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+COLUMNAR_VERSION = 1
+META_FILENAME = 'meta.json'
+
+
+class ColumnarWriter:
+    """
+    Append-only table stored as a directory holding one raw binary file per column (the items of an
+    array.array of that column's typecode) and a meta.json file with the column types and the number of
+    committed rows. Rows are buffered and only become part of the table on flush(), which writes the column
+    files first and the metadata last, so an interrupted run leaves at most some uncommitted bytes that are
+    cut off when the table is reopened, and work can resume from `rows`.
+    """
+
+    def __init__(self, path: str, columns: Dict[str, str], metadata: Optional[Dict] = None):
+        """
+        columns: column name -> array typecode, e.g. {'equity': 'd', 'weight': 'H'}.
+        metadata: JSON-serializable description of what the table holds. Reopening an existing table with
+                  different columns or metadata raises ValueError instead of mixing two runs.
+        """
+        self.path = path
+        self.columns = dict(columns)
+        self.metadata = metadata or {}
+        self._buffers = {name: array(typecode) for name, typecode in self.columns.items()}
+        os.makedirs(path, exist_ok=True)
+
+        existing = read_metadata(path)
+        if existing is None:
+            self.rows = 0
+            self._write_metadata()
+        else:
+            if existing['columns'] != self.columns or existing['metadata'] != self.metadata:
+                raise ValueError(f"{path} holds a different table; use another path or remove it.")
+            self.rows = existing['rows']
+        for name in self.columns:
+            with open(self._column_path(name), 'ab') as f:
+                f.truncate(self.rows * self._buffers[name].itemsize)
+
+    def _column_path(self, name: str) -> str:
+        return os.path.join(self.path, f"{name}.bin")
+
+    def append(self, row: Tuple):
+        """Buffer one row, given as values in column order."""
+        for buffer, value in zip(self._buffers.values(), row):
+            buffer.append(value)
+
+    def flush(self):
+        """Write the buffered rows to the column files, then commit them in the metadata."""
+        num_rows = len(next(iter(self._buffers.values()))) if self._buffers else 0
+        if not num_rows:
+            return
+        for name, buffer in self._buffers.items():
+            with open(self._column_path(name), 'ab') as f:
+                buffer.tofile(f)
+                f.flush()
+                os.fsync(f.fileno())
+            del buffer[:]
+        self.rows += num_rows
+        self._write_metadata()
+
+    def truncate(self, rows: int):
+        """
+        Drop the buffered rows and the committed rows from index rows on, e.g. to realign tables that are
+        committed one after the other. The metadata is updated first, so an interruption only leaves bytes
+        that reopening the table cuts off.
+        """
+        if not 0 <= rows <= self.rows:
+            raise ValueError(f"Cannot truncate a table of {self.rows} rows to {rows} rows.")
+        for buffer in self._buffers.values():
+            del buffer[:]
+        self.rows = rows
+        self._write_metadata()
+        for name, buffer in self._buffers.items():
+            with open(self._column_path(name), 'ab') as f:
+                f.truncate(rows * buffer.itemsize)
+
+    def _write_metadata(self):
+        meta = {'version': COLUMNAR_VERSION, 'byteorder': sys.byteorder, 'rows': self.rows,
+                'columns': self.columns, 'metadata': self.metadata}
+        tmp_path = os.path.join(self.path, f"{META_FILENAME}.{os.getpid()}.tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f, indent=1)
+        os.replace(tmp_path, os.path.join(self.path, META_FILENAME))
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def read_metadata(path: str) -> Optional[Dict]:
+    """The meta.json content of a columnar table, or None if there is no table at path."""
+    try:
+        with open(os.path.join(path, META_FILENAME)) as f:
+            meta = json.load(f)
+    except FileNotFoundError:
+        return None
+    if meta.get('version') != COLUMNAR_VERSION:
+        raise ValueError(f"Unsupported columnar table version {meta.get('version')!r} in {path}.")
+    return meta
+
+
+def read_columns(path: str, names: Optional[List[str]] = None, start: int = 0) -> Tuple[Dict, Dict[str, array]]:
+    """
+    Return (metadata, {column name: array}) of the committed rows of a table from row start on, all columns
+    by default.
+    """
+    meta = read_metadata(path)
+    if meta is None:
+        raise FileNotFoundError(f"No columnar table in {path}.")
+    columns = {}
+    for name in names or list(meta['columns']):
+        values = array(meta['columns'][name])
+        start = min(start, meta['rows'])
+        with open(os.path.join(path, f"{name}.bin"), 'rb') as f:
+            f.seek(start * values.itemsize)
+            values.fromfile(f, meta['rows'] - start)
+        if meta['byteorder'] != sys.byteorder:
+            values.byteswap()
+        columns[name] = values
+    return meta['metadata'], columns
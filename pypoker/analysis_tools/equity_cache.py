@@ -0,0 +1,143 @@
+import hashlib
+import shelve
+from collections import OrderedDict
+from itertools import permutations
+from typing import Dict, Optional, Tuple
+
+from pypoker.utils import combo_index
+
+# Every relabelling of the four suits; equity is unchanged when the same one is applied to ranges and board.
+SUIT_PERMUTATIONS = list(permutations(range(4)))
+# Two permutations generating all the others: a transposition and a 4-cycle
+_GENERATORS = [SUIT_PERMUTATIONS.index((1, 0, 2, 3)), SUIT_PERMUTATIONS.index((1, 2, 3, 0))]
+
+
+def permute_card(card_id: int, permutation) -> int:
+    """Return the card of the same rank in the suit the permutation maps this card's suit to."""
+    return card_id - card_id % 4 + permutation[card_id % 4]
+
+
+# _COMBO_PERMUTATIONS[p][i] is the index of combination i once suit permutation p is applied
+_COMBO_PERMUTATIONS = []
+for _permutation in SUIT_PERMUTATIONS:
+    _mapping = [0] * 1326
+    for _card1 in range(52):
+        for _card2 in range(_card1 + 1, 52):
+            _mapping[combo_index(_card1, _card2)] = combo_index(permute_card(_card1, _permutation),
+                                                                permute_card(_card2, _permutation))
+    _COMBO_PERMUTATIONS.append(_mapping)
+
+
+def _range_key(combo_indices, permutation_index: int, weights=None) -> Tuple:
+    mapping = _COMBO_PERMUTATIONS[permutation_index]
+    if weights is None:
+        return tuple(sorted([mapping[index] for index in combo_indices]))
+    return tuple(sorted([(mapping[index], weight) for index, weight in zip(combo_indices, weights)]))
+
+
+def is_suit_symmetric(combinations, weights=None) -> bool:
+    """
+    Whether a range (list of (card1 id, card2 id, mask) tuples, with optional weights) is unchanged by every
+    suit relabelling.
+    """
+    indices = [combo_index(card1, card2) for card1, card2, _ in combinations]
+    key = _range_key(indices, 0, weights)  # Permutation 0 is the identity
+    return all(_range_key(indices, generator, weights) == key for generator in _GENERATORS)
+
+
+def canonical_board(board_ids) -> Tuple[int, ...]:
+    """The smallest sorted board among all suit relabellings of board_ids."""
+    return min(tuple(sorted(permute_card(card_id, permutation) for card_id in board_ids))
+               for permutation in SUIT_PERMUTATIONS)
+
+
+def canonical_query(ranges_combinations, board_ids, ranges_weights=None) -> Tuple:
+    """
+    Return a key that is identical for two queries exactly when one is the other with its suits relabelled,
+    e.g. ranges on AhKhQd and on AsKsQc. ranges_combinations holds one list of (card1 id, card2 id, mask)
+    tuples per range, in player order, and ranges_weights optionally the matching weights (None for a range
+    whose combinations all weigh 1).
+    The key is the smallest (board, range1, range2, ...) over all 24 suit permutations; only the permutations
+    giving the smallest board are tried on the ranges, and suit-symmetric ranges (anything written without
+    explicit suits) are left as they are.
+    """
+    boards = [tuple(sorted(permute_card(card_id, permutation) for card_id in board_ids))
+              for permutation in SUIT_PERMUTATIONS]
+    board_key = min(boards)
+    candidates = [p for p, board in enumerate(boards) if board == board_key]
+
+    range_keys = []
+    for combinations, weights in zip(ranges_combinations, ranges_weights or [None] * len(ranges_combinations)):
+        indices = [combo_index(card1, card2) for card1, card2, _ in combinations]
+        key = _range_key(indices, 0, weights)
+        symmetric = all(_range_key(indices, generator, weights) == key for generator in _GENERATORS)
+        range_keys.append((key, indices, weights, symmetric))
+
+    if all(symmetric for *_, symmetric in range_keys):
+        return (board_key,) + tuple(key for key, *_ in range_keys)
+    return min((board_key,) + tuple(key if symmetric else _range_key(indices, p, weights)
+                                    for key, indices, weights, symmetric in range_keys)
+               for p in candidates)
+
+
+class EquityCache:
+    """
+    Bounded LRU cache of equity results with hit/miss/eviction counters,
+    optionally backed by a persistent on-disk store (a shelve file) that survives restarts.
+    """
+
+    def __init__(self, maxsize: int = 1024, path: Optional[str] = None):
+        self.maxsize = maxsize
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._store = shelve.open(path) if path else None
+
+    def get(self, key) -> Optional[Dict[str, float]]:
+        """Return a copy of the cached result for key, or None."""
+        result = self._entries.get(key)
+        if result is not None:
+            self._entries.move_to_end(key)
+        elif self._store is not None:
+            result = self._store.get(self._store_key(key))
+            if result is not None:
+                self._remember(key, result)
+        if result is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return dict(result)
+
+    def put(self, key, result: Dict[str, float]):
+        self._remember(key, dict(result))
+        if self._store is not None:
+            self._store[self._store_key(key)] = dict(result)
+
+    def _remember(self, key, result):
+        if self.maxsize <= 0:
+            return
+        self._entries[key] = result
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    @staticmethod
+    def _store_key(key) -> str:
+        return hashlib.sha256(repr(key).encode()).hexdigest()
+
+    def info(self) -> Dict[str, int]:
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'size': len(self._entries), 'maxsize': self.maxsize}
+
+    def clear(self):
+        """Drop the in-memory entries and reset the counters (the on-disk store is kept)."""
+        self._entries.clear()
+        self.hits = self.misses = self.evictions = 0
+
+    def close(self):
+        if self._store is not None:
+            self._store.close()
+            self._store = None
@@ -0,0 +1,231 @@
+"""
+Equity distributions of every two card combination on a board, for card abstraction and range analysis.
+
+For a flop or turn board and an opposing range, the distribution of a combination is the histogram of its
+equity against the range on the completed board over every runout to the river (one histogram per row,
+indexed by utils.combo_index; combinations sharing a card with the board are all zero). All 1,326 rows are
+computed together: each runout is ranked once for every live combination, the combinations are sorted by
+strength, and cumulative weights of the range (in total and per card, to take out the range combinations
+that share a card with the hero combination) give every combination's wins and ties in a few array
+operations. Runouts are split across processes, and results are cached on disk keyed by the canonical board
+under suit relabelling (with the range relabelled the same way), so isomorphic boards share a file.
+"""
+try:
+    import numpy as np
+except ImportError as e:  # numpy is optional, only the equity distributions need it
+    raise ImportError("Equity distributions require numpy (pip install numpy).") from e
+
+import argparse
+import hashlib
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations
+from typing import Dict, List, Optional, Tuple
+
+from pypoker.utils import DECK, Hand, combo_index, get_cache_dir
+from pypoker.analysis_tools.equity_cache import SUIT_PERMUTATIONS, permute_card
+from pypoker.analysis_tools.lookup_tables import board_state, evaluate_with_board
+from pypoker.analysis_tools.range_parser import RangeParser
+
+DISTRIBUTION_VERSION = 1
+DEFAULT_BINS = 50
+CACHE_SUBDIR = 'equity_distributions'
+
+# The two cards of every combination, by combination index
+COMBO_CARD1 = np.zeros(1326, dtype=np.int64)
+COMBO_CARD2 = np.zeros(1326, dtype=np.int64)
+for _card1 in range(52):
+    for _card2 in range(_card1 + 1, 52):
+        COMBO_CARD1[combo_index(_card1, _card2)] = _card1
+        COMBO_CARD2[combo_index(_card1, _card2)] = _card2
+
+
+def range_weights(hand_range=None) -> np.ndarray:
+    """Weight of every combination in a range (notation string or Range), all 1 for None (a random hand)."""
+    if hand_range is None:
+        return np.ones(1326)
+    weights = np.zeros(1326)
+    combinations_ = RangeParser.generate_combination_ids(hand_range)
+    combination_weights = RangeParser.generate_combination_weights(hand_range) or [1.0] * len(combinations_)
+    for (card1, card2, _), weight in zip(combinations_, combination_weights):
+        weights[combo_index(card1, card2)] = weight
+    return weights
+
+
+def distribution_chunk(board_ids: List[int], runouts: List[Tuple[int, ...]], weights: np.ndarray,
+                       bins: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Worker job: histogram counts (1326, bins), equity sums and runout counts (1326,) of every combination
+    against the range weights over the given runouts of board.
+    """
+    counts = np.zeros(1326 * bins, dtype=np.int64)
+    equity_sums = np.zeros(1326)
+    runout_counts = np.zeros(1326, dtype=np.int64)
+    for runout in runouts:
+        full_board = list(board_ids) + list(runout)
+        dead = np.zeros(52, dtype=bool)
+        dead[full_board] = True
+        live = np.flatnonzero(~dead[COMBO_CARD1] & ~dead[COMBO_CARD2])
+        cards1, cards2 = COMBO_CARD1[live], COMBO_CARD2[live]
+        state = board_state(full_board)
+        strengths = np.array([evaluate_with_board(state, card1, card2)
+                              for card1, card2 in zip(cards1.tolist(), cards2.tolist())])
+        live_weights = weights[live]
+
+        order = np.argsort(strengths, kind='stable')
+        sorted_strengths = strengths[order]
+        # Cumulative range weight of the weakest k combinations, in total and holding each card
+        per_card = np.zeros((len(live) + 1, 52))
+        rows = np.arange(1, len(live) + 1)
+        per_card[rows, cards1[order]] = live_weights[order]
+        per_card[rows, cards2[order]] = live_weights[order]
+        np.cumsum(per_card, axis=0, out=per_card)
+        total = np.concatenate(([0.0], np.cumsum(live_weights[order])))
+
+        below = np.searchsorted(sorted_strengths, strengths, 'left')
+        not_above = np.searchsorted(sorted_strengths, strengths, 'right')
+        # The hero combination itself is the only one holding both its cards: it is counted once in total
+        # and twice in the per card sums, hence the correction in the tie and outcome counts
+        wins = total[below] - per_card[below, cards1] - per_card[below, cards2]
+        ties = total[not_above] - per_card[not_above, cards1] - per_card[not_above, cards2] + live_weights - wins
+        outcomes = total[-1] - per_card[-1, cards1] - per_card[-1, cards2] + live_weights
+
+        counted = outcomes > 0
+        combos = live[counted]
+        equities = (wins[counted] + ties[counted] / 2) / outcomes[counted]
+        equity_bins = np.minimum((equities * bins).astype(np.int64), bins - 1)
+        counts += np.bincount(combos * bins + equity_bins, minlength=1326 * bins)
+        equity_sums[combos] += equities
+        runout_counts[combos] += 1
+    return counts.reshape(1326, bins), equity_sums, runout_counts
+
+
+def _canonical_permutation(board_ids) -> int:
+    """Index in SUIT_PERMUTATIONS of the first relabelling giving the canonical board."""
+    boards = [tuple(sorted(permute_card(card_id, permutation) for card_id in board_ids))
+              for permutation in SUIT_PERMUTATIONS]
+    return boards.index(min(boards))
+
+
+def _combo_mapping(permutation) -> np.ndarray:
+    """Index of every combination once the suit permutation is applied."""
+    return np.array([combo_index(permute_card(card1, permutation), permute_card(card2, permutation))
+                     for card1, card2 in zip(COMBO_CARD1.tolist(), COMBO_CARD2.tolist())])
+
+
+def compute_distributions(board_ids: List[int], weights: np.ndarray, bins: int = DEFAULT_BINS,
+                          workers: int = 1) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(histogram counts, equity sums, runout counts) of every combination on board, without the cache."""
+    if len(board_ids) not in (3, 4, 5):
+        raise ValueError("Provide a board of 3, 4 or 5 cards.")
+    live_deck = [card_id for card_id in range(52) if card_id not in board_ids]
+    runouts = list(combinations(live_deck, 5 - len(board_ids)))
+    num_jobs = workers * 4 if workers > 1 else 1
+    jobs = [runouts[start::num_jobs] for start in range(num_jobs)]
+    arguments = [(list(board_ids), job, weights, bins) for job in jobs if job]
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(distribution_chunk, *zip(*arguments)))
+    else:
+        results = [distribution_chunk(*argument) for argument in arguments]
+    return tuple(sum(parts) for parts in zip(*results))
+
+
+def cache_path(board_ids, weights: np.ndarray, bins: int, cache_dir: Optional[str] = None) -> str:
+    """File caching the distributions of the canonical form of (board, range weights)."""
+    permutation = SUIT_PERMUTATIONS[_canonical_permutation(board_ids)]
+    canonical_weights = np.zeros(1326)
+    canonical_weights[_combo_mapping(permutation)] = weights
+    board = ''.join(DECK[card_id].to_string() for card_id in
+                    sorted(permute_card(card_id, permutation) for card_id in board_ids))
+    range_hash = hashlib.sha256(canonical_weights.astype('<f8').tobytes()).hexdigest()[:16]
+    directory = cache_dir or os.path.join(get_cache_dir(), CACHE_SUBDIR)
+    return os.path.join(directory, f"{board}_{range_hash}_{bins}_v{DISTRIBUTION_VERSION}.npz")
+
+
+def equity_distributions(board: str, hand_range=None, bins: int = DEFAULT_BINS, workers: int = 1,
+                         cache: bool = True, cache_dir: Optional[str] = None) -> Dict:
+    """
+    Equity distribution of every combination on board (e.g. 'AhKd7c') against hand_range (notation string or
+    Range, None for a random hand) over all runouts. Returns 'histograms', the (1326, bins) fraction of
+    runouts in each equity bin of width 1 / bins (rows by utils.combo_index), 'equity' the mean over runouts
+    of each combination's equity (NaN for those blocked by the board; runouts weigh the same, so it differs
+    slightly from the equity against the range when the runout blocks part of the range), and 'counts' and
+    'runouts', the raw histogram counts and the runouts counted per combination. cache reads and writes the
+    result under cache_dir (by default equity_distributions/ in the cache directory), where suit-isomorphic
+    queries share a file.
+    """
+    board_ids = Hand.from_string(board).ids
+    if len(set(board_ids)) != len(board_ids):
+        raise ValueError(f"Duplicate cards in board {board!r}.")
+    weights = range_weights(hand_range)
+    permutation = SUIT_PERMUTATIONS[_canonical_permutation(board_ids)]
+    mapping = _combo_mapping(permutation)
+    path = cache_path(board_ids, weights, bins, cache_dir)
+
+    data = None
+    if cache:
+        try:
+            with np.load(path) as stored:
+                data = stored['counts'], stored['equity_sums'], stored['runouts']
+        except FileNotFoundError:
+            pass
+    if data is None:
+        # Computed in the canonical frame so that the cached file serves every isomorphic query
+        canonical_board = [permute_card(card_id, permutation) for card_id in board_ids]
+        canonical_weights = np.zeros(1326)
+        canonical_weights[mapping] = weights
+        data = compute_distributions(canonical_board, canonical_weights, bins, workers)
+        if cache:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+            np.savez(tmp_path, counts=data[0], equity_sums=data[1], runouts=data[2])
+            os.replace(tmp_path, path)
+
+    counts, equity_sums, runouts = (np.asarray(array)[mapping] for array in data)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return {'histograms': counts / np.maximum(runouts, 1)[:, None],
+                'equity': np.where(runouts > 0, equity_sums / runouts, np.nan),
+                'counts': counts, 'runouts': runouts}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Equity distributions of every combination on a board.")
+    parser.add_argument('board', nargs='?', help="Flop or turn board, e.g. AhKd7c.")
+    parser.add_argument('--range', default=None, help="Opposing range (default: a random hand).")
+    parser.add_argument('--bins', type=int, default=DEFAULT_BINS)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--combos', default='', help="Combinations to print, e.g. AsAd,7h7c.")
+    parser.add_argument('--all-flops', action='store_true', help="Fill the cache for the 1,755 canonical flops.")
+    args = parser.parse_args(argv)
+
+    if args.all_flops:
+        from pypoker.analysis_tools.flop_sweep import canonical_flops
+        flops = canonical_flops()
+        for done, (flop, _) in enumerate(flops, start=1):
+            equity_distributions(''.join(DECK[card_id].to_string() for card_id in flop), args.range, args.bins,
+                                 args.workers)
+            print(f"\r{done}/{len(flops)} flops", end='', file=sys.stderr, flush=True)
+        print(file=sys.stderr)
+        return 0
+    if not args.board:
+        parser.error("Provide a board or --all-flops.")
+
+    try:
+        result = equity_distributions(args.board, args.range, args.bins, args.workers)
+    except ValueError as e:
+        parser.error(str(e))
+    live = np.flatnonzero(result['runouts'])
+    print(f"{len(live)} combinations, {result['runouts'].max()} runouts each, "
+          f"mean equity {np.nanmean(result['equity']) * 100:.2f}%")
+    for combo in filter(None, args.combos.split(',')):
+        card1, card2 = Hand.from_string(combo).ids
+        index = combo_index(card1, card2)
+        histogram = ' '.join(f"{fraction:.2f}" for fraction in result['histograms'][index])
+        print(f"{combo}: equity {result['equity'][index] * 100:.2f}%  histogram {histogram}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
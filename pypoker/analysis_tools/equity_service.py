@@ -0,0 +1,351 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional, Tuple
+
+from pypoker.analysis_tools.range_vs_range_equity import EquityCalculator
+
+# Largest number of queries grouped into one batch, and how long the batcher waits for more queries to join
+# a batch once the first one has arrived.
+MAX_BATCH_SIZE = 64
+BATCH_WINDOW = 0.002
+
+# The calculator of a worker process, built once by _init_worker and kept warm between batches
+_calculator = None
+
+
+def run_query(calculator: EquityCalculator, query: Dict) -> Dict:
+    """
+    Answer one query, a dict with 'ranges' (2 to 9 range notations) and optionally 'board' (default
+    preflop), 'method' and its arguments:
+      'equity' (default): 'simulations' (10000) and, heads-up, 'exact' (true, false or null for automatic);
+      'combo_equities': 'runouts' (2000) and 'exact';
+      'next_card' and 'runout_distribution' ('bins', 10): exact reports on a 3 or 4 card board;
+      'adaptive': 'target_stderr' (0.1), 'time_budget' and 'max_simulations'.
+    Raises ValueError on an invalid query.
+    """
+    method = query.get('method', 'equity')
+    ranges = query.get('ranges')
+    if not isinstance(ranges, list) or len(ranges) < 2 or not all(isinstance(r, str) for r in ranges):
+        raise ValueError("'ranges' must be a list of at least 2 range notations.")
+    board = query.get('board') or ''
+    if not isinstance(board, str):
+        raise ValueError("'board' must be a string of cards such as 'AhKd7c'.")
+    num_board_cards = len(board.replace(' ', '').replace(',', '')) / 2
+    if num_board_cards not in (0, 3, 4):
+        raise ValueError("'board' must hold no cards (preflop), 3 (flop) or 4 (flop and turn).")
+    if method != 'equity' and len(ranges) != 2:
+        raise ValueError(f"Method {method!r} takes exactly 2 ranges.")
+
+    if method == 'equity':
+        num_simulations = query.get('simulations', 10000)
+        if len(ranges) > 2:
+            return calculator.calculate_equity(ranges, board, num_simulations)
+        if not board:
+            return calculator.calculate_preflop_equity(ranges[0], ranges[1], num_simulations)
+        if num_board_cards == 3:
+            return calculator.calculate_flop_equity(ranges[0], ranges[1], board, num_simulations,
+                                                    query.get('exact'))
+        return calculator.calculate_turn_equity(ranges[0], ranges[1], board, num_simulations, query.get('exact'))
+    if method == 'combo_equities':
+        return calculator.calculate_combo_equities(ranges[0], ranges[1], board, query.get('runouts', 2000),
+                                                   query.get('exact'))
+    if method == 'next_card':
+        return calculator.equity_by_next_card(ranges[0], ranges[1], board)
+    if method == 'runout_distribution':
+        return calculator.runout_distribution(ranges[0], ranges[1], board, query.get('bins', 10))
+    if method == 'adaptive':
+        return calculator.calculate_equity_adaptive(ranges[0], ranges[1], board, query.get('target_stderr', 0.1),
+                                                    time_budget=query.get('time_budget'),
+                                                    max_simulations=query.get('max_simulations', 10000000))
+    raise ValueError(f"Unknown method {method!r}.")
+
+
+def run_batch(queries: List[Dict]) -> List[Tuple[str, object]]:
+    """Answer the queries with the worker's calculator: ('result', dict) or ('error', message) for each."""
+    answers = []
+    for query in queries:
+        try:
+            answers.append(('result', run_query(_calculator, query)))
+        except Exception as e:  # A bad query must not take the worker down with it
+            answers.append(('error', f"{type(e).__name__}: {e}"))
+    return answers
+
+
+def _init_worker(options: Dict):
+    global _calculator
+    _calculator = EquityCalculator(**options)
+
+
+def query_key(query: Dict) -> str:
+    """Queries with the same key have the same answer: everything but the request 'id', in a fixed order."""
+    return json.dumps({name: value for name, value in query.items() if name != 'id'}, sort_keys=True)
+
+
+class EquityService:
+    """
+    Long-running equity service: queries are queued, grouped into batches and answered by a pool of worker
+    processes, each holding an EquityCalculator whose tables and caches stay warm between queries.
+    A query identical to one still in flight waits for the same answer instead of being computed twice.
+    Use submit() from a running event loop, or serve_lines() / serve_socket() for the JSON-lines protocol.
+    """
+
+    def __init__(self, workers: int = 1, max_batch_size: int = MAX_BATCH_SIZE, batch_window: float = BATCH_WINDOW,
+                 **calculator_options):
+        """
+        workers: number of worker processes; 0 answers queries in a thread of this process instead.
+        calculator_options: EquityCalculator arguments of the workers' calculators (backend, seed,
+                            preflop_table, cache_size, cache_path, sampling, stats). Each worker runs its
+                            queries on a single process. cache_path needs workers of 0 or 1: the persistent
+                            cache file does not support several writers.
+        """
+        if workers < 0:
+            raise ValueError("workers must be at least 0.")
+        if workers > 1 and calculator_options.get('cache_path') is not None:
+            raise ValueError("cache_path cannot be shared by several worker processes; use workers=1 or no "
+                             "cache_path.")
+        self.workers = workers
+        self.max_batch_size = max_batch_size
+        self.batch_window = batch_window
+        self.calculator_options = dict(calculator_options, workers=1)
+        self.queries = self.deduplicated = self.batches = 0
+        self._in_flight = {}
+        self._queue = None
+        self._executor = None
+        self._batcher = None
+        self._running = set()
+
+    async def start(self):
+        """Start the worker pool and the batcher; called by submit() when needed."""
+        if self._batcher is not None:
+            return
+        self._executor = self._new_executor()
+        self._queue = asyncio.Queue()
+        self._batcher = asyncio.get_running_loop().create_task(self._batch_loop())
+
+    def _new_executor(self):
+        if self.workers:
+            return ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                       initargs=(self.calculator_options,))
+        return ThreadPoolExecutor(max_workers=1, initializer=_init_worker, initargs=(self.calculator_options,))
+
+    async def close(self):
+        """Wait for the queries in flight, then stop the batcher and the workers."""
+        if self._running:
+            await asyncio.gather(*self._running, return_exceptions=True)
+        if self._batcher is not None:
+            self._batcher.cancel()
+            self._batcher = None
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    async def submit(self, query: Dict) -> Dict:
+        """Answer a query; raises ValueError if it is invalid."""
+        if query.get('method') == 'info':
+            return self.info()
+        await self.start()
+        self.queries += 1
+        key = query_key(query)
+        future = self._in_flight.get(key)
+        if future is not None:
+            self.deduplicated += 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            self._in_flight[key] = future
+            self._queue.put_nowait((query, future))
+            future.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        kind, answer = await asyncio.shield(future)
+        if kind == 'error':
+            raise ValueError(answer)
+        return dict(answer)
+
+    def info(self) -> Dict[str, int]:
+        """Queries received, answered from an identical query in flight, batches sent and queries in flight."""
+        return {'queries': self.queries, 'deduplicated': self.deduplicated, 'batches': self.batches,
+                'in_flight': len(self._in_flight), 'workers': self.workers}
+
+    async def _batch_loop(self):
+        """
+        Send queued queries to the workers, one batch per idle worker. While every worker is busy queries
+        wait in the queue, so batches grow with the load; the waiting queries are shared evenly among the
+        idle workers, each batch holding at most max_batch_size of them.
+        """
+        loop = asyncio.get_running_loop()
+        num_workers = max(self.workers, 1)
+        idle = asyncio.Semaphore(num_workers)
+        busy = 0
+
+        def job_done(task):
+            nonlocal busy
+            busy -= 1
+            idle.release()
+            self._running.discard(task)
+
+        while True:
+            batch = [await self._queue.get()]
+            await idle.acquire()
+            await asyncio.sleep(self.batch_window)  # Let queries arriving together join the batch
+            size = min(self.max_batch_size, -(-(len(batch) + self._queue.qsize()) // (num_workers - busy)))
+            while len(batch) < size:
+                batch.append(self._queue.get_nowait())
+            busy += 1
+            task = loop.create_task(self._run_job(batch))
+            self._running.add(task)
+            task.add_done_callback(job_done)
+
+    async def _run_job(self, batch):
+        self.batches += 1
+        queries = [query for query, _ in batch]
+        executor = self._executor
+        try:
+            answers = await asyncio.get_running_loop().run_in_executor(executor, run_batch, queries)
+        except BrokenProcessPool as e:
+            # A worker process died: the pool cannot take any more work, so later queries go to a new one
+            if self._executor is executor:
+                executor.shutdown(wait=False)
+                self._executor = self._new_executor()
+            answers = [('error', f"{type(e).__name__}: {e}")] * len(batch)
+        except Exception as e:
+            answers = [('error', f"{type(e).__name__}: {e}")] * len(batch)
+        for (_, future), answer in zip(batch, answers):
+            if not future.done():
+                future.set_result(answer)
+
+    async def handle_line(self, line: str) -> Optional[str]:
+        """The JSON response line to one JSON request line, None for a blank line."""
+        line = line.strip()
+        if not line:
+            return None
+        request_id = None
+        try:
+            query = json.loads(line)
+            if not isinstance(query, dict):
+                raise ValueError("A query must be a JSON object.")
+            request_id = query.get('id')
+            response = {'id': request_id, 'result': await self.submit(query)}
+        except ValueError as e:  # Includes invalid JSON
+            response = {'id': request_id, 'error': str(e)}
+        return json.dumps(response)
+
+    async def serve_lines(self, read_line, write_line):
+        """
+        Answer JSON-lines requests until read_line() (a coroutine function) returns '' at the end of input.
+        Responses are written with write_line(line) as soon as they are ready, so they may come back in a
+        different order than the requests; they carry the request's 'id'.
+        """
+        pending = set()
+
+        async def answer(line):
+            response = await self.handle_line(line)
+            if response is not None:
+                await write_line(response)
+
+        while True:
+            line = await read_line()
+            if not line:
+                break
+            task = asyncio.get_running_loop().create_task(answer(line))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+        if pending:
+            await asyncio.gather(*pending)
+
+    async def serve_stdio(self):
+        """Serve requests from stdin, writing responses to stdout, until the end of stdin."""
+        loop = asyncio.get_running_loop()
+        reader = ThreadPoolExecutor(max_workers=1)  # Reads block, and pipes and files are not all pollable
+
+        async def read_line():
+            return await loop.run_in_executor(reader, sys.stdin.readline)
+
+        async def write_line(line):
+            sys.stdout.write(line + '\n')
+            sys.stdout.flush()
+
+        try:
+            await self.serve_lines(read_line, write_line)
+        finally:
+            reader.shutdown()
+
+    async def serve_socket(self, unix_path: Optional[str] = None, host: str = '127.0.0.1', port: int = 0,
+                           ready=None):
+        """
+        Serve JSON-lines requests on a Unix socket at unix_path, or on TCP host:port, until cancelled.
+        ready, if given, is called with the listening server once it accepts connections.
+        """
+        async def handle_connection(reader, writer):
+            async def write_line(line):
+                writer.write(line.encode() + b'\n')
+                await writer.drain()
+
+            try:
+                await self.serve_lines(lambda: self._read_socket_line(reader), write_line)
+            finally:
+                writer.close()
+
+        if unix_path is not None:
+            server = await asyncio.start_unix_server(handle_connection, unix_path)
+        else:
+            server = await asyncio.start_server(handle_connection, host, port)
+        await self.start()
+        if ready is not None:
+            ready(server)
+        async with server:
+            await server.serve_forever()
+
+    @staticmethod
+    async def _read_socket_line(reader) -> str:
+        return (await reader.readline()).decode()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Answer JSON-lines equity queries on stdin, or on a Unix or TCP socket, with warm workers.")
+    parser.add_argument('--unix', default=None, help="Listen on this Unix socket path.")
+    parser.add_argument('--tcp', default=None, help="Listen on HOST:PORT (e.g. 127.0.0.1:7777).")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help="Worker processes (0 runs queries in this process).")
+    parser.add_argument('--backend', default='python', choices=EquityCalculator.BACKENDS)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--cache-size', type=int, default=1024)
+    parser.add_argument('--cache-path', default=None)
+    parser.add_argument('--sampling', default='proportional', choices=EquityCalculator.SAMPLING_MODES)
+    parser.add_argument('--stats', action='store_true', help="Include query statistics in the results.")
+    args = parser.parse_args(argv)
+
+    try:
+        service = EquityService(args.workers, backend=args.backend, seed=args.seed, cache_size=args.cache_size,
+                                cache_path=args.cache_path, sampling=args.sampling, stats=args.stats)
+    except ValueError as e:
+        parser.error(str(e))
+
+    def ready(server):
+        addresses = ', '.join(str(sock.getsockname()) for sock in server.sockets)
+        print(f"Listening on {addresses}", file=sys.stderr, flush=True)
+
+    async def serve():
+        try:
+            if args.unix is not None:
+                await service.serve_socket(unix_path=args.unix, ready=ready)
+            elif args.tcp is not None:
+                host, _, port = args.tcp.rpartition(':')
+                await service.serve_socket(host=host or '127.0.0.1', port=int(port), ready=ready)
+            else:
+                await service.serve_stdio()
+        finally:
+            await service.close()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
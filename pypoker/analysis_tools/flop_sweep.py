@@ -0,0 +1,182 @@
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations
+from math import comb
+from typing import Dict, List, Tuple
+
+from pypoker.utils import DECK, derive_seed
+from pypoker.analysis_tools.columnar import ColumnarWriter, read_columns
+from pypoker.analysis_tools.equity_cache import canonical_board, is_suit_symmetric
+from pypoker.analysis_tools.range_parser import RangeParser
+from pypoker.analysis_tools.range_vs_range_equity import enumerate_weighted_runouts, runout_counts, simulate_chunk
+from pypoker.analysis_tools.sampling import compatible_weights
+
+SWEEP_COLUMNS = {'card1': 'B', 'card2': 'B', 'card3': 'B', 'weight': 'H',
+                 'equity': 'd', 'ties': 'd', 'outcomes': 'd'}
+# Flops sent to a worker at once; results are committed to disk after every batch of this many per worker.
+FLOPS_PER_JOB = 8
+# Turn and river cards every compatible pair of hands meets on a flop
+RUNOUTS_PER_PAIR = comb(52 - 3 - 4, 2)
+
+
+def canonical_flops() -> List[Tuple[Tuple[int, int, int], int]]:
+    """
+    The 1,755 flops that are distinct up to suit relabelling, each with the number of the 22,100 flops
+    it stands for, in increasing order of card ids.
+    """
+    weights = {}
+    for flop in combinations(range(52), 3):
+        flop = canonical_board(flop)
+        weights[flop] = weights.get(flop, 0) + 1
+    return sorted(weights.items())
+
+
+def sweep_flops(range1_combinations, range2_combinations, flops, num_simulations, backend, seed,
+                weights1=None, weights2=None) -> List[Tuple]:
+    """
+    (equity of range1, tie frequency, outcomes) on each flop, exact when num_simulations is None.
+    The ranges are parsed once by the caller; each flop only drops the combinations it blocks.
+    outcomes counts the (combo pair, runout) outcomes, or their total weight for weighted ranges; simulated
+    flops report the outcomes the simulation stands for.
+    """
+    results = []
+    for flop in flops:
+        flop_mask = sum(1 << card_id for card_id in flop)
+        range1 = [combo for combo in range1_combinations if not combo[2] & flop_mask]
+        range2 = [combo for combo in range2_combinations if not combo[2] & flop_mask]
+        flop_weights1 = _live_weights(range1_combinations, weights1, flop_mask)
+        flop_weights2 = _live_weights(range2_combinations, weights2, flop_mask)
+        weighted = flop_weights1 is not None or flop_weights2 is not None
+        if num_simulations is None and weighted:
+            live_deck = [card_id for card_id in range(52) if not flop_mask >> card_id & 1]
+            wins1, _, ties, outcomes = enumerate_weighted_runouts(
+                range1, range2, list(flop), list(combinations(live_deck, 2)),
+                flop_weights1 or [1.0] * len(range1), flop_weights2 or [1.0] * len(range2))
+        elif num_simulations is None:
+            live_deck = [card_id for card_id in range(52) if not flop_mask >> card_id & 1]
+            wins1 = ties = outcomes = 0
+            for _, runout_wins1, _, runout_ties, runout_outcomes in runout_counts(range1, range2, list(flop),
+                                                                                  live_deck, True):
+                wins1 += runout_wins1
+                ties += runout_ties
+                outcomes += runout_outcomes
+        else:
+            wins1, _, ties, valid = simulate_chunk(backend, range1, range2, list(flop), num_simulations,
+                                                   derive_seed(seed, flop), flop_weights1, flop_weights2)
+            # Scale the simulated fractions to the outcomes enumeration would count, so that simulated flops
+            # weigh in sweep_equity as exact ones do
+            outcomes = _pair_weight(range1, range2, flop_weights1, flop_weights2) * RUNOUTS_PER_PAIR if valid else 0
+            wins1, ties = (wins1 / valid * outcomes, ties / valid * outcomes) if valid else (0, 0)
+        if outcomes:
+            results.append(((wins1 + ties / 2) / outcomes, ties / outcomes, outcomes))
+        else:
+            results.append((0.0, 0.0, 0))
+    return results
+
+
+def _pair_weight(range1, range2, weights1=None, weights2=None) -> float:
+    """Number of compatible combination pairs, or their total weight (product of the combination weights)."""
+    compatible = compatible_weights(range1, range2, weights2 or [1.0] * len(range2))
+    return sum(weight * pair_weight for weight, pair_weight in zip(weights1 or [1.0] * len(range1), compatible))
+
+
+def _live_weights(combinations_, weights, dead_mask):
+    """The weights of the combinations holding no dead card, or None for an unweighted range."""
+    if weights is None:
+        return None
+    return [weight for (_, _, mask), weight in zip(combinations_, weights) if not mask & dead_mask]
+
+
+def run_sweep(range1_str, range2_str, path, num_simulations=None, workers=1, backend='python', seed=0,
+              progress=None) -> int:
+    """
+    Compute the equity of range1 against range2 on every flop and stream it to the columnar table at path
+    (see columnar.ColumnarWriter): columns card1..card3, weight (number of flops represented), equity and
+    ties (fractions) and outcomes. With suit-symmetric ranges only the 1,755 canonical flops are computed,
+    otherwise all 22,100 flops with weight 1. An interrupted sweep resumes where it stopped when run again
+    with the same arguments. progress, if given, is called with (flops done, total flops).
+    Returns the number of flops in the table.
+    """
+    range1_combinations = RangeParser.generate_combination_ids(range1_str)
+    range2_combinations = RangeParser.generate_combination_ids(range2_str)
+    weights1 = RangeParser.generate_combination_weights(range1_str)
+    weights2 = RangeParser.generate_combination_weights(range2_str)
+    if is_suit_symmetric(range1_combinations, weights1) and is_suit_symmetric(range2_combinations, weights2):
+        flops = canonical_flops()
+    else:
+        flops = [(flop, 1) for flop in combinations(range(52), 3)]
+
+    metadata = {'range1': getattr(range1_str, 'notation', range1_str),
+                'range2': getattr(range2_str, 'notation', range2_str), 'num_simulations': num_simulations,
+                'backend': backend, 'seed': seed}
+    with ColumnarWriter(path, SWEEP_COLUMNS, metadata) as writer:
+        todo = flops[writer.rows:]
+        batches = [todo[start:start + FLOPS_PER_JOB * workers]
+                   for start in range(0, len(todo), FLOPS_PER_JOB * workers)]
+        executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+        try:
+            for batch in batches:
+                jobs = [[flop for flop, _ in batch[start:start + FLOPS_PER_JOB]]
+                        for start in range(0, len(batch), FLOPS_PER_JOB)]
+                arguments = [(range1_combinations, range2_combinations, job, num_simulations, backend, seed,
+                              weights1, weights2) for job in jobs]
+                if executor is not None:
+                    results = executor.map(sweep_flops, *zip(*arguments))
+                else:
+                    results = (sweep_flops(*argument) for argument in arguments)
+                rows = [result for job_results in results for result in job_results]
+                for (flop, weight), (equity, ties, outcomes) in zip(batch, rows):
+                    writer.append((*flop, weight, equity, ties, outcomes))
+                writer.flush()
+                if progress is not None:
+                    progress(writer.rows, len(flops))
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        return writer.rows
+
+
+def load_sweep(path) -> Tuple[Dict, List[Dict]]:
+    """Return (metadata, rows) of a sweep table; each row holds 'flop' (e.g. 'AhKd7c'), 'weight', 'equity'..."""
+    metadata, columns = read_columns(path)
+    rows = []
+    for card1, card2, card3, weight, equity, ties, outcomes in zip(*(columns[name] for name in SWEEP_COLUMNS)):
+        flop = ''.join(DECK[card_id].to_string() for card_id in (card1, card2, card3))
+        rows.append({'flop': flop, 'weight': weight, 'equity': equity, 'ties': ties, 'outcomes': outcomes})
+    return metadata, rows
+
+
+def sweep_equity(rows) -> float:
+    """Equity of range1 over all flops, each flop weighted by the flops it stands for and its outcomes."""
+    total = sum(row['weight'] * row['outcomes'] for row in rows)
+    if not total:
+        return 0.0
+    return sum(row['weight'] * row['outcomes'] * row['equity'] for row in rows) / total
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compute range vs range equity on every flop.")
+    parser.add_argument('range1')
+    parser.add_argument('range2')
+    parser.add_argument('--out', required=True, help="Directory of the columnar result table.")
+    parser.add_argument('--simulations', type=int, default=None,
+                        help="Monte Carlo simulations per flop (default: exact enumeration).")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--backend', default='python', choices=('python', 'numpy'))
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    def progress(done, total):
+        print(f"\r{done}/{total} flops", end='', file=sys.stderr, flush=True)
+
+    run_sweep(args.range1, args.range2, args.out, args.simulations, args.workers, args.backend, args.seed,
+              progress)
+    _, rows = load_sweep(args.out)
+    print(f"\nWrote {args.out}: {len(rows)} flops, equity {sweep_equity(rows) * 100:.2f}%", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,488 @@
+"""
+Hand history ingestion: parses PokerStars hold'em hand histories into columnar tables (see columnar.py).
+
+Archives are never read into memory: each file is memory-mapped and split into chunks of about CHUNK_BYTES
+that end on a hand boundary, a generator yields the hands of a chunk, and the chunks are parsed in a process
+pool with a bounded number in flight, so memory use does not depend on the size of the archive. Results are
+committed chunk by chunk in file order to three tables in the output directory:
+  hands/    one row per hand: source file and byte range, hand number, button seat, board, pot, rake, the
+            street of an all-in (-1 without one) and the rows of its players and actions in the other tables;
+  players/  one row per player and hand: player id, seat, position, hole cards (-1 when unknown), stack,
+            chips invested, net result, all-in equity and EV-adjusted net result;
+  actions/  one row per action: hand row, seat, street, action code (see ACTIONS) and chips put in.
+Player ids are 64-bit hashes of the names, listed in players.tsv. When a hand goes to showdown with a
+player all-in before the river, the equity of every shown hand at the moment the betting stopped is computed
+with EquityCalculator, and the EV-adjusted result is the expected share of each pot the player is eligible
+for (side pots are split by the chips each remaining player invested, and equities are computed again among
+the players of each side pot) minus the chips invested. Ingesting the same files into the same directory
+again resumes after the last committed hand.
+"""
+import argparse
+import hashlib
+import mmap
+import os
+import re
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from pypoker.utils import Card, Hand
+from pypoker.analysis_tools.columnar import ColumnarWriter, read_columns
+from pypoker.analysis_tools.range_vs_range_equity import EquityCalculator
+
+CHUNK_BYTES = 4 << 20
+HAND_MARKER = b'\nPokerStars '
+# All-in equities are exact on the flop and turn and simulated preflop (and in multiway pots)
+EQUITY_SIMULATIONS = 20000
+
+STREETS = ('preflop', 'flop', 'turn', 'river')
+ACTIONS = ('ante', 'blind', 'fold', 'check', 'call', 'bet', 'raise')
+STREET_CARDS = (0, 3, 4, 5)
+HAND_COLUMNS = {'file': 'H', 'offset': 'Q', 'length': 'I', 'hand_number': 'q', 'button_seat': 'B',
+                'num_players': 'B', 'num_actions': 'H', 'board1': 'b', 'board2': 'b', 'board3': 'b',
+                'board4': 'b', 'board5': 'b', 'big_blind': 'd', 'pot': 'd', 'rake': 'd', 'all_in_street': 'b',
+                'player_start': 'Q', 'action_start': 'Q'}
+PLAYER_COLUMNS = {'hand': 'Q', 'player': 'q', 'seat': 'B', 'position': 'B', 'card1': 'b', 'card2': 'b',
+                  'stack': 'd', 'invested': 'd', 'net': 'd', 'all_in_equity': 'd', 'ev_net': 'd'}
+ACTION_COLUMNS = {'hand': 'Q', 'seat': 'B', 'street': 'B', 'action': 'B', 'amount': 'd', 'all_in': 'B'}
+NAMES_FILENAME = 'players.tsv'
+
+_AMOUNT = r"[$€£]?([\d,]+(?:\.\d+)?)"
+_HEADER_RE = re.compile(r"PokerStars (?:Zoom )?(?:Hand|Game) #(\d+):")
+_BUTTON_RE = re.compile(r"Seat #(\d+) is the button")
+_SEAT_RE = re.compile(r"Seat (\d+): (.+?) \(" + _AMOUNT + r" in chips")
+_STREET_RE = re.compile(r"\*\*\* (HOLE CARDS|FLOP|TURN|RIVER|SHOW ?DOWN|SUMMARY) \*\*\*")
+_ACTION_RE = re.compile(r"(folds|checks|calls|bets|raises|posts (?:small blind|big blind|small & big blinds|the ante))"
+                        r"(?: " + _AMOUNT + r")?(?: to " + _AMOUNT + r")?( and is all-in)?")
+_SHOWN_RE = re.compile(r"(?:shows|mucks) \[(\S\S) (\S\S)\]")
+_DEALT_RE = re.compile(r"Dealt to (.+?) \[(\S\S) (\S\S)\]")
+_UNCALLED_RE = re.compile(r"Uncalled bet \(" + _AMOUNT + r"\) returned to (.+)$")
+_COLLECTED_RE = re.compile(r"(.+?) collected " + _AMOUNT + r" from (?:side |main )?pot")
+_TOTAL_RE = re.compile(r"Total pot " + _AMOUNT + r".*?\| Rake " + _AMOUNT)
+_SUMMARY_SHOWN_RE = re.compile(r"Seat (\d+): .*? (?:showed|mucked) \[(\S\S) (\S\S)\]")
+_CARDS_RE = re.compile(r"\[([^\]]*)\]")
+
+# The equity calculator of the process, built on first use
+_calculator = None
+
+
+class HandHistory:
+    """
+    One parsed hand. Players are indexed in seat order: seats, names, stacks, positions (seats after the
+    button: 0 button, 1 small blind, 2 big blind, ...; heads-up the button is the small blind and 1 the big
+    blind), holes (Hand of two cards or None), invested and collected chips. actions holds (player index,
+    street, ACTIONS index, chips put in, all-in flag) tuples. all_in_street is the street on which the
+    betting stopped with a player all-in and every remaining hand shown, -1 otherwise.
+    """
+
+    def __init__(self):
+        self.hand_number = 0
+        self.button_seat = 0
+        self.seats = []
+        self.names = []
+        self.stacks = []
+        self.positions = []
+        self.holes = []
+        self.invested = []
+        self.collected = []
+        self.folded = []
+        self.actions = []
+        self.board = Hand()
+        self.big_blind = 0.0
+        self.pot = 0.0
+        self.rake = 0.0
+        self.all_in_street = -1
+
+    def net(self, player: int) -> float:
+        return self.collected[player] - self.invested[player]
+
+
+def _amount(text: Optional[str]) -> float:
+    return float(text.replace(',', '')) if text else 0.0
+
+
+def _cards(texts) -> List[Card]:
+    try:
+        return [Card.from_string(text) for text in texts]
+    except AssertionError as e:
+        raise ValueError(str(e)) from e
+
+
+def parse_hand(text: str) -> HandHistory:
+    """Parse the text of one PokerStars hold'em hand. Raises ValueError on other games or malformed hands."""
+    lines = text.splitlines()
+    header = _HEADER_RE.match(lines[0].lstrip('\ufeff')) if lines else None
+    if header is None or "Hold'em" not in lines[0]:
+        raise ValueError("Not a PokerStars hold'em hand.")
+    hand = HandHistory()
+    hand.hand_number = int(header.group(1))
+    button = _BUTTON_RE.search(lines[1]) if len(lines) > 1 else None
+    if button is None:
+        raise ValueError(f"Hand #{hand.hand_number}: no button seat.")
+    hand.button_seat = int(button.group(1))
+
+    line_number = 2
+    while line_number < len(lines):
+        seat = _SEAT_RE.match(lines[line_number])
+        if seat is None:
+            break
+        hand.seats.append(int(seat.group(1)))
+        hand.names.append(seat.group(2))
+        hand.stacks.append(_amount(seat.group(3)))
+        line_number += 1
+    num_players = len(hand.seats)
+    if num_players < 2:
+        raise ValueError(f"Hand #{hand.hand_number}: fewer than 2 seated players.")
+    button_index = sum(seat < hand.button_seat for seat in hand.seats)
+    hand.positions = [(index - button_index) % num_players for index in range(num_players)]
+    hand.holes = [None] * num_players
+    hand.invested = [0.0] * num_players
+    hand.collected = [0.0] * num_players
+    hand.folded = [False] * num_players
+    players = {name: index for index, name in enumerate(hand.names)}
+    by_length = sorted(hand.names, key=len, reverse=True)
+
+    street = 0
+    street_bets = [0.0] * num_players
+    last_action_street = 0
+    all_in = False
+    in_summary = False
+    for line in lines[line_number:]:
+        if line.startswith('***'):
+            marker = _STREET_RE.match(line)
+            if marker is None:
+                continue
+            name = marker.group(1)
+            if name in ('FLOP', 'TURN', 'RIVER'):
+                street = ('FLOP', 'TURN', 'RIVER').index(name) + 1
+                street_bets = [0.0] * num_players
+                hand.board = Hand(_cards(' '.join(_CARDS_RE.findall(line)).split()))
+            in_summary = name == 'SUMMARY'
+            continue
+        if in_summary:
+            total = _TOTAL_RE.match(line)
+            if total is not None:
+                hand.pot, hand.rake = _amount(total.group(1)), _amount(total.group(2))
+            elif line.startswith('Board '):
+                hand.board = Hand(_cards(' '.join(_CARDS_RE.findall(line)).split()))
+            else:
+                shown = _SUMMARY_SHOWN_RE.match(line)
+                if shown is not None and int(shown.group(1)) in hand.seats:
+                    hand.holes[hand.seats.index(int(shown.group(1)))] = Hand(_cards(shown.group(2, 3)))
+            continue
+
+        name = next((name for name in by_length if line.startswith(name + ': ')), None)
+        if name is None:
+            dealt = _DEALT_RE.match(line)
+            uncalled = _UNCALLED_RE.match(line)
+            collected = _COLLECTED_RE.match(line)
+            if dealt is not None and dealt.group(1) in players:
+                hand.holes[players[dealt.group(1)]] = Hand(_cards(dealt.group(2, 3)))
+            elif uncalled is not None and uncalled.group(2) in players:
+                hand.invested[players[uncalled.group(2)]] -= _amount(uncalled.group(1))
+            elif collected is not None and collected.group(1) in players:
+                hand.collected[players[collected.group(1)]] += _amount(collected.group(2))
+            continue
+
+        player = players[name]
+        rest = line[len(name) + 2:]
+        action = _ACTION_RE.match(rest)
+        if action is None:
+            shown = _SHOWN_RE.match(rest)
+            if shown is not None:
+                hand.holes[player] = Hand(_cards(shown.group(1, 2)))
+            continue
+        verb = action.group(1)
+        amount = _amount(action.group(2))
+        if verb == 'raises':
+            amount = _amount(action.group(3)) - street_bets[player]
+        if verb == 'posts the ante':
+            code = ACTIONS.index('ante')
+        elif verb.startswith('posts'):
+            code = ACTIONS.index('blind')
+            if verb == 'posts big blind':
+                hand.big_blind = amount
+        else:
+            code = ACTIONS.index(verb[:-1] if verb != 'raises' else 'raise')
+            last_action_street = street
+        if code != ACTIONS.index('ante'):
+            street_bets[player] += amount
+        hand.invested[player] += amount
+        if verb == 'folds':
+            hand.folded[player] = True
+        all_in = all_in or action.group(4) is not None
+        hand.actions.append((player, street, code, amount, action.group(4) is not None))
+
+    contenders = [player for player in range(num_players) if not hand.folded[player]]
+    if (all_in and last_action_street < 3 and len(hand.board) == 5 and len(contenders) > 1
+            and all(hand.holes[player] is not None for player in contenders)):
+        hand.all_in_street = last_action_street
+    return hand
+
+
+def _equities(hand: HandHistory, players: List[int], calculator: EquityCalculator,
+              num_simulations: int) -> Dict[int, float]:
+    """Equity (0..1) of each of players against the others at the all-in of hand, by player index."""
+    ranges = [''.join(card.to_string() for card in hand.holes[player].cards) for player in players]
+    board = ''.join(card.to_string() for card in hand.board.cards[:STREET_CARDS[hand.all_in_street]])
+    result = calculator.calculate_equity(ranges, board or None, num_simulations)
+    return {player: result[f'range{index + 1}'] / 100 for index, player in enumerate(players)}
+
+
+def all_in_equities(hand: HandHistory, calculator: EquityCalculator, num_simulations: int) -> Dict[int, float]:
+    """Equity (0..1) of each remaining player at the all-in of hand, by player index; {} without an all-in."""
+    if hand.all_in_street < 0:
+        return {}
+    contenders = [player for player in range(len(hand.seats)) if not hand.folded[player]]
+    return _equities(hand, contenders, calculator, num_simulations)
+
+
+def side_pots(hand: HandHistory) -> List[Tuple[float, List[int]]]:
+    """
+    (chips, eligible player indices) of the main pot and then each side pot of hand, before rake. Each amount
+    invested by a remaining player caps a pot, contested by the remaining players who invested at least as
+    much; chips folded players invested beyond the last cap go to the last pot.
+    """
+    contenders = [player for player in range(len(hand.seats)) if not hand.folded[player]]
+    levels = sorted({hand.invested[player] for player in contenders})
+    pots = []
+    previous = 0.0
+    for index, level in enumerate(levels):
+        cap = level if index + 1 < len(levels) else float('inf')
+        chips = sum(min(invested, cap) - min(invested, previous) for invested in hand.invested)
+        pots.append((chips, [player for player in contenders if hand.invested[player] >= level]))
+        previous = level
+    return pots
+
+
+def expected_collected(hand: HandHistory, equities: Dict[int, float], calculator: EquityCalculator,
+                       num_simulations: int) -> Dict[int, float]:
+    """
+    Chips each remaining player of an all-in hand expects to collect, by player index: every pot of side_pots,
+    less its share of the rake, split by the equities of its eligible players. equities, from all_in_equities,
+    serve the pots every remaining player contests; the others are computed among their own players.
+    """
+    pots = side_pots(hand)
+    total = sum(chips for chips, _ in pots)
+    paid_out = sum(hand.collected) / total if total else 0.0
+    expected = dict.fromkeys(equities, 0.0)
+    for chips, eligible in pots:
+        if len(eligible) == len(equities):
+            shares = equities
+        elif len(eligible) == 1:
+            shares = {eligible[0]: 1.0}
+        else:
+            shares = _equities(hand, eligible, calculator, num_simulations)
+        for player in eligible:
+            expected[player] += chips * paid_out * shares[player]
+    return expected
+
+
+def player_id(name: str) -> int:
+    """Stable signed 64-bit id of a player name."""
+    return int.from_bytes(hashlib.blake2b(name.encode('utf-8'), digest_size=8).digest(), 'little', signed=True)
+
+
+def iter_chunks(path: str, start: int = 0, chunk_bytes: int = CHUNK_BYTES) -> Iterator[Tuple[int, int]]:
+    """Yield (start, end) byte ranges of about chunk_bytes covering path from start on, ending between hands."""
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if start >= size:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            while start < size:
+                end = data.find(HAND_MARKER, start + chunk_bytes) if start + chunk_bytes < size else -1
+                end = size if end < 0 else end + 1
+                yield start, end
+                start = end
+
+
+def iter_hands(data, start: int, end: int) -> Iterator[Tuple[int, int, str]]:
+    """Yield (offset, length, text) of each hand in data[start:end], a memory-mapped file."""
+    position = data.find(HAND_MARKER[1:], start, end)
+    while 0 <= position < end:
+        following = data.find(HAND_MARKER, position, end)
+        stop = end if following < 0 else following + 1
+        yield position, stop - position, data[position:stop].decode('utf-8', 'replace')
+        position = stop
+
+
+def parse_chunk(path: str, file_index: int, start: int, end: int, num_simulations: int, seed: int) -> Dict:
+    """
+    Worker job: parse the hands in a byte range of a file. Returns 'hands', a list of (hand row, player rows,
+    action rows) without the row numbers the parent fills in, 'names' (player id -> name), 'skipped', the
+    number of hands that could not be parsed, and the 'file' index and 'end' of the range.
+    """
+    global _calculator
+    if num_simulations and _calculator is None:
+        _calculator = EquityCalculator(seed=seed)
+    hands = []
+    names = {}
+    skipped = 0
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        for offset, length, text in iter_hands(data, start, end):
+            try:
+                hand = parse_hand(text)
+            except ValueError:
+                skipped += 1
+                continue
+            equities = all_in_equities(hand, _calculator, num_simulations) if num_simulations else {}
+            expected = expected_collected(hand, equities, _calculator, num_simulations) if equities else {}
+            board = [card.id for card in hand.board.cards] + [-1] * (5 - len(hand.board))
+            hand_row = (file_index, offset, length, hand.hand_number, hand.button_seat, len(hand.seats),
+                        len(hand.actions), *board, hand.big_blind, hand.pot, hand.rake, hand.all_in_street)
+            player_rows = []
+            for player, name in enumerate(hand.names):
+                identifier = player_id(name)
+                names[identifier] = name
+                hole = [card.id for card in hand.holes[player].cards] if hand.holes[player] else [-1, -1]
+                equity = equities.get(player, float('nan'))
+                ev_net = expected[player] - hand.invested[player] if player in expected else hand.net(player)
+                player_rows.append((identifier, hand.seats[player], hand.positions[player], *hole,
+                                    hand.stacks[player], hand.invested[player], hand.net(player), equity, ev_net))
+            action_rows = [(hand.seats[player], street, code, amount, all_in)
+                           for player, street, code, amount, all_in in hand.actions]
+            hands.append((hand_row, player_rows, action_rows))
+    return {'hands': hands, 'names': names, 'skipped': skipped, 'file': file_index, 'end': end}
+
+
+def _bounded_map(executor: Optional[ProcessPoolExecutor], function, jobs, limit: int) -> Iterator:
+    """function(*job) for each job in order, with at most limit jobs submitted and not yet consumed."""
+    if executor is None:
+        for job in jobs:
+            yield function(*job)
+        return
+    pending = deque()
+    for job in jobs:
+        pending.append(executor.submit(function, *job))
+        if len(pending) >= limit:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def _resume_position(hands: ColumnarWriter, players: ColumnarWriter, actions: ColumnarWriter) -> Tuple[int, int]:
+    """
+    Drop player and action rows committed after the last committed hand (the hands table is committed last)
+    and return the (file index, byte offset) after that hand.
+    """
+    if not hands.rows:
+        players.truncate(0)
+        actions.truncate(0)
+        return 0, 0
+    _, last = read_columns(hands.path, ['file', 'offset', 'length', 'player_start', 'num_players',
+                                        'action_start', 'num_actions'], hands.rows - 1)
+    players.truncate(last['player_start'][0] + last['num_players'][0])
+    actions.truncate(last['action_start'][0] + last['num_actions'][0])
+    return last['file'][0], last['offset'][0] + last['length'][0]
+
+
+def ingest(paths: List[str], out: str, workers: int = 1, num_simulations: int = EQUITY_SIMULATIONS, seed: int = 0,
+           chunk_bytes: int = CHUNK_BYTES, progress=None) -> Dict[str, int]:
+    """
+    Parse the hand history files at paths into the tables in directory out, resuming an interrupted run made
+    with the same files and settings (others raise ValueError). num_simulations of 0 skips the all-in
+    equities. progress, if given, is called with (bytes done, total bytes) after every committed chunk.
+    Returns the number of rows in each table and the hands skipped by this run.
+    """
+    paths = [os.path.abspath(path) for path in paths]
+    metadata = {'files': paths, 'num_simulations': num_simulations, 'seed': seed}
+    hands = ColumnarWriter(os.path.join(out, 'hands'), HAND_COLUMNS, metadata)
+    players = ColumnarWriter(os.path.join(out, 'players'), PLAYER_COLUMNS, metadata)
+    actions = ColumnarWriter(os.path.join(out, 'actions'), ACTION_COLUMNS, metadata)
+    first_file, first_offset = _resume_position(hands, players, actions)
+    known_names = set(player_names(out))
+    sizes = [os.path.getsize(path) for path in paths]
+
+    jobs = ((path, index, start, end, num_simulations, seed)
+            for index, path in enumerate(paths) if index >= first_file
+            for start, end in iter_chunks(path, first_offset if index == first_file else 0, chunk_bytes))
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    skipped = 0
+    try:
+        with open(os.path.join(out, NAMES_FILENAME), 'a', encoding='utf-8') as names_file:
+            for result in _bounded_map(executor, parse_chunk, jobs, 2 * workers):
+                for identifier, name in result['names'].items():
+                    if identifier not in known_names:
+                        names_file.write(f"{identifier}\t{name}\n")
+                        known_names.add(identifier)
+                names_file.flush()
+                hand_row, player_row, action_row = hands.rows, players.rows, actions.rows
+                for hand, player_rows, action_rows in result['hands']:
+                    for row in player_rows:
+                        players.append((hand_row, *row))
+                    for row in action_rows:
+                        actions.append((hand_row, *row))
+                    hands.append((*hand, player_row, action_row))
+                    hand_row += 1
+                    player_row += len(player_rows)
+                    action_row += len(action_rows)
+                # The hands table is committed last: its rows say which player and action rows are complete
+                players.flush()
+                actions.flush()
+                hands.flush()
+                skipped += result['skipped']
+                if progress is not None:
+                    progress(sum(sizes[:result['file']]) + result['end'], sum(sizes))
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return {'hands': hands.rows, 'players': players.rows, 'actions': actions.rows, 'skipped': skipped}
+
+
+def player_names(out: str) -> Dict[int, str]:
+    """Player id -> name of the players in the tables at out."""
+    names = {}
+    try:
+        with open(os.path.join(out, NAMES_FILENAME), encoding='utf-8') as f:
+            for line in f:
+                identifier, _, name = line.rstrip('\n').partition('\t')
+                if name:
+                    names[int(identifier)] = name
+    except FileNotFoundError:
+        pass
+    return names
+
+
+def player_results(out: str) -> Dict[str, Dict[str, float]]:
+    """Per player name: hands played, net result and EV-adjusted net result, from the tables at out."""
+    _, columns = read_columns(os.path.join(out, 'players'), ['player', 'net', 'ev_net'])
+    names = player_names(out)
+    results = {}
+    for identifier, net, ev_net in zip(columns['player'], columns['net'], columns['ev_net']):
+        result = results.setdefault(names.get(identifier, str(identifier)), {'hands': 0, 'net': 0.0, 'ev_net': 0.0})
+        result['hands'] += 1
+        result['net'] += net
+        result['ev_net'] += ev_net
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Parse PokerStars hand histories into columnar tables.")
+    parser.add_argument('files', nargs='+')
+    parser.add_argument('--out', required=True, help="Directory of the tables (resumed if it exists).")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--simulations', type=int, default=EQUITY_SIMULATIONS,
+                        help="Simulations per preflop or multiway all-in equity, 0 to skip all-in equities.")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--top', type=int, default=10, help="Players to list, by number of hands.")
+    args = parser.parse_args(argv)
+
+    def progress(done, total):
+        print(f"\r{done / 2 ** 20:.1f}/{total / 2 ** 20:.1f} MiB", end='', file=sys.stderr, flush=True)
+
+    try:
+        counts = ingest(args.files, args.out, args.workers, args.simulations, args.seed, progress=progress)
+    except ValueError as e:
+        parser.error(str(e))
+    print(f"\n{counts['hands']} hands, {counts['players']} player rows, {counts['actions']} actions "
+          f"({counts['skipped']} hands skipped)", file=sys.stderr)
+    results = sorted(player_results(args.out).items(), key=lambda item: -item[1]['hands'])
+    for name, result in results[:args.top]:
+        print(f"{name:20} {result['hands']:8d} hands  net {result['net']:10.2f}  EV-adjusted {result['ev_net']:10.2f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,260 @@
+import os
+import sys
+from array import array
+from itertools import combinations_with_replacement
+from typing import List, Tuple
+
+from pypoker.utils import get_cache_dir
+
+# Bump whenever the table layout or the strength encoding changes so stale caches are rebuilt.
+TABLES_VERSION = 2
+TABLES_FILENAME = f"hand_tables_v{TABLES_VERSION}.bin"
+# The cache file is a flat little-endian int64 array: this magic number, the version, the lengths of the four
+# tables (noflush keys, noflush strengths, flush, flush_suit), then the tables one after the other.
+TABLES_MAGIC = 0x7079706F6B6572  # 'pypoker'
+NOFLUSH_ENTRIES = 73775  # 5, 6 and 7 card rank multisets holding no rank more than four times
+
+# Cards are identified by an integer id in 0..51: id = rank_index * 4 + suit_index,
+# where rank_index is 0 for a deuce up to 12 for an ace and suit_index follows Card.SUITS.
+NUM_RANKS = 13
+NUM_SUITS = 4
+
+# Number of tiebreaker values stored in a strength for each hand category.
+KICKER_COUNTS = (5, 4, 3, 3, 1, 5, 2, 2, 1, 1)
+KICKER_BITS = 20
+
+# Every rank contributes a power of 5 to the rank key. No rank appears more than four times,
+# so the sum is a unique key for the rank multiset of the cards.
+RANK_KEYS = [5 ** (card_id // NUM_SUITS) for card_id in range(52)]
+# Every suit contributes a power of 8; with at most 7 cards each base-8 digit is a suit count.
+SUIT_KEYS = [8 ** (card_id % NUM_SUITS) for card_id in range(52)]
+RANK_BITS = [1 << (card_id // NUM_SUITS) for card_id in range(52)]
+# Both keys of a card in one integer, the suit key in the low SUIT_KEY_BITS bits, so that evaluate_ids sums a
+# hand's keys in a single pass at C speed (the suit key of 7 cards stays below 8 ** 4)
+SUIT_KEY_BITS = 12
+SUIT_KEY_MASK = (1 << SUIT_KEY_BITS) - 1
+CARD_KEYS = [RANK_KEYS[card_id] << SUIT_KEY_BITS | SUIT_KEYS[card_id] for card_id in range(52)]
+_card_key = CARD_KEYS.__getitem__
+
+
+def encode_strength(category: int, kickers: List[int]) -> int:
+    """
+    Pack a hand category and its tiebreaker card values (2..14) into one integer.
+    Higher integers are stronger hands.
+    """
+    strength = category << KICKER_BITS
+    for position, value in enumerate(kickers):
+        strength |= value << (KICKER_BITS - 4 * (position + 1))
+    return strength
+
+
+def decode_strength(strength: int) -> Tuple:
+    """Unpack an integer strength into the (category, [kickers]) tuple used by HandEvaluator."""
+    category = strength >> KICKER_BITS
+    kickers = [(strength >> (KICKER_BITS - 4 * (position + 1))) & 0xF
+               for position in range(KICKER_COUNTS[category])]
+    return category, kickers
+
+
+def straight_high(rank_mask: int):
+    """Return the value of the highest card of the best straight in a 13-bit rank mask, or None."""
+    for high in range(NUM_RANKS - 1, 3, -1):
+        window = 0x1F << (high - 4)
+        if rank_mask & window == window:
+            return high + 2
+    wheel = (1 << 12) | 0xF  # A-2-3-4-5
+    if rank_mask & wheel == wheel:
+        return 5
+    return None
+
+
+def _flush_strength(rank_mask: int) -> int:
+    """Strength of the best flush or straight flush that can be made from the ranks of one suit."""
+    high = straight_high(rank_mask)
+    if high == 14:
+        return encode_strength(9, [14])  # Royal Flush
+    if high:
+        return encode_strength(8, [high])  # Straight Flush
+    values = [rank + 2 for rank in range(NUM_RANKS - 1, -1, -1) if rank_mask >> rank & 1]
+    return encode_strength(5, values[:5])
+
+
+def _multiset_strength(counts: List[int]) -> int:
+    """Strength of the best non-flush five card hand that can be made from rank counts."""
+    present = [rank for rank in range(NUM_RANKS - 1, -1, -1) if counts[rank]]
+    quads = [rank for rank in present if counts[rank] == 4]
+    trips = [rank for rank in present if counts[rank] == 3]
+    pairs = [rank for rank in present if counts[rank] == 2]
+
+    def kickers(exclude, n):
+        return [rank + 2 for rank in present if rank not in exclude][:n]
+
+    if quads:
+        return encode_strength(7, [quads[0] + 2] + kickers(quads[:1], 1))
+    if trips and (len(trips) >= 2 or pairs):
+        pair = max(trips[1:] + pairs)
+        return encode_strength(6, [trips[0] + 2, pair + 2])  # Full House
+    rank_mask = sum(1 << rank for rank in present)
+    high = straight_high(rank_mask)
+    if high:
+        return encode_strength(4, [high])
+    if trips:
+        return encode_strength(3, [trips[0] + 2] + kickers(trips[:1], 2))
+    if len(pairs) >= 2:
+        top_two = pairs[:2]
+        return encode_strength(2, [pairs[0] + 2, pairs[1] + 2] + kickers(top_two, 1))
+    if pairs:
+        return encode_strength(1, [pairs[0] + 2] + kickers(pairs[:1], 3))
+    return encode_strength(0, kickers([], 5))  # High Card
+
+
+def generate_tables() -> Tuple:
+    """
+    Build the evaluator lookup tables:
+    - noflush: rank key -> strength for every 5, 6 and 7 card rank multiset,
+    - flush: 13-bit rank mask -> strength of the best flush in that suit,
+    - flush_suit: suit key -> index of the suit holding five or more cards, or -1.
+    A 7-card hand holding a flush can never make quads or a full house, so the flush table
+    alone decides the strength whenever flush_suit is not -1.
+    """
+    noflush = {}
+    for num_cards in (5, 6, 7):
+        for ranks in combinations_with_replacement(range(NUM_RANKS), num_cards):
+            counts = [0] * NUM_RANKS
+            for rank in ranks:
+                counts[rank] += 1
+            if max(counts) > NUM_SUITS:
+                continue
+            noflush[sum(5 ** rank for rank in ranks)] = _multiset_strength(counts)
+
+    flush = [0] * (1 << NUM_RANKS)
+    for rank_mask in range(1 << NUM_RANKS):
+        if bin(rank_mask).count('1') >= 5:
+            flush[rank_mask] = _flush_strength(rank_mask)
+
+    flush_suit = [-1] * (8 ** NUM_SUITS)
+    for suit_key in range(8 ** NUM_SUITS):
+        for suit in range(NUM_SUITS):
+            if (suit_key >> (3 * suit)) & 7 >= 5:
+                flush_suit[suit_key] = suit
+    return noflush, flush, flush_suit
+
+
+def _read_tables(path: str) -> Tuple:
+    """Read the tables written by _write_tables, raising ValueError unless the file is complete and current."""
+    values = array('q')
+    with open(path, 'rb') as f:
+        values.frombytes(f.read())
+    if sys.byteorder != 'little':
+        values.byteswap()
+    header = (TABLES_MAGIC, TABLES_VERSION, NOFLUSH_ENTRIES, NOFLUSH_ENTRIES, 1 << NUM_RANKS, 8 ** NUM_SUITS)
+    if tuple(values[:len(header)]) != header or len(values) != len(header) + sum(header[2:]):
+        raise ValueError(f"{path} is not a valid version {TABLES_VERSION} table file.")
+    start = len(header)
+    keys = values[start:start + NOFLUSH_ENTRIES]
+    start += NOFLUSH_ENTRIES
+    noflush = dict(zip(keys, values[start:start + NOFLUSH_ENTRIES]))
+    start += NOFLUSH_ENTRIES
+    flush = values[start:start + (1 << NUM_RANKS)].tolist()
+    start += 1 << NUM_RANKS
+    return noflush, flush, values[start:].tolist()
+
+
+def _write_tables(path: str, tables: Tuple):
+    noflush, flush, flush_suit = tables
+    values = array('q', (TABLES_MAGIC, TABLES_VERSION, len(noflush), len(noflush), len(flush), len(flush_suit)))
+    values.extend(noflush.keys())
+    values.extend(noflush.values())
+    values.extend(flush)
+    values.extend(flush_suit)
+    if sys.byteorder != 'little':
+        values.byteswap()
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        values.tofile(f)
+    os.replace(tmp_path, path)
+
+
+def load_tables() -> Tuple:
+    """
+    Return the evaluator lookup tables, reading them from the on-disk cache when possible.
+    The cache holds raw integer arrays, never code; a missing, truncated or outdated file is rebuilt.
+    The tables are generated and written to the cache the first time they are needed.
+    """
+    path = os.path.join(get_cache_dir(), TABLES_FILENAME)
+    try:
+        return _read_tables(path)
+    except (OSError, ValueError):
+        pass
+
+    tables = generate_tables()
+    try:
+        _write_tables(path, tables)
+    except OSError:
+        pass  # A read-only cache only costs a rebuild on the next start
+    return tables
+
+
+NOFLUSH_TABLE, FLUSH_TABLE, FLUSH_SUIT_TABLE = load_tables()
+
+
+def evaluate_ids(card_ids) -> int:
+    """Return the integer strength of the best five card hand among 5 to 7 card ids (a sequence)."""
+    key = sum(map(_card_key, card_ids))
+    flush_suit = FLUSH_SUIT_TABLE[key & SUIT_KEY_MASK]
+    if flush_suit < 0:
+        return NOFLUSH_TABLE[key >> SUIT_KEY_BITS]
+    rank_mask = 0
+    for card_id in card_ids:
+        if card_id & 3 == flush_suit:
+            rank_mask |= RANK_BITS[card_id]
+    return FLUSH_TABLE[rank_mask]
+
+
+def board_state(card_ids) -> Tuple[int, int, List[int]]:
+    """
+    Precompute the key sums of shared cards (a board) so that each player's hand only adds its own cards:
+    returns (rank key, suit key, rank mask of each suit).
+    """
+    rank_key = 0
+    suit_key = 0
+    suit_masks = [0] * NUM_SUITS
+    for card_id in card_ids:
+        rank_key += RANK_KEYS[card_id]
+        suit_key += SUIT_KEYS[card_id]
+        suit_masks[card_id & 3] |= RANK_BITS[card_id]
+    return rank_key, suit_key, suit_masks
+
+
+def evaluate_with_board(state, card1: int, card2: int) -> int:
+    """Strength of two hole card ids on a board prepared by board_state; same value as evaluate_ids."""
+    rank_key, suit_key, suit_masks = state
+    flush_suit = FLUSH_SUIT_TABLE[suit_key + SUIT_KEYS[card1] + SUIT_KEYS[card2]]
+    if flush_suit < 0:
+        return NOFLUSH_TABLE[rank_key + RANK_KEYS[card1] + RANK_KEYS[card2]]
+    rank_mask = suit_masks[flush_suit]
+    if card1 & 3 == flush_suit:
+        rank_mask |= RANK_BITS[card1]
+    if card2 & 3 == flush_suit:
+        rank_mask |= RANK_BITS[card2]
+    return FLUSH_TABLE[rank_mask]
+
+
+def extend_state(state, card_id: int) -> Tuple[int, int, List[int]]:
+    """
+    Return the state of board_state with one more card, leaving the given state untouched, so a flop state
+    can be extended by each turn card and every turn state by each river card.
+    """
+    rank_key, suit_key, suit_masks = state
+    suit_masks = list(suit_masks)
+    suit_masks[card_id & 3] |= RANK_BITS[card_id]
+    return rank_key + RANK_KEYS[card_id], suit_key + SUIT_KEYS[card_id], suit_masks
+
+
+def evaluate_state(state) -> int:
+    """Strength of the 5 to 7 cards making up a state; same value as evaluate_ids on those cards."""
+    rank_key, suit_key, suit_masks = state
+    flush_suit = FLUSH_SUIT_TABLE[suit_key]
+    if flush_suit < 0:
+        return NOFLUSH_TABLE[rank_key]
+    return FLUSH_TABLE[suit_masks[flush_suit]]
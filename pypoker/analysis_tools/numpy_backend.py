@@ -0,0 +1,308 @@
+try:
+    import numpy as np
+except ImportError as e:  # numpy is optional, only this backend needs it
+    raise ImportError("The numpy equity backend requires numpy (pip install numpy).") from e
+
+import time
+from typing import Tuple
+
+from pypoker.analysis_tools.lookup_tables import (NOFLUSH_TABLE, FLUSH_TABLE, FLUSH_SUIT_TABLE,
+                                                  RANK_KEYS, SUIT_KEYS, RANK_BITS, KICKER_BITS)
+from pypoker.analysis_tools.sampling import AliasTable
+from pypoker.analysis_tools.stats import HAND_CATEGORIES, NUM_WORKER_STATS
+
+BATCH_SIZE = 1 << 16
+
+_RANK_KEYS = np.array(RANK_KEYS, dtype=np.int64)
+_SUIT_KEYS = np.array(SUIT_KEYS, dtype=np.int64)
+_RANK_BITS = np.array(RANK_BITS, dtype=np.int64)
+_CARD_MASKS = np.array([1 << card_id for card_id in range(52)], dtype=np.uint64)
+_NOFLUSH_KEYS = np.array(sorted(NOFLUSH_TABLE), dtype=np.int64)
+_NOFLUSH_VALUES = np.array([NOFLUSH_TABLE[key] for key in _NOFLUSH_KEYS.tolist()], dtype=np.int32)
+_FLUSH = np.array(FLUSH_TABLE, dtype=np.int32)
+_FLUSH_SUIT = np.array(FLUSH_SUIT_TABLE, dtype=np.int8)
+
+# Small rank keys whose sums are distinct for every 7-card rank multiset, so 7-card hands can index a dense
+# table directly instead of binary searching the sparse base-5 keys of the pure Python evaluator.
+_DENSE_RANK_KEYS = np.array([0, 1, 5, 22, 98, 453, 2031, 8698, 22854, 83661, 262349, 636345, 1479181],
+                            dtype=np.int64)
+
+
+def _build_dense_table() -> np.ndarray:
+    """Dense rank key -> strength table for all 7-card rank multisets."""
+    digits = (_NOFLUSH_KEYS[:, None] // 5 ** np.arange(13, dtype=np.int64)) % 5
+    seven = digits.sum(axis=1) == 7
+    dense_keys = digits[seven] @ _DENSE_RANK_KEYS
+    table = np.zeros(int(dense_keys.max()) + 1, dtype=np.int32)
+    table[dense_keys] = _NOFLUSH_VALUES[seven]
+    return table
+
+
+_DENSE_TABLE = _build_dense_table()
+_CARD_DENSE_KEYS = _DENSE_RANK_KEYS[np.arange(52) // 4]
+
+
+def _flush_strengths(cards: np.ndarray, flush_suit: np.ndarray) -> np.ndarray:
+    """Strength of the flush held by every row of cards in the suit given for that row."""
+    in_suit = (cards & 3) == flush_suit[:, None]
+    # Cards of one suit have distinct ranks, so the sum of their rank bits is their rank mask
+    rank_mask = (_RANK_BITS[cards] * in_suit).sum(axis=1)
+    return _FLUSH[rank_mask]
+
+
+def evaluate_batch(cards: np.ndarray) -> np.ndarray:
+    """
+    Return the integer strengths of a (batch, 5..7) array of card ids, one row per hand.
+    Same values as lookup_tables.evaluate_ids.
+    """
+    if cards.shape[1] == 7:
+        strength = _DENSE_TABLE[_CARD_DENSE_KEYS[cards].sum(axis=1)]
+    else:
+        strength = _NOFLUSH_VALUES[np.searchsorted(_NOFLUSH_KEYS, _RANK_KEYS[cards].sum(axis=1))]
+
+    flush_suit = _FLUSH_SUIT[_SUIT_KEYS[cards].sum(axis=1)]
+    has_flush = flush_suit >= 0
+    if has_flush.any():
+        strength[has_flush] = _flush_strengths(cards[has_flush], flush_suit[has_flush])
+    return strength
+
+
+def _evaluate_with_board(hole_cards: np.ndarray, community: np.ndarray,
+                         board_rank_key: np.ndarray, board_suit_key: np.ndarray) -> np.ndarray:
+    """
+    7-card strengths of (batch, 2) hole cards on (batch, 5) boards whose key sums were computed once
+    and are shared by every player.
+    """
+    rank_key = board_rank_key + _CARD_DENSE_KEYS[hole_cards].sum(axis=1)
+    strength = _DENSE_TABLE[rank_key]
+    flush_suit = _FLUSH_SUIT[board_suit_key + _SUIT_KEYS[hole_cards].sum(axis=1)]
+    has_flush = flush_suit >= 0
+    if has_flush.any():
+        cards = np.concatenate([hole_cards[has_flush], community[has_flush]], axis=1)
+        strength[has_flush] = _flush_strengths(cards, flush_suit[has_flush])
+    return strength
+
+
+def draw_without_replacement(rng, size: int, n: int, k: int) -> np.ndarray:
+    """
+    Draw k distinct indices in [0, n) for each of size rows, using Floyd's algorithm:
+    the pick for j in n-k..n-1 is uniform in [0, j] and falls back to j itself when already taken.
+    Every k-subset is equally likely (the order within a row is not uniform).
+    """
+    picks = np.empty((size, k), dtype=np.int64)
+    for column, j in enumerate(range(n - k, n)):
+        index = rng.integers(j + 1, size=size)
+        taken = (picks[:, :column] == index[:, None]).any(axis=1)
+        picks[:, column] = np.where(taken, j, index)
+    return picks
+
+
+def deal_runouts(rng, live_deck: np.ndarray, num_cards: int, dead_cards: np.ndarray) -> np.ndarray:
+    """
+    Deal num_cards distinct cards of live_deck per row of dead_cards, never one of that row's dead cards.
+    Positions are drawn among the remaining cards and shifted past the sorted dead positions, so no row
+    is ever rejected.
+    """
+    position = np.zeros(52, dtype=np.int64)
+    position[live_deck] = np.arange(len(live_deck))
+    skipped = np.sort(position[dead_cards], axis=1)
+    picks = draw_without_replacement(rng, len(dead_cards), len(live_deck) - skipped.shape[1], num_cards)
+    for column in range(skipped.shape[1]):
+        picks += skipped[:, column, None] <= picks
+    return live_deck[picks]
+
+
+def combination_arrays(combinations) -> Tuple[np.ndarray, np.ndarray]:
+    """Convert (card1 id, card2 id, mask) tuples into an (n, 2) id array and an (n,) uint64 mask array."""
+    cards = np.array([(card1, card2) for card1, card2, _ in combinations], dtype=np.int64).reshape(-1, 2)
+    masks = np.array([mask for _, _, mask in combinations], dtype=np.uint64)
+    return cards, masks
+
+
+def compatible_pairs(masks1: np.ndarray, masks2: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Indices (into range1, into range2) of every pair of combinations that share no card."""
+    return np.nonzero((masks1[:, None] & masks2[None, :]) == 0)
+
+
+def alias_arrays(weights) -> Tuple[np.ndarray, np.ndarray]:
+    """(probability, alias) arrays of the alias table of weights, for draw_alias."""
+    table = AliasTable(weights)
+    return np.array(table.probability), np.array(table.alias, dtype=np.int64)
+
+
+def draw_alias(rng, table: Tuple[np.ndarray, np.ndarray], size: int) -> np.ndarray:
+    """Draw size indices from an alias table built by alias_arrays."""
+    probability, alias = table
+    index = rng.integers(len(probability), size=size)
+    return np.where(rng.random(size) < probability[index], index, alias[index])
+
+
+def weighted_pair_table(masks1: np.ndarray, masks2: np.ndarray, weights1,
+                        weights2) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    (range1 indices, range2 indices, cumulative weights) of the compatible pairs of positive weight1 * weight2,
+    for weighted_pairs. The cumulative weights are empty when no such pair exists.
+    """
+    pairs1, pairs2 = compatible_pairs(masks1, masks2)
+    weights = np.asarray(weights1, dtype=np.float64)[pairs1] * np.asarray(weights2, dtype=np.float64)[pairs2]
+    positive = weights > 0
+    return pairs1[positive], pairs2[positive], np.cumsum(weights[positive])
+
+
+def weighted_pairs(rng, size: int, table) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Indices (into range1, into range2) of size pairs of non-overlapping combinations drawn with probability
+    proportional to weight1 * weight2 from a weighted_pair_table, which only holds compatible pairs, so no
+    draw is ever rejected.
+    """
+    pairs1, pairs2, cumulative = table
+    pair = np.searchsorted(cumulative, rng.random(size) * cumulative[-1], side='right')
+    # Rounding can put a point on the total weight itself
+    pair = np.minimum(pair, len(cumulative) - 1)
+    return pairs1[pair], pairs2[pair]
+
+
+def simulate(range1_combinations, range2_combinations, board_ids, num_simulations: int,
+             rng=None, batch_size: int = BATCH_SIZE, weights1=None, weights2=None, stats=False) -> Tuple:
+    """
+    Run num_simulations Monte Carlo iterations in batches.
+    Pairs are drawn uniformly from the compatible combination pairs and runouts from the cards left once
+    both hands are dealt, so every iteration counts. With weights1/weights2, pairs are drawn in proportion
+    to the product of the combination weights (see weighted_pairs).
+    Returns (wins1, wins2, ties, valid_simulations), followed with stats by the counts of
+    stats.WORKER_COUNTERS and of each hand category.
+    """
+    started = time.perf_counter()
+    empty = (0,) * (4 + NUM_WORKER_STATS if stats else 4)
+    rng = rng if rng is not None else np.random.default_rng()
+    cards1, masks1 = combination_arrays(range1_combinations)
+    cards2, masks2 = combination_arrays(range2_combinations)
+    weighted = weights1 is not None or weights2 is not None
+    if weighted:
+        weights1 = weights1 or [1.0] * len(range1_combinations)
+        weights2 = weights2 or [1.0] * len(range2_combinations)
+        pair_table = weighted_pair_table(masks1, masks2, weights1, weights2)
+        if len(pair_table[2]) == 0:
+            return empty
+    else:
+        pairs1, pairs2 = compatible_pairs(masks1, masks2)
+        if len(pairs1) == 0:
+            return empty
+
+    board = np.array(board_ids, dtype=np.int64)
+    board_mask = int(_CARD_MASKS[board].sum()) if len(board_ids) else 0
+    live_deck = np.array([card_id for card_id in range(52) if not board_mask >> card_id & 1], dtype=np.int64)
+    num_draw = 5 - len(board_ids)
+
+    wins1 = wins2 = ties = 0
+    categories = np.zeros(len(HAND_CATEGORIES), dtype=np.int64)
+    setup_seconds = time.perf_counter() - started
+    remaining = num_simulations
+    while remaining > 0:
+        size = min(batch_size, remaining)
+        remaining -= size
+
+        if weighted:
+            index1, index2 = weighted_pairs(rng, size, pair_table)
+        else:
+            pair = rng.integers(len(pairs1), size=size)
+            index1, index2 = pairs1[pair], pairs2[pair]
+        hole1 = cards1[index1]
+        hole2 = cards2[index2]
+        runout = deal_runouts(rng, live_deck, num_draw, np.concatenate([hole1, hole2], axis=1))
+
+        community = np.concatenate([np.broadcast_to(board, (size, len(board))), runout], axis=1)
+        board_rank_key = _CARD_DENSE_KEYS[community].sum(axis=1)
+        board_suit_key = _SUIT_KEYS[community].sum(axis=1)
+        strength1 = _evaluate_with_board(hole1, community, board_rank_key, board_suit_key)
+        strength2 = _evaluate_with_board(hole2, community, board_rank_key, board_suit_key)
+
+        wins1 += int(np.count_nonzero(strength1 > strength2))
+        wins2 += int(np.count_nonzero(strength1 < strength2))
+        ties += int(np.count_nonzero(strength1 == strength2))
+        if stats:
+            categories += _category_counts(strength1) + _category_counts(strength2)
+    if stats:
+        return (wins1, wins2, ties, num_simulations, setup_seconds, num_simulations, num_simulations,
+                2 * num_simulations, *categories.tolist())
+    return wins1, wins2, ties, num_simulations
+
+
+def _category_counts(strengths: np.ndarray) -> np.ndarray:
+    """Number of strengths in each hand category."""
+    return np.bincount(strengths >> KICKER_BITS, minlength=len(HAND_CATEGORIES))
+
+
+def simulate_multiway(ranges_combinations, board_ids, num_simulations: int, rng=None,
+                      batch_size: int = BATCH_SIZE, max_deals_per_simulation: int = 100,
+                      ranges_weights=None, stats=False) -> Tuple:
+    """
+    Multiway Monte Carlo simulation. The first two hands are drawn from the compatible pairs and the others
+    uniformly; rows where they overlap are dropped and drawn again in the next batch. The runout is dealt and
+    its key sums computed once per row, then every player is ranked on it. With ranges_weights, every hand is
+    drawn from its range's alias table instead and overlapping rows are dropped the same way.
+    Returns (share of player 1, ..., share of player N, split pots, valid_simulations), followed by the
+    worker counts with stats (see simulate).
+    """
+    started = time.perf_counter()
+    rng = rng if rng is not None else np.random.default_rng()
+    num_players = len(ranges_combinations)
+    arrays = [combination_arrays(combinations) for combinations in ranges_combinations]
+    if ranges_weights is not None:
+        tables = [alias_arrays(weights or [1.0] * len(combinations))
+                  for combinations, weights in zip(ranges_combinations, ranges_weights)]
+    else:
+        pairs1, pairs2 = compatible_pairs(arrays[0][1], arrays[1][1])
+        if len(pairs1) == 0:
+            return (0,) * (num_players + 2 + (NUM_WORKER_STATS if stats else 0))
+
+    board = np.array(board_ids, dtype=np.int64)
+    board_mask = int(_CARD_MASKS[board].sum()) if len(board_ids) else 0
+    live_deck = np.array([card_id for card_id in range(52) if not board_mask >> card_id & 1], dtype=np.int64)
+    num_draw = 5 - len(board_ids)
+
+    shares = np.zeros(num_players)
+    ties = valid = drawn = 0
+    categories = np.zeros(len(HAND_CATEGORIES), dtype=np.int64)
+    setup_seconds = time.perf_counter() - started
+    deals_left = num_simulations * max_deals_per_simulation
+    while valid < num_simulations and deals_left > 0:
+        size = min(batch_size, deals_left)
+        deals_left -= size
+
+        if ranges_weights is not None:
+            indices = [draw_alias(rng, table, size) for table in tables]
+        else:
+            pair = rng.integers(len(pairs1), size=size)
+            indices = [pairs1[pair], pairs2[pair]]
+            indices += [rng.integers(len(cards), size=size) for cards, _ in arrays[2:]]
+        used = np.zeros(size, dtype=np.uint64)
+        keep = np.ones(size, dtype=bool)
+        for (_, masks), index in zip(arrays, indices):
+            keep &= (used & masks[index]) == 0
+            used |= masks[index]
+        rows = np.flatnonzero(keep)[:num_simulations - valid]
+        # Deals after the last one needed are drawn but never looked at
+        drawn += int(rows[-1]) + 1 if valid + len(rows) == num_simulations else size
+        if len(rows) == 0:
+            continue
+
+        holes = [cards[index[rows]] for (cards, _), index in zip(arrays, indices)]
+        runout = deal_runouts(rng, live_deck, num_draw, np.concatenate(holes, axis=1))
+        community = np.concatenate([np.broadcast_to(board, (len(rows), len(board))), runout], axis=1)
+        board_rank_key = _CARD_DENSE_KEYS[community].sum(axis=1)
+        board_suit_key = _SUIT_KEYS[community].sum(axis=1)
+        strengths = np.stack([_evaluate_with_board(hole, community, board_rank_key, board_suit_key)
+                              for hole in holes], axis=1)
+
+        winners = strengths == strengths.max(axis=1, keepdims=True)
+        num_winners = winners.sum(axis=1)
+        shares += (winners / num_winners[:, None]).sum(axis=0)
+        ties += int(np.count_nonzero(num_winners > 1))
+        valid += len(rows)
+        if stats:
+            categories += _category_counts(strengths.ravel())
+    if stats:
+        return (*shares.tolist(), ties, valid, setup_seconds, drawn, valid, num_players * valid,
+                *categories.tolist())
+    return (*shares.tolist(), ties, valid)
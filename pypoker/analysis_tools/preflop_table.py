@@ -0,0 +1,255 @@
+try:
+    import numpy as np
+except ImportError as e:  # numpy is optional, only the preflop table needs it
+    raise ImportError("The preflop equity table requires numpy (pip install numpy).") from e
+
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Tuple
+
+from pypoker.utils import Card, combo_index, derive_seed, get_cache_dir
+from pypoker.analysis_tools.range_parser import RangeParser
+
+TABLE_VERSION = 1
+TABLE_FILENAME = f"preflop_169_v{TABLE_VERSION}.npy"
+NUM_CLASSES = 169
+
+# Starting hand classes in the usual 13x13 grid order: ranks descend along rows and columns,
+# pairs on the diagonal, suited hands above it and offsuit hands below it.
+_DESCENDING_RANKS = Card.RANKS[::-1]
+HAND_CLASSES = [
+    _DESCENDING_RANKS[row] + _DESCENDING_RANKS[col] if row == col else
+    _DESCENDING_RANKS[row] + _DESCENDING_RANKS[col] + 's' if row < col else
+    _DESCENDING_RANKS[col] + _DESCENDING_RANKS[row] + 'o'
+    for row in range(13) for col in range(13)
+]
+
+
+def hand_class_index(card1_id: int, card2_id: int) -> int:
+    """Return the 0..168 index in HAND_CLASSES of the starting hand class of two card ids."""
+    high, low = 12 - card1_id // 4, 12 - card2_id // 4
+    if high > low:
+        high, low = low, high
+    if card1_id % 4 == card2_id % 4:
+        return high * 13 + low  # Suited (or impossible for a pair)
+    return low * 13 + high
+
+
+# Class and cards of every two card combination, by combination index
+_COMBO_CLASS = np.zeros(1326, dtype=np.int64)
+_COMBO_CARD1 = np.zeros(1326, dtype=np.int64)
+_COMBO_CARD2 = np.zeros(1326, dtype=np.int64)
+for _card1 in range(52):
+    for _card2 in range(_card1 + 1, 52):
+        _COMBO_CLASS[combo_index(_card1, _card2)] = hand_class_index(_card1, _card2)
+        _COMBO_CARD1[combo_index(_card1, _card2)] = _card1
+        _COMBO_CARD2[combo_index(_card1, _card2)] = _card2
+# Number of combinations in each class: 6 per pair, 4 per suited and 12 per offsuit hand
+_CLASS_SIZES = np.bincount(_COMBO_CLASS, minlength=NUM_CLASSES)
+
+
+def is_class_union(combinations, weights=None) -> bool:
+    """
+    Whether a range is a union of complete starting hand classes with equal weights, the only ranges the table
+    answers exactly: specific combinations, partial classes or weights would get class-averaged equities.
+    """
+    if weights is not None and any(weight != weights[0] for weight in weights):
+        return False
+    class_counts = np.bincount(_COMBO_CLASS, weights=_combo_counts(combinations), minlength=NUM_CLASSES)
+    return bool(((class_counts == 0) | (class_counts == _CLASS_SIZES)).all())
+
+
+class PreflopEquityTable:
+    """
+    Equity of every starting hand class against every other, estimated once by Monte Carlo and stored as a
+    (3, 169, 169) float32 .npy file: equity (win + tie / 2), tie frequency and number of samples.
+    Loaded tables are memory-mapped, and range vs range queries become weighted sums over class pairs.
+    """
+
+    def __init__(self, data: np.ndarray):
+        if data.shape != (3, NUM_CLASSES, NUM_CLASSES):
+            raise ValueError(f"Invalid preflop table shape {data.shape}.")
+        self.data = data
+        self.equity = data[0]
+        self.ties = data[1]
+        self.samples = data[2]
+
+    @staticmethod
+    def default_path() -> str:
+        return os.path.join(get_cache_dir(), TABLE_FILENAME)
+
+    @staticmethod
+    def load(path=None, mmap=True):
+        """
+        Load a table, memory-mapped by default. Returns None if the file does not exist or is not a valid table
+        (truncated, corrupt or of another shape), so a bad cached table is simulated around rather than fatal.
+        """
+        path = path or PreflopEquityTable.default_path()
+        try:
+            return PreflopEquityTable(np.load(path, mmap_mode='r' if mmap else None))
+        except (OSError, ValueError):
+            return None
+
+    def save(self, path=None):
+        path = path or PreflopEquityTable.default_path()
+        tmp_path = f"{path}.{os.getpid()}.tmp.npy"
+        np.save(tmp_path, np.asarray(self.data, dtype=np.float32))
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def build(num_samples=20000, workers=1, seed=0, progress=None):
+        """
+        Estimate all class pairs with num_samples simulations each. Only the upper triangle is simulated;
+        the lower one follows from equity[b, a] = 1 - equity[a, b].
+        progress, if given, is called with the number of finished rows.
+        """
+        data = np.zeros((3, NUM_CLASSES, NUM_CLASSES), dtype=np.float32)
+        jobs = [(row, num_samples, seed) for row in range(NUM_CLASSES)]
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                rows = executor.map(_build_row, *zip(*jobs))
+                PreflopEquityTable._fill_rows(data, rows, progress)
+        else:
+            PreflopEquityTable._fill_rows(data, (_build_row(*job) for job in jobs), progress)
+        return PreflopEquityTable(data)
+
+    @staticmethod
+    def _fill_rows(data, rows, progress):
+        for done, (row, values) in enumerate(rows, start=1):
+            equity, ties, samples = values
+            data[0, row, row:] = equity
+            data[0, row:, row] = 1 - equity
+            data[1, row, row:] = data[1, row:, row] = ties
+            data[2, row, row:] = data[2, row:, row] = samples
+            data[0, row, row] = 0.5  # A class against itself is symmetric
+            if progress is not None:
+                progress(done)
+
+    def pair_weights(self, range1_combinations, range2_combinations, weights1=None, weights2=None) -> np.ndarray:
+        """
+        Number of non-overlapping combination pairs between the two ranges for every (class1, class2),
+        or their total weight (product of the combination weights) for weighted ranges.
+        Pairs sharing cards are removed through per-class card counts, without looping over pairs.
+        """
+        counts1 = _combo_counts(range1_combinations, weights1)
+        counts2 = _combo_counts(range2_combinations, weights2)
+        class_cards1 = _class_card_counts(counts1)
+        class_cards2 = _class_card_counts(counts2)
+        class_counts1 = np.bincount(_COMBO_CLASS, weights=counts1, minlength=NUM_CLASSES)
+        class_counts2 = np.bincount(_COMBO_CLASS, weights=counts2, minlength=NUM_CLASSES)
+        # Pairs sharing one card are counted once by the card product, identical combinations twice
+        identical = np.bincount(_COMBO_CLASS, weights=counts1 * counts2, minlength=NUM_CLASSES)
+        return np.outer(class_counts1, class_counts2) - class_cards1 @ class_cards2.T + np.diag(identical)
+
+    def range_equity(self, range1_combinations, range2_combinations, weights1=None,
+                     weights2=None) -> Dict[str, float]:
+        """
+        Preflop equity of two ranges given as (card1 id, card2 id, mask) combinations and optional combination
+        weights, as a weighted average of the class vs class equities. Same result keys as EquityCalculator;
+        'simulations' is the number (or total weight) of combination pairs looked up.
+        """
+        weights = self.pair_weights(range1_combinations, range2_combinations, weights1, weights2)
+        total = weights.sum()
+        if total <= 0:
+            return {'range1': 0, 'range2': 0, 'ties': 0, 'simulations': 0}
+        equity = float((weights * self.equity).sum() / total * 100)
+        ties = float((weights * self.ties).sum() / total * 100)
+        return {'range1': equity, 'range2': 100 - equity, 'ties': ties, 'simulations': int(round(total))}
+
+    def verify(self, num_checks=20, num_samples=20000, seed=1, tolerance=5.0) -> List[str]:
+        """
+        Check the table for consistency and spot-check random class pairs against a fresh simulation.
+        A pair fails when it is more than tolerance combined standard errors away. Returns the problems found.
+        """
+        problems = []
+        if not np.allclose(self.equity + self.equity.T, 1, atol=1e-5):
+            problems.append("equity[a, b] + equity[b, a] is not 1 everywhere")
+        if not np.allclose(self.ties, self.ties.T, atol=1e-6):
+            problems.append("tie frequencies are not symmetric")
+        if (self.samples <= 0).any():
+            problems.append("some class pairs have no samples")
+
+        rng = np.random.default_rng(seed)
+        for row, col in rng.integers(NUM_CLASSES, size=(num_checks, 2)).tolist():
+            _, (equity, ties, samples) = _build_row(row, num_samples, ('verify', seed), columns=[col])
+            expected = self.equity[row, col]
+            stderr = np.sqrt(max(expected * (1 - expected), 1e-4) * (1 / samples[0] + 1 / self.samples[row, col]))
+            if abs(equity[0] - expected) > tolerance * stderr:
+                problems.append(f"{HAND_CLASSES[row]} vs {HAND_CLASSES[col]}: table {expected:.4f}, "
+                                f"simulation {equity[0]:.4f}")
+        return problems
+
+
+def _combo_counts(combinations, weights=None) -> np.ndarray:
+    counts = np.zeros(1326)
+    for i, (card1, card2, _) in enumerate(combinations):
+        counts[combo_index(card1, card2)] += 1 if weights is None else weights[i]
+    return counts
+
+
+def _class_card_counts(counts: np.ndarray) -> np.ndarray:
+    """(169, 52) number of combinations of each class holding each card, weighted by counts."""
+    class_cards = np.bincount(_COMBO_CLASS * 52 + _COMBO_CARD1, weights=counts, minlength=NUM_CLASSES * 52)
+    class_cards += np.bincount(_COMBO_CLASS * 52 + _COMBO_CARD2, weights=counts, minlength=NUM_CLASSES * 52)
+    return class_cards.reshape(NUM_CLASSES, 52)
+
+
+def _build_row(row, num_samples, seed, columns=None) -> Tuple[int, Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """Simulate one table row against the classes in columns (default: row..168)."""
+    from pypoker.analysis_tools import numpy_backend
+
+    columns = list(range(row, NUM_CLASSES)) if columns is None else columns
+    range1 = RangeParser.generate_combination_ids(HAND_CLASSES[row])
+    equity = np.zeros(len(columns))
+    ties = np.zeros(len(columns))
+    samples = np.zeros(len(columns))
+    for i, col in enumerate(columns):
+        range2 = RangeParser.generate_combination_ids(HAND_CLASSES[col])
+        rng = np.random.default_rng(derive_seed(seed, row, col))
+        wins1, _, num_ties, valid = numpy_backend.simulate(range1, range2, [], num_samples, rng=rng)
+        if valid:
+            equity[i] = (wins1 + num_ties / 2) / valid
+            ties[i] = num_ties / valid
+        samples[i] = valid
+    return row, (equity, ties, samples)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or verify the 169x169 preflop equity table.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build_parser = subparsers.add_parser('build', help="Simulate every class pair and write the table.")
+    build_parser.add_argument('--samples', type=int, default=20000, help="Simulations per class pair.")
+    build_parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    build_parser.add_argument('--seed', type=int, default=0)
+    build_parser.add_argument('--out', default=None, help="Output path (default: the cache directory).")
+    verify_parser = subparsers.add_parser('verify', help="Check a table against fresh simulations.")
+    verify_parser.add_argument('--path', default=None)
+    verify_parser.add_argument('--checks', type=int, default=20, help="Number of class pairs to re-simulate.")
+    verify_parser.add_argument('--samples', type=int, default=20000)
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        def progress(done):
+            print(f"\r{done}/{NUM_CLASSES} rows", end='', file=sys.stderr, flush=True)
+
+        table = PreflopEquityTable.build(args.samples, args.workers, args.seed, progress)
+        path = args.out or PreflopEquityTable.default_path()
+        table.save(path)
+        print(f"\nWrote {path}", file=sys.stderr)
+        return 0
+
+    table = PreflopEquityTable.load(args.path)
+    if table is None:
+        print("No valid preflop table found, run the build command first.", file=sys.stderr)
+        return 1
+    problems = table.verify(args.checks, args.samples)
+    for problem in problems:
+        print(problem, file=sys.stderr)
+    print("OK" if not problems else f"{len(problems)} problem(s) found")
+    return 1 if problems else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,5 +1,216 @@
+from functools import lru_cache
 from pypoker.utils import *
-from typing import List
+from typing import List, Optional, Tuple
+
+NUM_COMBOS = 1326
+
+# (higher card id, lower card id) and card mask of every two card combination, by combo_index
+COMBO_CARDS = [None] * NUM_COMBOS
+COMBO_MASKS = [0] * NUM_COMBOS
+for _card1 in range(52):
+    for _card2 in range(_card1 + 1, 52):
+        COMBO_CARDS[combo_index(_card1, _card2)] = (_card2, _card1)
+        COMBO_MASKS[combo_index(_card1, _card2)] = (1 << _card1) | (1 << _card2)
+# Bit i of CARD_COMBO_BITS[card id] is set when combination i holds that card
+CARD_COMBO_BITS = [sum(1 << index for index in range(NUM_COMBOS) if COMBO_MASKS[index] >> card_id & 1)
+                   for card_id in range(52)]
+
+
+def dead_combo_bits(dead_mask: int) -> int:
+    """Bitmask over combination indices of every combination holding a card of dead_mask."""
+    bits = 0
+    while dead_mask:
+        low = dead_mask & -dead_mask
+        bits |= CARD_COMBO_BITS[low.bit_length() - 1]
+        dead_mask ^= low
+    return bits
+
+
+class Range:
+    """
+    A hand range compiled once from its notation: the weight (0 to 1) of each of the 1326 two card
+    combinations in a tuple indexed by combo_index, and a bitmask over the same indices of the
+    combinations in the range. Dead cards are removed by clearing their combinations from the bitmask.
+    Use Range.parse, which memoizes ranges by notation; ranges are immutable.
+    """
+    __slots__ = ('notation', 'weights', 'bits', 'weighted', '_combinations', '_combination_weights')
+
+    def __init__(self, weights, notation: str = ''):
+        if len(weights) != NUM_COMBOS:
+            raise ValueError(f"A range needs {NUM_COMBOS} weights, got {len(weights)}.")
+        self.notation = notation
+        self.weights = tuple(float(weight) for weight in weights)
+        self.bits = sum(1 << index for index, weight in enumerate(self.weights) if weight > 0)
+        # Whether some combination has a weight other than 0 or 1
+        self.weighted = any(0 < weight < 1 for weight in self.weights)
+        self._combinations = {}
+        self._combination_weights = {}
+
+    @staticmethod
+    @lru_cache(maxsize=1024)
+    def parse(notation: str) -> 'Range':
+        """
+        Compile a range like "22+, A2s-A5s, KTo+, AK, QJs:0.5, AhKh". Supported tokens, separated by commas:
+        pairs ("TT"), suited, offsuit or all combinations of two ranks ("AKs", "AKo", "AK"), "+" forms
+        ("TT+" up to AA, "ATs+" up to AKs with the first rank fixed), dash ranges ("22-55", "A2s-A5s"),
+        specific combinations ("AhKh") and a ":weight" suffix on any of them. A later token overrides
+        the weight given to a combination by an earlier one. Raises ValueError on invalid notation, including
+        an empty notation or an empty token ("AA,,KK").
+        """
+        weights = [0.0] * NUM_COMBOS
+        for token in notation.split(','):
+            token = token.strip()
+            if not token:
+                raise ValueError(f"Empty token in range {notation!r}.")
+            body, _, weight_str = token.partition(':')
+            weight = _parse_weight(weight_str, token) if weight_str else 1.0
+            for index in _token_combos(body.strip()):
+                weights[index] = weight
+        return Range(weights, notation)
+
+    def combinations(self, dead_mask: int = 0) -> List[Tuple[int, int, int]]:
+        """
+        (card1 id, card2 id, mask) of the combinations in the range that hold no card of dead_mask, highest
+        card first. The lists are built once per dead mask and shared, so they must not be modified.
+        """
+        combinations = self._combinations.get(dead_mask)
+        if combinations is None:
+            if len(self._combinations) >= 256:
+                self._combinations.clear()
+            combinations = []
+            bits = self.bits & ~dead_combo_bits(dead_mask)
+            while bits:
+                low = bits & -bits
+                index = low.bit_length() - 1
+                combinations.append((*COMBO_CARDS[index], COMBO_MASKS[index]))
+                bits ^= low
+            self._combinations[dead_mask] = combinations
+        return combinations
+
+    def combination_weights(self, dead_mask: int = 0) -> Optional[List[float]]:
+        """Weights of the combinations listed by combinations(dead_mask), in the same order; None if all are 1."""
+        if not self.weighted:
+            return None
+        weights = self._combination_weights.get(dead_mask)
+        if weights is None:
+            if len(self._combination_weights) >= 256:
+                self._combination_weights.clear()
+            weights = [self.weights[combo_index(card1, card2)] for card1, card2, _ in self.combinations(dead_mask)]
+            self._combination_weights[dead_mask] = weights
+        return weights
+
+    def without(self, dead_mask: int) -> 'Range':
+        """A copy of the range without the combinations holding a card of dead_mask."""
+        dead_bits = dead_combo_bits(dead_mask)
+        return Range([0.0 if dead_bits >> index & 1 else weight for index, weight in enumerate(self.weights)],
+                     self.notation)
+
+    def weight(self, card1_id: int, card2_id: int) -> float:
+        return self.weights[combo_index(card1_id, card2_id)]
+
+    def total_weight(self, dead_mask: int = 0) -> float:
+        """Sum of the weights of the combinations holding no card of dead_mask."""
+        return sum(self.weights[combo_index(card1, card2)] for card1, card2, _ in self.combinations(dead_mask))
+
+    def __len__(self):
+        return bin(self.bits).count('1')
+
+    def __contains__(self, combination):
+        card1, card2 = combination
+        return self.weights[combo_index(card1, card2)] > 0
+
+    def __eq__(self, other):
+        return isinstance(other, Range) and self.weights == other.weights
+
+    def __hash__(self):
+        return hash(self.bits)
+
+    def __repr__(self):
+        return f"Range({self.notation!r})"
+
+    def __reduce__(self):
+        return Range, (self.weights, self.notation)
+
+
+def _parse_weight(weight_str: str, token: str) -> float:
+    try:
+        weight = float(weight_str)
+    except ValueError:
+        raise ValueError(f"Invalid weight in {token!r}.") from None
+    if not 0 <= weight <= 1:
+        raise ValueError(f"Weights must be between 0 and 1 in {token!r}.")
+    return weight
+
+
+def _rank_index(rank: str, token: str) -> int:
+    if rank not in Card.RANKS:
+        raise ValueError(f"Invalid rank {rank!r} in {token!r}.")
+    return Card.RANKS.index(rank)
+
+
+def _parse_class(notation: str, token: str) -> Tuple[int, int, str]:
+    """(higher rank index, lower rank index, suffix) of a class like "AKs", "AKo", "AK" or "TT"."""
+    if len(notation) not in (2, 3) or (len(notation) == 3 and notation[2] not in 'so'):
+        raise ValueError(f"Invalid hand notation {token!r}.")
+    high, low = _rank_index(notation[0], token), _rank_index(notation[1], token)
+    suffix = notation[2:]
+    if high < low:
+        high, low = low, high
+    if high == low and suffix:
+        raise ValueError(f"A pair cannot be suited or offsuit in {token!r}.")
+    return high, low, suffix
+
+
+def _class_combos(high: int, low: int, suffix: str) -> List[int]:
+    """Combination indices of a pair, or of the suited ('s'), offsuit ('o') or all ('') combinations of two ranks."""
+    indices = []
+    for suit1 in range(4):
+        for suit2 in range(4):
+            card1, card2 = high * 4 + suit1, low * 4 + suit2
+            if card1 == card2 or (high == low and suit1 > suit2):
+                continue
+            if (suffix == 's' and suit1 != suit2) or (suffix == 'o' and suit1 == suit2):
+                continue
+            indices.append(combo_index(card1, card2))
+    return indices
+
+
+def _token_classes(body: str) -> List[Tuple[int, int, str]]:
+    """Expand a "+", dash or single class token into its (higher rank, lower rank, suffix) classes."""
+    if '-' in body:
+        start, _, end = body.partition('-')
+        high1, low1, suffix1 = _parse_class(start.strip(), body)
+        high2, low2, suffix2 = _parse_class(end.strip(), body)
+        if suffix1 != suffix2:
+            raise ValueError(f"Both ends of {body!r} must have the same suffix.")
+        if high1 == low1 and high2 == low2:
+            return [(rank, rank, '') for rank in range(min(high1, high2), max(high1, high2) + 1)]
+        if high1 != high2 or high1 == low1 or high2 == low2:
+            raise ValueError(f"Dash ranges must be two pairs or share their first rank: {body!r}.")
+        return [(high1, low, suffix1) for low in range(min(low1, low2), max(low1, low2) + 1)]
+    if body.endswith('+'):
+        high, low, suffix = _parse_class(body[:-1], body)
+        if high == low:
+            return [(rank, rank, '') for rank in range(high, len(Card.RANKS))]
+        return [(high, kicker, suffix) for kicker in range(low, high)]
+    return [_parse_class(body, body)]
+
+
+def _token_combos(body: str) -> List[int]:
+    """Combination indices of one token without its weight."""
+    if len(body) == 4 and body[1] in Card.SUIT_CHARS and body[3] in Card.SUIT_CHARS:
+        try:
+            card1, card2 = Card.from_string(body[:2]), Card.from_string(body[2:])
+        except (AssertionError, ValueError, KeyError):
+            raise ValueError(f"Invalid combination {body!r}.") from None
+        if card1 is card2:
+            raise ValueError(f"A combination needs two different cards: {body!r}.")
+        return [combo_index(card1.id, card2.id)]
+    return [index for high, low, suffix in _token_classes(body) for index in _class_combos(high, low, suffix)]
+
+
+def _class_name(high: int, low: int, suffix: str) -> str:
+    return Card.RANKS[high] + Card.RANKS[low] + suffix
 
 
 class RangeParser:
@@ -9,13 +220,15 @@ class RangeParser:
     @staticmethod
     def parse_hand_range(hand_range: str) -> List[str]:
         """
-        Parse a string of a poker hand range into individual hands.
+        Parse a string of a poker hand range into individual hands (weights are dropped, see Range.parse).
         Example: "22+, AKs, A2s-A5s" -> ["22", "33", "44", ..., "AKs", "A2s", ..., "A5s"]
         """
         hands = []
         segments = hand_range.split(',')
         for segment in segments:
-            segment = segment.strip()
+            segment = segment.partition(':')[0].strip()
+            if not segment:
+                continue
             if '-' in segment:
                 hands.extend(RangeParser.expand_range(segment))
             elif '+' in segment:
@@ -28,70 +241,44 @@ class RangeParser:
     def expand_plus(segment: str) -> List[str]:
         """
         Expand a hand with a "+" sign.
-        Example: "88+" -> ["88", "99", "TT", "JJ", "QQ", "KK", "AA"]
+        Example: "88+" -> ["88", "99", "TT", "JJ", "QQ", "KK", "AA"], "ATs+" -> ["ATs", "AJs", "AQs", "AKs"]
         """
-        rank_order = Card.RANKS
-        start_rank = segment[:2]  # First two characters, e.g., "88"
-        start_index = rank_order.index(start_rank[0])
-        pairs = [f"{rank_order[i]}{rank_order[i]}" for i in range(start_index, len(rank_order))]
-        return pairs
+        return [_class_name(*hand_class) for hand_class in _token_classes(segment)]
 
     @staticmethod
     def expand_range(segment: str) -> List[str]:
         """
-        Expand a range notation like "A2s-A5s" into ["A2s", "A3s", "A4s", "A5s"].
+        Expand a range notation like "A2s-A5s" into ["A2s", "A3s", "A4s", "A5s"], or "22-44" into ["22", "33", "44"].
         """
-        start_hand, end_hand = segment.split('-')
-        assert len(start_hand) == len(end_hand), "Invalid range notation"
-
-        if len(start_hand) == 3:  # For suited or offsuit notations like "A2s"
-            suit = start_hand[-1]  # Get the last character 's' or 'o'
-            rank_order = Card.RANKS
-            start_index = rank_order.index(start_hand[1])
-            end_index = rank_order.index(end_hand[1]) + 1
-            expanded_hands = [f"{start_hand[0]}{rank_order[i]}{suit}" for i in range(start_index, end_index)]
-            return expanded_hands
-
-        return []
+        return [_class_name(*hand_class) for hand_class in _token_classes(segment)]
 
     @staticmethod
     def generate_combinations(hand_range_str: str) -> List[Hand]:
         """
         Generate all possible hand combinations for a range string like "AA, KK, AKs, AKo",
         """
-        hands_notation = RangeParser.parse_hand_range(hand_range_str)
-        all_combinations = []
-        for hand_notation in hands_notation:
-            combinations = RangeParser.generate_combinations_from_notation(hand_notation)
-            all_combinations.extend(combinations)
-        return all_combinations
+        return [Hand([Card.from_id(card1), Card.from_id(card2)])
+                for card1, card2, _ in Range.parse(hand_range_str).combinations()]
 
     @staticmethod
     def generate_combinations_from_notation(hand_notation: str) -> List[Hand]:
         """
         Return all possible card combinations for a hand notation like "AKs" or "55",
         """
-        if len(hand_notation) == 2:  # Pocket pairs like "AA"
-            rank1, rank2 = hand_notation[0], hand_notation[1]
-            assert rank1 == rank2, "Invalid pocket pair notation"
-            return [
-                Hand([Card(rank1, suit1), Card(rank2, suit2)])
-                for suit1 in Card.SUITS
-                for suit2 in Card.SUITS
-                if suit1 < suit2  # Avoid duplicates by ensuring suit1 < suit2
-            ]
-        elif len(hand_notation) == 3:
-            rank1, rank2, connector = hand_notation[0], hand_notation[1], hand_notation[2]
-            if connector == 's':  # Suited
-                return [
-                    Hand([Card(rank1, suit), Card(rank2, suit)])
-                    for suit in Card.SUITS
-                ]
-            elif connector == 'o':  # Offsuit
-                return [
-                    Hand([Card(rank1, suit1), Card(rank2, suit2)])
-                    for suit1 in Card.SUITS
-                    for suit2 in Card.SUITS
-                    if suit1 != suit2
-                ]
-        return []
+        return [Hand([Card.from_id(COMBO_CARDS[index][0]), Card.from_id(COMBO_CARDS[index][1])])
+                for index in _token_combos(hand_notation)]
+
+    @staticmethod
+    def generate_combination_ids(hand_range, dead_mask: int = 0) -> List[Tuple[int, int, int]]:
+        """
+        Generate the combinations of a range (notation string or Range) as (card1 id, card2 id, mask) tuples
+        for the equity loops, leaving out combinations that use any card of dead_mask.
+        """
+        hand_range = hand_range if isinstance(hand_range, Range) else Range.parse(hand_range)
+        return hand_range.combinations(dead_mask)
+
+    @staticmethod
+    def generate_combination_weights(hand_range, dead_mask: int = 0) -> Optional[List[float]]:
+        """Weights matching generate_combination_ids(hand_range, dead_mask), or None when every weight is 1."""
+        hand_range = hand_range if isinstance(hand_range, Range) else Range.parse(hand_range)
+        return hand_range.combination_weights(dead_mask)
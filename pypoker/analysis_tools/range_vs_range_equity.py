@@ -1,220 +1,693 @@
-from collections import defaultdict
 import random
-import matplotlib.pyplot as plt
-from typing import Dict
+import time
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations
+from math import comb, sqrt
+from typing import Dict, Iterator, List, Optional, Tuple
 from pypoker.utils import *
-from pypoker.analysis_tools.hand_evaluator import HandEvaluator
-from pypoker.analysis_tools.range_parser import RangeParser
+from pypoker.analysis_tools.lookup_tables import KICKER_BITS, board_state, evaluate_with_board, extend_state
+from pypoker.analysis_tools.equity_cache import EquityCache, canonical_query
+from pypoker.analysis_tools.range_parser import Range, RangeParser
+from pypoker.analysis_tools.sampling import (AliasTable, ComboPairSampler, RunoutDealer, WeightedPairSampler,
+                                            compatible_weights)
+from pypoker.analysis_tools.stats import HAND_CATEGORIES, NO_STATS, NUM_WORKER_STATS, QueryStats
+
+
+# A multiway simulation gives up after this many deals per requested simulation, for ranges that (nearly)
+# never fit together, and calculate_equity raises ValueError instead of returning fewer simulations.
+MAX_DEALS_PER_SIMULATION = 100
 
 
 class EquityCalculator:
-    def __init__(self):
-        self.deck = [Card(rank, suit) for rank in Card.RANKS for suit in Card.SUITS]
+    """
+    Range vs range equity calculations. Ranges are given either as notation strings like "TT+, AKs" or as
+    compiled Range objects (see range_parser.Range); strings are compiled once and memoized.
+    """
+    # With exact=None, a query is enumerated exactly when its number of (combo pair, runout) outcomes is at most
+    # this many times num_simulations; comparing two ranked combos is far cheaper than one Monte Carlo iteration.
+    EXACT_WORK_FACTOR = 20
+    BACKENDS = ('python', 'numpy')
+    SAMPLING_MODES = ('proportional', 'stratified')
+    # Share of the simulations spent on the pilot round of stratified sampling
+    STRATIFIED_PILOT_FRACTION = 0.2
+    # Simulations are split into chunks of this size, each with its own random stream derived from the seed.
+    # The split does not depend on the number of workers, so a seed gives the same result for any worker count on
+    # a given backend. The backends draw their samples differently, so their results for a seed differ.
+    CHUNK_SIZE = 1 << 14
+
+    def __init__(self, backend='python', workers=1, seed=None, preflop_table='auto', cache_size=1024,
+                 cache_path=None, sampling='proportional', stats=False, stats_hook=None):
+        """
+        backend: 'python' runs the Monte Carlo loop one simulation at a time,
+                 'numpy' draws and scores simulations in large vectorized batches (requires numpy).
+                 Multiway queries (3 or more ranges) use the numpy engine on both backends when numpy is
+                 installed (see simulate_multiway_chunk).
+        workers: number of processes the simulations and enumerations are split across.
+        seed: root seed making every query reproducible for any number of workers on a given backend;
+              None draws a fresh seed for each query.
+        preflop_table: PreflopEquityTable (or path to one) answering preflop queries on whole hand classes.
+                       'auto' memory-maps the default table if it has been built and is valid, None always
+                       simulates. A given path that holds no valid table raises ValueError.
+        cache_size: number of results kept in the LRU cache of equity queries (0 disables it). Queries are keyed
+                    by their canonical form under suit relabelling, so isomorphic queries share an entry.
+                    Only exact results, and simulated ones when a seed is set, are cached.
+        cache_path: optional file persisting cached results across runs.
+        sampling: 'proportional' deals combinations in proportion to their range weights,
+                  'stratified' gives every range1 combination its own share of the simulations and recombines
+                  them with their exact probabilities, which lowers the error for the same number of
+                  simulations (two range queries of a fixed size; other queries sample proportionally).
+        stats: record statistics of every calculate_* query (see stats.QueryStats.as_dict): wall time per
+               phase, samples drawn/accepted/rejected, evaluator calls, hand category frequencies and cache
+               lookups. They are returned under the result's 'stats' key and kept in last_stats.
+               Off by default, when the only cost is a few no-op calls per query.
+        stats_hook: callable receiving the statistics of every query (implies stats), e.g. stats.logging_hook().
+        """
+        if backend not in self.BACKENDS:
+            raise ValueError(f"Unknown backend {backend!r}, expected one of {self.BACKENDS}.")
+        if sampling not in self.SAMPLING_MODES:
+            raise ValueError(f"Unknown sampling {sampling!r}, expected one of {self.SAMPLING_MODES}.")
+        if workers < 1:
+            raise ValueError("workers must be at least 1.")
+        self.backend = backend
+        self.workers = workers
+        self.seed = seed
+        self.sampling = sampling
+        self.deck = list(DECK)
+        self._executor = None
+        self.preflop_table = self._load_preflop_table(preflop_table)
+        self.cache = EquityCache(cache_size, cache_path)
+        self.stats = stats or stats_hook is not None
+        self.stats_hook = stats_hook
+        self.last_stats = None
+        self._stats = NO_STATS  # Statistics of the query in progress
+        self._parse_cache_info = None
+
+    @staticmethod
+    def _load_preflop_table(preflop_table):
+        if preflop_table is None or not isinstance(preflop_table, str):
+            return preflop_table
+        try:
+            from pypoker.analysis_tools.preflop_table import PreflopEquityTable
+        except ImportError:
+            if preflop_table == 'auto':
+                return None  # The table needs numpy; without it preflop queries are simulated
+            raise
+        if preflop_table == 'auto':
+            return PreflopEquityTable.load()
+        table = PreflopEquityTable.load(preflop_table)
+        if table is None:
+            raise ValueError(f"{preflop_table} is not a valid preflop equity table.")
+        return table
+
+    def close(self):
+        """Shut down the worker processes, if any were started, and close the persistent cache."""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        self.cache.close()
+
+    def cache_info(self) -> Dict[str, int]:
+        """Hits, misses, evictions, size and maxsize of the result cache."""
+        return self.cache.info()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _start_stats(self):
+        """Start recording the statistics of a query when they are on."""
+        self._stats = QueryStats() if self.stats else NO_STATS
+        if self.stats:
+            self._parse_cache_info = Range.parse.cache_info()
+
+    def _finish_stats(self, result: Dict) -> Dict:
+        """Attach the statistics of the query to its result and hand them to the hook."""
+        stats, self._stats = self._stats, NO_STATS
+        if stats.enabled:
+            # Range notations compiled by the query, or found in the memo of Range.parse
+            parse_info = Range.parse.cache_info()
+            stats.add('range_parse_hits', parse_info.hits - self._parse_cache_info.hits)
+            stats.add('range_parse_misses', parse_info.misses - self._parse_cache_info.misses)
+            self.last_stats = stats.as_dict()
+            result['stats'] = self.last_stats
+            if self.stats_hook is not None:
+                self.stats_hook(self.last_stats)
+        return result
 
     def calculate_preflop_equity(self, range1_str, range2_str, num_simulations=10000) -> Dict[str, float]:
         """
         Calculate equity preflop between two ranges.
-        Uses Monte Carlo simulation for performance.
+        When a preflop table is loaded and both ranges are unions of complete starting hand classes (e.g.
+        "QQ+, AKs" but not "AhKh", "AKs:0.5, QQ" or a single suit of a class), the result is looked up in it:
+        num_simulations and the seed then play no part, and 'simulations' is the number of combination pairs
+        looked up. Other queries are simulated with Monte Carlo.
         """
+        if self.preflop_table is not None:
+            from pypoker.analysis_tools.preflop_table import is_class_union
 
-        range1_combinations = RangeParser.generate_combinations(range1_str)
-        range2_combinations = RangeParser.generate_combinations(range2_str)
+            range1_combinations = RangeParser.generate_combination_ids(range1_str)
+            range2_combinations = RangeParser.generate_combination_ids(range2_str)
+            weights1 = RangeParser.generate_combination_weights(range1_str)
+            weights2 = RangeParser.generate_combination_weights(range2_str)
+            if is_class_union(range1_combinations, weights1) and is_class_union(range2_combinations, weights2):
+                self._start_stats()
+                with self._stats.phase('table_lookup'):
+                    result = self.preflop_table.range_equity(range1_combinations, range2_combinations)
+                return self._finish_stats(result)
+        return self._calculate(range1_str, range2_str, Hand(), num_simulations, exact=False)
 
-        total_simulations = num_simulations
-        valid_simulations = 0  # Track valid simulations
-        wins = defaultdict(int)
-        ties = 0
+    def calculate_flop_equity(self, range1_str, range2_str,
+                              community_cards_str, num_simulations=10000, exact=None) -> Dict[str, float]:
+        """
+        Calculate equity on the flop between two ranges given the community cards.
+        community_cards_str: string like "AsKd7c" (exactly 3 community cards)
+        exact: True enumerates every combo pair and runout, False always uses Monte Carlo,
+               None (default) enumerates when that costs no more than the simulations would.
+        """
+        community = Hand.from_string(community_cards_str)
+        if len(community) != 3:
+            raise ValueError("Exactly 3 community cards (the flop) must be provided.")
 
-        for _ in range(total_simulations):
-            # Shuffle the deck
-            deck = self.deck.copy()
-            random.shuffle(deck)
+        return self._calculate(range1_str, range2_str, community, num_simulations, exact)
 
-            # Draw hands
-            hand1 = range1_combinations[random.randint(0, len(range1_combinations) - 1)]
-            hand2 = range2_combinations[random.randint(0, len(range2_combinations) - 1)]
+    def calculate_turn_equity(self, range1_str, range2_str, community_cards_str,
+                              num_simulations=10000, exact=None) -> Dict[str, float]:
+        """
+        Calculate equity on the turn between two ranges given the community cards.
+        community_cards_str: string like "AsKd7c5h"
+        exact: True enumerates every combo pair and river card, False always uses Monte Carlo,
+               None (default) enumerates when that costs no more than the simulations would.
+        """
+        community = Hand.from_string(community_cards_str)
+        if len(community) != 4:
+            raise ValueError("Exactly 4 community cards (flop and turn) must be provided.")
 
-            # Ensure no overlapping cards
-            if set(hand1.cards) & set(hand2.cards):
-                continue  # Skip this simulation
+        return self._calculate(range1_str, range2_str, community, num_simulations, exact)
 
-            # Draw community cards
-            community = Hand(deck[:5])
-            all_cards1 = hand1.cards + community.cards
-            all_cards2 = hand2.cards + community.cards
+    def calculate_equity(self, ranges: List, board: Optional[str] = None,
+                         num_simulations=10000) -> Dict[str, float]:
+        """
+        Calculate the equity of 2 to 9 ranges against each other, preflop (board None or '') or with 3 or 4
+        community cards. Returns 'range1' ... 'rangeN' equity percentages, which add up to 100, 'ties' the
+        percentage of deals ending in a split pot (shared equally among the tied players) and 'simulations'.
+        Every simulation deals non-overlapping hands to all players, deals the runout once and ranks all
+        players on it together; two ranges use the same engine as calculate_flop_equity and friends.
+        Raises ValueError when the ranges overlap so much that fewer than num_simulations deals give every
+        player a hand within MAX_DEALS_PER_SIMULATION attempts per simulation.
+        """
+        if not 2 <= len(ranges) <= 9:
+            raise ValueError("Between 2 and 9 ranges must be provided.")
+        community = Hand.from_string(board or '')
+        if len(community) not in (0, 3, 4):
+            raise ValueError("Provide no community cards (preflop), 3 (flop) or 4 (flop and turn).")
+        if len(ranges) == 2:
+            return self._calculate(ranges[0], ranges[1], community, num_simulations, None if community else False)
 
-            # Ensure no overlapping with community
-            if set(hand1.cards) & set(community.cards) or set(hand2.cards) & set(community.cards):
-                continue  # Skip this simulation
+        self._start_stats()
+        stats = self._stats
+        with stats.phase('expand_ranges'):
+            ranges_combinations = [RangeParser.generate_combination_ids(range_str, community.mask)
+                                   for range_str in ranges]
+            ranges_weights = [RangeParser.generate_combination_weights(range_str, community.mask)
+                              for range_str in ranges]
+        if not all(ranges_combinations):
+            return self._finish_stats(self._multiway_result([0] * len(ranges), 0, 0))
+        if not any(weights is not None for weights in ranges_weights):
+            ranges_weights = None
 
-            valid_simulations += 1  # Increment valid simulation count
+        key = None
+        if self.seed is not None:  # Unseeded simulations draw fresh samples on every query
+            with stats.phase('canonicalize'):
+                key = ('multiway', canonical_query(ranges_combinations, community.ids, ranges_weights),
+                       num_simulations, self.seed, self.backend)
+        result = self._cache_get(key)
+        if result is not None:
+            return self._finish_stats(result)
 
-            # Evaluate hands
-            eval1 = HandEvaluator.evaluate_hand(all_cards1)
-            eval2 = HandEvaluator.evaluate_hand(all_cards2)
+        with stats.phase('simulate'):
+            root_seed = self._root_seed()
+            jobs = []
+            for chunk, start in enumerate(range(0, num_simulations, self.CHUNK_SIZE)):
+                jobs.append((self.backend, ranges_combinations, community.ids,
+                             min(self.CHUNK_SIZE, num_simulations - start), derive_seed(root_seed, chunk),
+                             ranges_weights, stats.enabled))
+            totals = self._run_jobs(simulate_multiway_chunk, jobs)
+            *shares, ties, valid_simulations = stats.worker_counts(totals, len(ranges) + 2)
+        if valid_simulations < num_simulations:
+            raise ValueError(f"Only {valid_simulations} of {num_simulations} simulations dealt every range a hand "
+                             f"without overlapping cards within {MAX_DEALS_PER_SIMULATION} attempts each; "
+                             "the ranges overlap too much.")
+        result = self._multiway_result(shares, ties, valid_simulations)
+        self._cache_put(key, result)
+        return self._finish_stats(result)
 
-            result = HandEvaluator.compare_hands(eval1, eval2)
-            if result == 1:
-                wins['range1'] += 1
-            elif result == -1:
-                wins['range2'] += 1
-            else:
-                ties += 1
+    def calculate_combo_equities(self, range1_str, range2_str, community_cards_str='', num_runouts=2000,
+                                 exact=None) -> Dict:
+        """
+        Equity of every combination of each range against the whole opposing range, e.g.
+        {'range1': {'AhKh': 64.2, ...}, 'range2': {...}, 'runouts': 1081}.
+        Every runout ranks each live combination once; wins and ties against all opposing combinations
+        then come from the sorted opposing strengths, minus the ones sharing a card with the combination.
+        exact: True goes over every runout, False samples num_runouts of them,
+               None (default) enumerates when there are at most num_runouts runouts (the flop and the turn).
+        Combinations that never meet a compatible opposing combination are left out.
+        Opposing combinations count in proportion to their range weights.
+        """
+        community = Hand.from_string(community_cards_str)
+        if len(community) not in (0, 3, 4):
+            raise ValueError("Provide no community cards (preflop), 3 (flop) or 4 (flop and turn).")
+        range1_combinations = RangeParser.generate_combination_ids(range1_str, community.mask)
+        range2_combinations = RangeParser.generate_combination_ids(range2_str, community.mask)
+        weights1 = RangeParser.generate_combination_weights(range1_str, community.mask)
+        weights2 = RangeParser.generate_combination_weights(range2_str, community.mask)
 
-        # Avoid division by zero
-        if valid_simulations == 0:
-            return {'range1': 0, 'range2': 0, 'ties': 0}
+        live_deck = [card.id for card in self.deck if not card.mask & community.mask]
+        num_cards = 5 - len(community)
+        if exact is None:
+            exact = comb(len(live_deck), num_cards) <= num_runouts
+        if exact:
+            runouts = list(combinations(live_deck, num_cards))
+        else:
+            rng = random.Random(derive_seed(self._root_seed(), 'combo runouts'))
+            dealer = RunoutDealer(live_deck, num_cards)
+            runouts = [tuple(dealer.deal(rng.random, ())) for _ in range(num_runouts)]
 
-        equity_range1 = (wins['range1'] + ties / 2) / valid_simulations * 100
-        equity_range2 = (wins['range2'] + ties / 2) / valid_simulations * 100
+        num_slices = max(1, min(self.workers, len(runouts)))
+        jobs = [(range1_combinations, range2_combinations, community.ids, runouts[i::num_slices], weights1, weights2)
+                for i in range(num_slices)]
+        counts = self._run_jobs(combo_runout_counts, jobs)
 
-        return {'range1': equity_range1, 'range2': equity_range2, 'ties': (ties / valid_simulations * 100)}
+        result = {'runouts': len(runouts)}
+        for name, combinations_ in (('range1', range1_combinations), ('range2', range2_combinations)):
+            points, outcomes = counts[:len(combinations_)], counts[len(combinations_):2 * len(combinations_)]
+            counts = counts[2 * len(combinations_):]
+            result[name] = {DECK[card1].to_string() + DECK[card2].to_string(): combo_points / combo_outcomes * 50
+                            for (card1, card2, _), combo_points, combo_outcomes in zip(combinations_, points, outcomes)
+                            if combo_outcomes}
+        return result
 
-    def calculate_flop_equity(self, range1_str, range2_str,
-                              community_cards_str, num_simulations=10000) -> Dict[str, float]:
+    def equity_by_next_card(self, range1_str, range2_str, community_cards_str) -> Dict[str, Dict[str, float]]:
         """
-        Calculate equity on the flop between two ranges given the community cards.
-        community_cards_str: string like "AsKd7c" (exactly 3 community cards)
+        Exact equity after each possible next card: every turn card on a 3 card board, every river card on a
+        4 card board. Returns {'Kc': {'range1': ..., 'range2': ..., 'ties': ..., 'simulations': ...}, ...}
+        in deck order, 'simulations' being the number of (combo pair, runout) outcomes behind each entry (their
+        total weight, the product of the two combination weights, with weighted ranges).
         """
-        # Parse community cards
-        community = Hand()
-        for i in range(0, len(community_cards_str), 2):
-            card_str = community_cards_str[i:i + 2]
-            community.add_card(Card.from_string(card_str))
+        runouts = self._runout_counts(range1_str, range2_str, community_cards_str, later_cards_only=False)
+        totals = {}
+        for runout, *counts in runouts:
+            card_totals = totals.setdefault(runout[0], [0, 0, 0, 0])
+            for i, count in enumerate(counts):
+                card_totals[i] += count
+        return {DECK[card_id].to_string(): self._equity_result(*counts)
+                for card_id, counts in sorted(totals.items())}
 
-        if len(community) != 3:
-            raise ValueError("Exactly 3 community cards (the flop) must be provided.")
+    def runout_distribution(self, range1_str, range2_str, community_cards_str, bins=10) -> Dict:
+        """
+        How the equity of range1 is spread over the complete runouts of a 3 or 4 card board. Each runout is
+        weighted by its number of (combo pair) outcomes, or their total weight with weighted ranges, the
+        weighting of the overall equity. Returns
+        'equity' (the weighted mean), 'stdev', 'percentiles' (10, 25, 50, 75, 90), 'histogram' (percentage of
+        the weight in each of bins equal equity intervals), 'best'/'worst' (runout, equity) and 'runouts'.
+        """
+        runouts = []
+        for runout, wins1, _, ties, outcomes in self._runout_counts(range1_str, range2_str, community_cards_str,
+                                                                    later_cards_only=True):
+            if outcomes:
+                runouts.append(((wins1 + ties / 2) / outcomes * 100, outcomes, runout))
+        if not runouts:
+            return {'equity': 0, 'stdev': 0, 'percentiles': {}, 'histogram': [0] * bins, 'best': None,
+                    'worst': None, 'runouts': 0}
 
-        range1_combinations = RangeParser.generate_combinations(range1_str)
-        range2_combinations = RangeParser.generate_combinations(range2_str)
-
-        total_simulations = num_simulations
-        valid_simulations = 0  # Track valid simulations
-        wins = defaultdict(int)
-        ties = 0
-
-        for _ in range(total_simulations):
-            # Shuffle the deck
-            deck = self.deck.copy()
-            random.shuffle(deck)
-
-            # Remove community cards from deck
-            remaining_deck = [card for card in deck if card not in community.cards]
-
-            # Draw hands
-            hand1 = range1_combinations[random.randint(0, len(range1_combinations) - 1)]
-            hand2 = range2_combinations[random.randint(0, len(range2_combinations) - 1)]
-
-            # Ensure no overlapping cards
-            if (set(hand1.cards) & set(hand2.cards)) or \
-                    (set(hand1.cards) & set(community.cards)) or \
-                    (set(hand2.cards) & set(community.cards)):
-                continue  # Skip this simulation
-
-            # Draw the turn and river cards
-            if len(remaining_deck) < 2:
-                continue  # Not enough cards to draw the turn and river
-            turn = remaining_deck[0]
-            river = remaining_deck[1]
-            all_community = community.cards + [turn, river]
-
-            valid_simulations += 1  # Increment valid simulation count
-
-            all_cards1 = hand1.cards + all_community
-            all_cards2 = hand2.cards + all_community
-
-            # Evaluate hands
-            eval1 = HandEvaluator.evaluate_hand(all_cards1)
-            eval2 = HandEvaluator.evaluate_hand(all_cards2)
-
-            result = HandEvaluator.compare_hands(eval1, eval2)
-            if result == 1:
-                wins['range1'] += 1
-            elif result == -1:
-                wins['range2'] += 1
-            else:
-                ties += 1
+        runouts.sort()
+        total = sum(weight for _, weight, _ in runouts)
+        mean = sum(equity * weight for equity, weight, _ in runouts) / total
+        variance = sum((equity - mean) ** 2 * weight for equity, weight, _ in runouts) / total
 
-        # Avoid division by zero
-        if valid_simulations == 0:
-            return {'range1': 0, 'range2': 0, 'ties': 0}
+        percentiles = {}
+        cumulative = 0
+        targets = [10, 25, 50, 75, 90]
+        for equity, weight, _ in runouts:
+            cumulative += weight
+            while targets and cumulative >= targets[0] / 100 * total:
+                percentiles[targets.pop(0)] = equity
 
-        equity_range1 = (wins['range1'] + ties / 2) / valid_simulations * 100
-        equity_range2 = (wins['range2'] + ties / 2) / valid_simulations * 100
+        histogram = [0] * bins
+        for equity, weight, _ in runouts:
+            histogram[min(int(equity / 100 * bins), bins - 1)] += weight / total * 100
 
-        return {'range1': equity_range1, 'range2': equity_range2, 'ties': ties / valid_simulations * 100}
+        def runout_string(runout):
+            return ''.join(DECK[card_id].to_string() for card_id in runout)
 
-    def calculate_turn_equity(self, range1_str, range2_str, community_cards_str,
-                              num_simulations=10000) -> Dict[str, float]:
+        return {'equity': mean, 'stdev': sqrt(variance), 'percentiles': percentiles, 'histogram': histogram,
+                'best': (runout_string(runouts[-1][2]), runouts[-1][0]),
+                'worst': (runout_string(runouts[0][2]), runouts[0][0]), 'runouts': len(runouts)}
+
+    def _runout_counts(self, range1_str, range2_str, community_cards_str, later_cards_only) -> List[Tuple]:
         """
-        Calculate equity on the turn between two ranges given the community cards.
-        community_cards_str: string like "AsKd7c5h"
+        (runout, wins1, wins2, ties, outcomes) of every runout of a 3 or 4 card board, split by next card;
+        with weighted ranges the counts are total outcome weights.
         """
-        # Parse community cards
-        community = Hand()
-        for i in range(0, len(community_cards_str), 2):
-            card_str = community_cards_str[i:i + 2]
-            community.add_card(Card.from_string(card_str))
+        community = Hand.from_string(community_cards_str)
+        if len(community) not in (3, 4):
+            raise ValueError("Exactly 3 (flop) or 4 (flop and turn) community cards must be provided.")
+        range1_combinations = RangeParser.generate_combination_ids(range1_str, community.mask)
+        range2_combinations = RangeParser.generate_combination_ids(range2_str, community.mask)
+        weights1 = RangeParser.generate_combination_weights(range1_str, community.mask)
+        weights2 = RangeParser.generate_combination_weights(range2_str, community.mask)
 
-        if len(community) != 4:
-            raise ValueError("Exactly 4 community cards (flop and turn) must be provided.")
+        live_deck = [card.id for card in self.deck if not card.mask & community.mask]
+        num_slices = min(self.workers, len(live_deck))
+        jobs = [(range1_combinations, range2_combinations, community.ids, live_deck[i::num_slices],
+                 later_cards_only, weights1, weights2) for i in range(num_slices)]
+        return [runout for runouts in self._map_jobs(runout_counts, jobs) for runout in runouts]
 
-        range1_combinations = RangeParser.generate_combinations(range1_str)
-        range2_combinations = RangeParser.generate_combinations(range2_str)
+    @staticmethod
+    def _multiway_result(shares, ties, valid_simulations) -> Dict[str, float]:
+        """Turn pot shares and split pot counts into the percentages returned by calculate_equity."""
+        result = {f'range{player}': (share / valid_simulations * 100 if valid_simulations else 0)
+                  for player, share in enumerate(shares, start=1)}
+        result['ties'] = ties / valid_simulations * 100 if valid_simulations else 0
+        result['simulations'] = valid_simulations
+        return result
 
-        total_simulations = num_simulations
-        valid_simulations = 0  # Track valid simulations
-        wins = defaultdict(int)
-        ties = 0
+    def _calculate(self, range1_str, range2_str, community: Hand, num_simulations: int,
+                   exact=False) -> Dict[str, float]:
+        """Expand both ranges against the board and dispatch to exact enumeration or Monte Carlo."""
+        self._start_stats()
+        stats = self._stats
+        board_mask = community.mask
+        with stats.phase('expand_ranges'):
+            # Combinations blocked by the board can never be dealt, so they are dropped up front
+            range1_combinations = RangeParser.generate_combination_ids(range1_str, board_mask)
+            range2_combinations = RangeParser.generate_combination_ids(range2_str, board_mask)
+            weights1 = RangeParser.generate_combination_weights(range1_str, board_mask)
+            weights2 = RangeParser.generate_combination_weights(range2_str, board_mask)
+        if not range1_combinations or not range2_combinations:
+            return self._finish_stats(self._equity_result(0, 0, 0, 0))
 
-        for _ in range(total_simulations):
-            # Shuffle the deck
-            deck = self.deck.copy()
-            random.shuffle(deck)
+        if exact is None:
+            num_runouts = comb(len(self.deck) - len(community), 5 - len(community))
+            work = num_runouts * len(range1_combinations) * len(range2_combinations)
+            exact = work <= self.EXACT_WORK_FACTOR * num_simulations
+        # Exact results only depend on the query; seeded simulated ones also on how they were sampled, and
+        # unseeded ones draw fresh samples on every query, so they are not cached
+        key = None
+        if exact or self.seed is not None:
+            with stats.phase('canonicalize'):
+                query = canonical_query([range1_combinations, range2_combinations], community.ids,
+                                        [weights1, weights2])
+            key = ('exact', query) if exact else ('simulation', query, num_simulations, self.seed, self.backend,
+                                                 self.sampling)
+        result = self._cache_get(key)
+        if result is not None:
+            return self._finish_stats(result)
 
-            # Remove community cards from deck
-            remaining_deck = [card for card in deck if card not in community.cards]
+        if exact:
+            with stats.phase('enumerate'):
+                result = self._enumerate(range1_combinations, range2_combinations, community, weights1, weights2)
+        elif self.sampling == 'stratified':
+            with stats.phase('simulate'):
+                result = self._simulate_stratified(range1_combinations, range2_combinations, community,
+                                                   num_simulations, weights1, weights2)
+        else:
+            with stats.phase('simulate'):
+                result = self._simulate(range1_combinations, range2_combinations, community, num_simulations,
+                                        weights1, weights2)
+        self._cache_put(key, result)
+        return self._finish_stats(result)
 
-            # Draw hands
-            hand1 = range1_combinations[random.randint(0, len(range1_combinations) - 1)]
-            hand2 = range2_combinations[random.randint(0, len(range2_combinations) - 1)]
+    def _cache_get(self, key) -> Optional[Dict[str, float]]:
+        """
+        Look key up in the result cache, counting the hit or miss in the query statistics. A None key (a
+        query that is not cached) always misses.
+        """
+        if key is None:
+            return None
+        with self._stats.phase('cache_lookup'):
+            result = self.cache.get(key)
+        self._stats.add('cache_misses' if result is None else 'cache_hits')
+        return result
 
-            # Ensure no overlapping cards
-            if set(hand1.cards) & set(hand2.cards) or set(hand1.cards) & set(community.cards) or set(hand2.cards) & set(
-                    community.cards):
-                continue  # Skip this simulation
+    def _cache_put(self, key, result: Dict[str, float]):
+        if key is not None:
+            self.cache.put(key, result)
 
-            # Draw the river card
-            if len(remaining_deck) < 1:
-                continue  # Not enough cards to draw the river
-            river = remaining_deck[0]
-            all_community = community.cards + [river]
+    def _enumerate(self, range1_combinations, range2_combinations, community: Hand, weights1=None,
+                   weights2=None) -> Dict[str, float]:
+        """
+        Exact equity over every runout; the runouts are split evenly across the workers.
+        Flop and turn boards go through runout_counts, which extends the board state card by card. Weighted
+        ranges weigh every outcome by the product of the two combination weights ('simulations' is then the
+        total weight of the outcomes).
+        """
+        live_deck = [card.id for card in self.deck if not card.mask & community.mask]
+        weighted = weights1 is not None or weights2 is not None
+        self._stats.add('runouts', comb(len(live_deck), 5 - len(community)))
+        if len(community) in (3, 4) and not weighted:
+            num_slices = min(self.workers, len(live_deck))
+            jobs = [(range1_combinations, range2_combinations, community.ids, live_deck[i::num_slices], True)
+                    for i in range(num_slices)]
+            totals = [0, 0, 0, 0]
+            for runouts in self._map_jobs(runout_counts, jobs):
+                for _, *counts in runouts:
+                    for i, count in enumerate(counts):
+                        totals[i] += count
+            return self._equity_result(*totals)
 
-            valid_simulations += 1  # Increment valid simulation count
+        runouts = list(combinations(live_deck, 5 - len(community)))
+        num_slices = min(self.workers, len(runouts))
+        if weighted:
+            weights1 = weights1 or [1.0] * len(range1_combinations)
+            weights2 = weights2 or [1.0] * len(range2_combinations)
+            jobs = [(range1_combinations, range2_combinations, community.ids, runouts[i::num_slices],
+                     weights1, weights2) for i in range(num_slices)]
+            result = self._equity_result(*self._run_jobs(enumerate_weighted_runouts, jobs))
+            result['simulations'] = round(result['simulations'], 6)  # Drop float summation noise
+            return result
+        jobs = [(range1_combinations, range2_combinations, community.ids, runouts[i::num_slices])
+                for i in range(num_slices)]
+        return self._equity_result(*self._run_jobs(enumerate_runouts, jobs))
 
-            all_cards1 = hand1.cards + all_community
-            all_cards2 = hand2.cards + all_community
+    def _simulate(self, range1_combinations, range2_combinations, community: Hand,
+                  num_simulations: int, weights1=None, weights2=None) -> Dict[str, float]:
+        """Monte Carlo simulation split into seeded chunks, run across the workers and merged."""
+        jobs = self._simulation_jobs(range1_combinations, range2_combinations, community, self._root_seed(),
+                                     0, num_simulations, self.CHUNK_SIZE, weights1, weights2)
+        return self._equity_result(*self._stats.worker_counts(self._run_jobs(simulate_chunk, jobs), 4))
 
-            # Evaluate hands
-            eval1 = HandEvaluator.evaluate_hand(all_cards1)
-            eval2 = HandEvaluator.evaluate_hand(all_cards2)
+    def _simulate_stratified(self, range1_combinations, range2_combinations, community: Hand,
+                             num_simulations: int, weights1=None, weights2=None) -> Dict[str, float]:
+        """
+        Stratified Monte Carlo: every range1 combination is a stratum whose probability (its weight times the
+        weight of the range2 combinations it can face) is known exactly, so only the equity within each
+        stratum is simulated. A pilot round allocates simulations in proportion to the probabilities and
+        measures the spread of each stratum; the rest go where they reduce the error most (Neyman allocation).
+        Returns the same keys as _simulate, the counts being the stratified estimates scaled to num_simulations.
+        """
+        weights1 = weights1 or [1.0] * len(range1_combinations)
+        weights2 = weights2 or [1.0] * len(range2_combinations)
+        masses = [weight * compatible for weight, compatible in
+                  zip(weights1, compatible_weights(range1_combinations, range2_combinations, weights2))]
+        total = sum(masses)
+        strata = [i for i, mass in enumerate(masses) if mass > 0]
+        if not strata:
+            return self._equity_result(0, 0, 0, 0)
+        pilot_budget = int(num_simulations * self.STRATIFIED_PILOT_FRACTION)
+        if pilot_budget < 2 * len(strata):  # Too few simulations to give every stratum a pilot
+            return self._simulate(range1_combinations, range2_combinations, community, num_simulations,
+                                  weights1, weights2)
 
-            result = HandEvaluator.compare_hands(eval1, eval2)
-            if result == 1:
-                wins['range1'] += 1
-            elif result == -1:
-                wins['range2'] += 1
-            else:
-                ties += 1
+        probabilities = [masses[i] / total for i in strata]
+        root_seed = self._root_seed()
+        pilot = self._allocate(pilot_budget, probabilities, minimum=2)
+        with self._stats.phase('stratified_pilot'):
+            counts = self._simulate_strata(range1_combinations, range2_combinations, community, strata, pilot,
+                                           weights2, root_seed, 'pilot')
+
+        spreads = []
+        for wins, ties, samples in counts:
+            mean = (wins + ties / 2) / samples
+            # A floor keeps strata that looked certain in the pilot from being starved
+            spreads.append(max(sqrt(max((wins + ties / 4) / samples - mean * mean, 0)), 0.05))
+        extra = self._allocate(num_simulations - sum(pilot),
+                               [probability * spread for probability, spread in zip(probabilities, spreads)])
+        extra_counts = self._simulate_strata(range1_combinations, range2_combinations, community, strata, extra,
+                                             weights2, root_seed, 'neyman')
+
+        win_rate = tie_rate = 0.0
+        for probability, (wins, ties, samples), (more_wins, more_ties, more_samples) in zip(probabilities, counts,
+                                                                                            extra_counts):
+            win_rate += probability * (wins + more_wins) / (samples + more_samples)
+            tie_rate += probability * (ties + more_ties) / (samples + more_samples)
+        return self._equity_result(win_rate * num_simulations, (1 - win_rate - tie_rate) * num_simulations,
+                                   tie_rate * num_simulations, num_simulations)
+
+    def _simulate_strata(self, range1_combinations, range2_combinations, community: Hand, strata,
+                         allocation, weights2, root_seed, phase) -> List[Tuple[int, int, int]]:
+        """(wins, ties, simulations) of each stratum given its number of simulations, spread over the workers."""
+        runs = [(range1_combinations[i], samples, derive_seed(root_seed, phase, i))
+                for i, samples in zip(strata, allocation)]
+        num_jobs = min(len(runs), self.workers * 4)
+        jobs = [(self.backend, runs[j::num_jobs], range2_combinations, community.ids, weights2)
+                for j in range(num_jobs)]
+        counts = [None] * len(runs)
+        for j, job_counts in enumerate(self._map_jobs(simulate_strata, jobs)):
+            counts[j::num_jobs] = job_counts
+        return counts
+
+    @staticmethod
+    def _allocate(budget: int, shares, minimum: int = 0) -> List[int]:
+        """Split budget into integers proportional to shares (largest remainders first), each at least minimum."""
+        budget -= minimum * len(shares)
+        total = sum(shares)
+        exact = [budget * share / total for share in shares] if total > 0 else [budget / len(shares)] * len(shares)
+        allocation = [int(value) for value in exact]
+        by_remainder = sorted(range(len(shares)), key=lambda i: allocation[i] - exact[i])
+        for i in by_remainder[:budget - sum(allocation)]:
+            allocation[i] += 1
+        return [minimum + count for count in allocation]
 
+    def _root_seed(self) -> int:
+        """The calculator seed, or a fresh random one for each query when no seed was given."""
+        return self.seed if self.seed is not None else random.SystemRandom().getrandbits(64)
+
+    def _simulation_jobs(self, range1_combinations, range2_combinations, community: Hand, root_seed,
+                         first_chunk: int, num_simulations: int, chunk_size: int, weights1=None,
+                         weights2=None) -> List[Tuple]:
+        """Arguments of simulate_chunk for num_simulations split into chunks numbered from first_chunk."""
+        jobs = []
+        for chunk, start in enumerate(range(0, num_simulations, chunk_size), start=first_chunk):
+            chunk_simulations = min(chunk_size, num_simulations - start)
+            jobs.append((self.backend, range1_combinations, range2_combinations, community.ids,
+                         chunk_simulations, derive_seed(root_seed, chunk), weights1, weights2,
+                         self._stats.enabled))
+        return jobs
+
+    def iter_equity(self, range1_str, range2_str, community_cards_str='', target_stderr=None, target_ci=None,
+                    time_budget=None, max_simulations=None, chunk_size=None) -> Iterator[Dict[str, float]]:
+        """
+        Calculate equity in rounds of chunks (one chunk per worker) and yield the running estimate after
+        each round, with 'stderr' the standard error of the range1/range2 equity in percentage points.
+        Stops once stderr <= target_stderr, once the 95% confidence half width (1.96 * stderr) <= target_ci,
+        after time_budget seconds or after max_simulations; with none of them it runs until the caller stops.
+        When exact enumeration is cheaper than one round (e.g. most turn queries) a single exact estimate
+        with a zero stderr is yielded. When no pair of combinations can be dealt together, a single empty
+        estimate (0 simulations) is yielded.
+        community_cards_str: '' preflop, or the 3 or 4 community cards on the flop or turn.
+        """
+        community = Hand.from_string(community_cards_str)
+        if len(community) not in (0, 3, 4):
+            raise ValueError("Provide no community cards (preflop), 3 (flop) or 4 (flop and turn).")
+        if target_ci is not None:
+            target_stderr = min(target_ci / 1.96, target_stderr if target_stderr is not None else float('inf'))
+        chunk_size = chunk_size or self.CHUNK_SIZE
+        started = time.perf_counter()
+
+        range1_combinations = RangeParser.generate_combination_ids(range1_str, community.mask)
+        range2_combinations = RangeParser.generate_combination_ids(range2_str, community.mask)
+        if not range1_combinations or not range2_combinations:
+            yield self._running_result((0, 0, 0, 0), started)
+            return
+        weights1 = RangeParser.generate_combination_weights(range1_str, community.mask)
+        weights2 = RangeParser.generate_combination_weights(range2_str, community.mask)
+        if community:
+            num_runouts = comb(len(self.deck) - len(community), 5 - len(community))
+            work = num_runouts * len(range1_combinations) * len(range2_combinations)
+            if work <= self.EXACT_WORK_FACTOR * chunk_size * self.workers:
+                result = self._enumerate(range1_combinations, range2_combinations, community, weights1, weights2)
+                result['stderr'] = 0.0
+                result['elapsed'] = time.perf_counter() - started
+                yield result
+                return
+
+        root_seed = self._root_seed()
+        totals = (0, 0, 0, 0)
+        chunk = 0
+        while True:
+            round_simulations = chunk_size * self.workers
+            if max_simulations is not None:
+                round_simulations = min(round_simulations, max_simulations - totals[3])
+            jobs = self._simulation_jobs(range1_combinations, range2_combinations, community, root_seed,
+                                         chunk, round_simulations, chunk_size, weights1, weights2)
+            chunk += len(jobs)
+            round_totals = self._run_jobs(simulate_chunk, jobs)
+            totals = tuple(total + count for total, count in zip(totals, round_totals))
+
+            result = self._running_result(totals, started)
+            yield result
+            if not round_totals[3]:  # The samplers never reject, so no valid pair can ever be dealt
+                return
+            if target_stderr is not None and result['stderr'] <= target_stderr:
+                return
+            if time_budget is not None and result['elapsed'] >= time_budget:
+                return
+            if max_simulations is not None and totals[3] >= max_simulations:
+                return
+
+    def calculate_equity_adaptive(self, range1_str, range2_str, community_cards_str='', target_stderr=0.1,
+                                  target_ci=None, time_budget=None, max_simulations=10000000,
+                                  callback=None) -> Dict[str, float]:
+        """
+        Calculate equity until it is precise enough instead of for a fixed number of simulations.
+        See iter_equity for the stopping criteria; callback, if given, receives every running estimate.
+        Returns the last estimate.
+        """
+        result = None
+        for result in self.iter_equity(range1_str, range2_str, community_cards_str, target_stderr=target_stderr,
+                                       target_ci=target_ci, time_budget=time_budget,
+                                       max_simulations=max_simulations):
+            if callback is not None:
+                callback(result)
+        return result
+
+    def _running_result(self, totals, started) -> Dict[str, float]:
+        """Equity result of the counts so far, with its standard error and the elapsed time."""
+        wins1, wins2, ties, valid_simulations = totals
+        result = self._equity_result(wins1, wins2, ties, valid_simulations)
+        # Each sample scores 1, 1/2 or 0 for range1; range2 scores the complement and has the same error
+        if valid_simulations:
+            mean = (wins1 + ties / 2) / valid_simulations
+            mean_square = (wins1 + ties / 4) / valid_simulations
+            result['stderr'] = sqrt(max(mean_square - mean * mean, 0) / valid_simulations) * 100
+        else:
+            result['stderr'] = float('inf')
+        result['elapsed'] = time.perf_counter() - started
+        return result
+
+    def _map_jobs(self, function, jobs) -> Iterator:
+        """Run the jobs in the worker pool (or inline with a single worker), yielding their results in order."""
+        if self.workers > 1 and len(jobs) > 1:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            return self._executor.map(function, *zip(*jobs))
+        return (function(*job) for job in jobs)
+
+    def _run_jobs(self, function, jobs) -> Tuple:
+        """Run the jobs and sum their count tuples."""
+        totals = None
+        for counts in self._map_jobs(function, jobs):
+            totals = list(counts) if totals is None else [total + count for total, count in zip(totals, counts)]
+        return tuple(totals)
+
+    @staticmethod
+    def _equity_result(wins1, wins2, ties, valid_simulations) -> Dict[str, float]:
+        """
+        Turn win/tie counts into the equity percentages returned by the calculate_* methods.
+        'simulations' is the number of samples (or enumerated outcomes) the percentages are based on.
+        """
         # Avoid division by zero
         if valid_simulations == 0:
-            return {'range1': 0, 'range2': 0, 'ties': 0}
+            return {'range1': 0, 'range2': 0, 'ties': 0, 'simulations': 0}
 
-        equity_range1 = (wins['range1'] + ties / 2) / valid_simulations * 100
-        equity_range2 = (wins['range2'] + ties / 2) / valid_simulations * 100
+        equity_range1 = (wins1 + ties / 2) / valid_simulations * 100
+        equity_range2 = (wins2 + ties / 2) / valid_simulations * 100
 
-        return {'range1': equity_range1, 'range2': equity_range2, 'ties': (ties / valid_simulations * 100)}
+        return {'range1': equity_range1, 'range2': equity_range2, 'ties': ties / valid_simulations * 100,
+                'simulations': valid_simulations}
 
     def visualize_equity(self, equity_results, title="Equity Comparison"):
         """
@@ -225,6 +698,7 @@ class EquityCalculator:
         sizes = [equity_results['range1'], equity_results['range2'], equity_results['ties']]
         colors = ['lightgreen', 'red', 'skyblue']
         explode = (0.1, 0.1, 0)  # Explode Range1 and Range2 slices
+        import matplotlib.pyplot as plt  # Imported on first use, it is slow to load and only needed here
 
         plt.figure(figsize=(8, 8))
         plt.pie(sizes, labels=labels, colors=colors, autopct='%1.1f%%',
@@ -232,3 +706,412 @@ class EquityCalculator:
         plt.title(title)
         plt.axis('equal')  # Equal aspect ratio ensures that pie is drawn as a circle.
         plt.show()
+
+
+def simulate_chunk(backend, range1_combinations, range2_combinations, board_ids, num_simulations,
+                   seed, weights1=None, weights2=None, stats=False) -> Tuple:
+    """
+    Run one chunk of Monte Carlo simulations with its own seeded random stream.
+    weights1/weights2: combination weights, None when every combination of the range weighs the same.
+    Returns (wins1, wins2, ties, valid_simulations), followed by the worker counts of stats.WORKER_COUNTERS
+    and the hand category counts when stats is True.
+    """
+    if backend == 'numpy':
+        import numpy as np
+        from pypoker.analysis_tools import numpy_backend
+        return numpy_backend.simulate(range1_combinations, range2_combinations, board_ids, num_simulations,
+                                      rng=np.random.default_rng(seed), weights1=weights1, weights2=weights2,
+                                      stats=stats)
+    return simulate_python(range1_combinations, range2_combinations, board_ids, num_simulations,
+                           random.Random(seed), weights1, weights2, stats)
+
+
+def simulate_strata(backend, runs, range2_combinations, board_ids, weights2) -> List[Tuple[int, int, int]]:
+    """
+    Simulate single range1 combinations against range2: runs holds (combination, simulations, seed).
+    Returns (wins, ties, simulations) for each run.
+    """
+    counts = []
+    for combination, num_simulations, seed in runs:
+        wins1, _, ties, valid = simulate_chunk(backend, [combination], range2_combinations, board_ids,
+                                               num_simulations, seed, None, weights2)
+        counts.append((wins1, ties, valid))
+    return counts
+
+
+def simulate_multiway_chunk(backend, ranges_combinations, board_ids, num_simulations, seed,
+                            ranges_weights=None, stats=False) -> Tuple:
+    """
+    Run one chunk of multiway simulations with its own seeded random stream.
+    ranges_weights: None, or the combination weights of each range (None for an unweighted range).
+    Returns (share of player 1, ..., share of player N, split pots, valid_simulations), followed by the
+    worker counts when stats is True (see simulate_chunk).
+    Both backends run the numpy engine when numpy is installed: most multiway deals of wide ranges overlap
+    and are redrawn, which only vectorized draws make cheap. The pure Python loop is the fallback without
+    numpy, at about 4 times the cost of a heads-up query for 6 wide ranges.
+    """
+    try:
+        import numpy as np
+        from pypoker.analysis_tools import numpy_backend
+    except ImportError:
+        if backend == 'numpy':
+            raise
+        return simulate_multiway_python(ranges_combinations, board_ids, num_simulations, random.Random(seed),
+                                        ranges_weights, stats)
+    return numpy_backend.simulate_multiway(ranges_combinations, board_ids, num_simulations,
+                                           rng=np.random.default_rng(seed),
+                                           max_deals_per_simulation=MAX_DEALS_PER_SIMULATION,
+                                           ranges_weights=ranges_weights, stats=stats)
+
+
+def simulate_python(range1_combinations, range2_combinations, board_ids, num_simulations,
+                    rng, weights1=None, weights2=None, stats=False) -> Tuple:
+    """
+    Monte Carlo simulation shared by all streets.
+    Pairs of hands are drawn directly from the compatible pairs and runouts from the cards left once both
+    hands are dealt, so no draw is ever rejected. The board is prepared once and shared by both hands.
+    Weighted ranges draw pairs in proportion to the product of their weights from alias tables instead.
+    With stats, the worker counts are appended to the result (see simulate_chunk).
+    """
+    started = time.perf_counter()
+    if weights1 is None and weights2 is None:
+        sampler = ComboPairSampler(range1_combinations, range2_combinations)
+        if sampler.num_pairs == 0:
+            return (0,) * (4 + NUM_WORKER_STATS if stats else 4)
+    else:
+        sampler = WeightedPairSampler(range1_combinations, range2_combinations,
+                                      weights1 or [1.0] * len(range1_combinations),
+                                      weights2 or [1.0] * len(range2_combinations))
+        if sampler.total_weight <= 0:
+            return (0,) * (4 + NUM_WORKER_STATS if stats else 4)
+
+    dealer = RunoutDealer(_live_deck(board_ids), 5 - len(board_ids))
+    random_float = rng.random
+    sample_pair = sampler.sample
+    deal = dealer.deal
+    wins1 = wins2 = ties = 0
+    categories = [0] * len(HAND_CATEGORIES) if stats else None
+    setup_seconds = time.perf_counter() - started
+
+    for _ in range(num_simulations):
+        (card1a, card1b, _), (card2a, card2b, _) = sample_pair(random_float)
+        state = board_state(board_ids + deal(random_float, (card1a, card1b, card2a, card2b)))
+
+        strength1 = evaluate_with_board(state, card1a, card1b)
+        strength2 = evaluate_with_board(state, card2a, card2b)
+        if categories is not None:
+            categories[strength1 >> KICKER_BITS] += 1
+            categories[strength2 >> KICKER_BITS] += 1
+
+        if strength1 > strength2:
+            wins1 += 1
+        elif strength1 < strength2:
+            wins2 += 1
+        else:
+            ties += 1
+
+    if stats:
+        # Neither pair sampler ever rejects a draw
+        return (wins1, wins2, ties, num_simulations, setup_seconds, num_simulations, num_simulations,
+                2 * num_simulations,
+                *categories)
+    return wins1, wins2, ties, num_simulations
+
+
+def simulate_multiway_python(ranges_combinations, board_ids, num_simulations, rng, ranges_weights=None,
+                             stats=False) -> Tuple:
+    """
+    Multiway Monte Carlo simulation. Every player's hand is drawn uniformly from its range (from an alias
+    table in proportion to the weights with ranges_weights) and a deal is dropped at the first hand that
+    overlaps an earlier one, which keeps every non-overlapping set of hands exactly as likely as under the
+    weights while a rejected deal costs a few draws. The runout is dealt once and every player is scored on
+    the shared board state in one pass, so most of the cost of a deal does not grow with the number of players.
+    Returns (share of player 1, ..., share of player N, split pots, valid_simulations), followed by the
+    worker counts with stats (see simulate_chunk).
+    """
+    started = time.perf_counter()
+    num_players = len(ranges_combinations)
+    empty = (0,) * (num_players + 2 + (NUM_WORKER_STATS if stats else 0))
+    if ranges_weights is None:
+        if ComboPairSampler(ranges_combinations[0], ranges_combinations[1]).num_pairs == 0:
+            return empty
+        draws = [None] * num_players
+    else:
+        ranges_weights = [weights or [1.0] * len(combinations_)
+                          for combinations_, weights in zip(ranges_combinations, ranges_weights)]
+        if any(sum(weights) <= 0 for weights in ranges_weights):
+            return empty
+        draws = [AliasTable(weights).sample for weights in ranges_weights]
+    sizes = [len(combinations_) for combinations_ in ranges_combinations]
+    players = list(zip(ranges_combinations, draws, sizes))
+
+    dealer = RunoutDealer(_live_deck(board_ids), 5 - len(board_ids))
+    random_float = rng.random
+    deal = dealer.deal
+    shares = [0.0] * num_players
+    ties = valid_simulations = deals = drawn = 0
+    categories = [0] * len(HAND_CATEGORIES) if stats else None
+    setup_seconds = time.perf_counter() - started
+
+    for _ in range(num_simulations * MAX_DEALS_PER_SIMULATION):
+        if valid_simulations == num_simulations:
+            break
+        deals += 1
+        hands = []
+        used = 0
+        for combinations_, draw, size in players:
+            hand = combinations_[draw(random_float) if draw else int(random_float() * size)]
+            if hand[2] & used:
+                if stats:
+                    drawn += len(hands) + 1
+                break  # Overlapping hands, redeal everything
+            used |= hand[2]
+            hands.append(hand)
+        else:
+            drawn += num_players
+            dead_ids = [card_id for card_a, card_b, _ in hands for card_id in (card_a, card_b)]
+            state = board_state(board_ids + deal(random_float, dead_ids))
+            strengths = [evaluate_with_board(state, card_a, card_b) for card_a, card_b, _ in hands]
+            valid_simulations += 1
+            if categories is not None:
+                for strength in strengths:
+                    categories[strength >> KICKER_BITS] += 1
+
+            best = max(strengths)
+            count = strengths.count(best)
+            if count == 1:
+                shares[strengths.index(best)] += 1
+            else:
+                ties += 1
+                for player, strength in enumerate(strengths):
+                    if strength == best:
+                        shares[player] += 1 / count
+
+    if stats:
+        return (*shares, ties, valid_simulations, setup_seconds, drawn, valid_simulations,
+                num_players * valid_simulations, *categories)
+    return (*shares, ties, valid_simulations)
+
+
+def _live_deck(board_ids) -> List[int]:
+    """Ids of the cards not on the board."""
+    board_mask = 0
+    for card_id in board_ids:
+        board_mask |= 1 << card_id
+    return [card.id for card in DECK if not card.mask & board_mask]
+
+
+def combo_runout_counts(range1_combinations, range2_combinations, board_ids, runouts, weights1=None,
+                        weights2=None) -> Tuple:
+    """
+    Per combination counts over the given runouts, as one flat tuple so that slices can be summed:
+    points of each range1 combination (2 per win, 1 per tie), outcomes of each range1 combination,
+    then the same two blocks for range2. With weights, every opposing combination counts its weight.
+    """
+    points1 = [0] * len(range1_combinations)
+    outcomes1 = [0] * len(range1_combinations)
+    points2 = [0] * len(range2_combinations)
+    outcomes2 = [0] * len(range2_combinations)
+    for runout in runouts:
+        runout_mask = 0
+        for card_id in runout:
+            runout_mask |= 1 << card_id
+        state = board_state(board_ids + list(runout))
+        ranked1 = [(i, card_a, card_b, mask, evaluate_with_board(state, card_a, card_b))
+                   for i, (card_a, card_b, mask) in enumerate(range1_combinations) if not mask & runout_mask]
+        ranked2 = [(i, card_a, card_b, mask, evaluate_with_board(state, card_a, card_b))
+                   for i, (card_a, card_b, mask) in enumerate(range2_combinations) if not mask & runout_mask]
+        _count_against(ranked1, ranked2, points1, outcomes1, weights2)
+        _count_against(ranked2, ranked1, points2, outcomes2, weights1)
+    return (*points1, *outcomes1, *points2, *outcomes2)
+
+
+def _count_against(ranked, opposing, points, outcomes, opposing_weights=None):
+    """Add the points (2 per win, 1 per tie) and outcomes of every ranked combination against the opposing ones."""
+    for i, below, not_above, combo_outcomes in _compare_against(ranked, opposing, opposing_weights):
+        points[i] += below + not_above
+        outcomes[i] += combo_outcomes
+
+
+def _compare_against(ranked, opposing, opposing_weights=None) -> Iterator[Tuple[int, int, int, int]]:
+    """
+    Yield (index, opposing combinations beaten, beaten or tied, compatible opposing combinations) for every
+    ranked combination. Counts against the whole opposing range come from bisecting its sorted strengths;
+    the opposing combinations holding either card are then taken out the same way, by inclusion-exclusion
+    over the two cards. With opposing_weights (by opposing combination index) the counts are total weights.
+    """
+    if opposing_weights is not None:
+        yield from _compare_against_weighted(ranked, opposing, opposing_weights)
+        return
+    strengths = sorted(strength for *_, strength in opposing)
+    by_card = {}
+    by_mask = {}
+    for _, card_a, card_b, mask, strength in opposing:
+        by_card.setdefault(card_a, []).append(strength)
+        by_card.setdefault(card_b, []).append(strength)
+        by_mask.setdefault(mask, []).append(strength)
+    for card_strengths in by_card.values():
+        card_strengths.sort()
+    for mask_strengths in by_mask.values():
+        mask_strengths.sort()
+
+    for i, card_a, card_b, mask, strength in ranked:
+        blocked = (by_card.get(card_a, ()), by_card.get(card_b, ()))
+        same = by_mask.get(mask, ())
+        below = (bisect_left(strengths, strength) - bisect_left(blocked[0], strength)
+                 - bisect_left(blocked[1], strength) + bisect_left(same, strength))
+        not_above = (bisect_right(strengths, strength) - bisect_right(blocked[0], strength)
+                     - bisect_right(blocked[1], strength) + bisect_right(same, strength))
+        yield i, below, not_above, len(strengths) - len(blocked[0]) - len(blocked[1]) + len(same)
+
+
+def _compare_against_weighted(ranked, opposing, opposing_weights) -> Iterator[Tuple[int, float, float, float]]:
+    """_compare_against with opposing weights: bisecting sorted strengths indexes their cumulative weights."""
+    def group(entries):
+        entries.sort()
+        cumulative = [0.0]
+        for _, weight in entries:
+            cumulative.append(cumulative[-1] + weight)
+        return [strength for strength, _ in entries], cumulative
+
+    everything = []
+    by_card = {}
+    by_mask = {}
+    for j, card_a, card_b, mask, strength in opposing:
+        entry = (strength, opposing_weights[j])
+        everything.append(entry)
+        by_card.setdefault(card_a, []).append(entry)
+        by_card.setdefault(card_b, []).append(entry)
+        by_mask.setdefault(mask, []).append(entry)
+    everything = group(everything)
+    by_card = {card: group(entries) for card, entries in by_card.items()}
+    by_mask = {mask: group(entries) for mask, entries in by_mask.items()}
+    empty = ([], [0.0])
+
+    for i, card_a, card_b, mask, strength in ranked:
+        groups = (everything, by_card.get(card_a, empty), by_card.get(card_b, empty), by_mask.get(mask, empty))
+        signs = (1, -1, -1, 1)
+        below = not_above = outcomes = 0.0
+        for sign, (strengths, cumulative) in zip(signs, groups):
+            below += sign * cumulative[bisect_left(strengths, strength)]
+            not_above += sign * cumulative[bisect_right(strengths, strength)]
+            outcomes += sign * cumulative[-1]
+        yield i, below, not_above, outcomes
+
+
+def runout_counts(range1_combinations, range2_combinations, board_ids, next_cards,
+                  later_cards_only, weights1=None, weights2=None) -> List[Tuple]:
+    """
+    (runout, wins1, wins2, ties, outcomes) of every runout whose first card is one of next_cards.
+    The board state is built once, extended by each next card and that state by each river card, so the
+    fixed cards are never added up again. On a 3 card board, later_cards_only pairs a turn card only with
+    higher river ids, listing every unordered runout once; otherwise every turn card gets all the rivers.
+    With weights (either may be None for all 1), every outcome counts the product of the combination weights.
+    """
+    weighted = weights1 is not None or weights2 is not None
+    if weighted:
+        weights1 = weights1 or [1.0] * len(range1_combinations)
+        weights2 = weights2 or [1.0] * len(range2_combinations)
+    state = board_state(board_ids)
+    dealt = set(board_ids)
+    results = []
+    for next_card in next_cards:
+        next_state = extend_state(state, next_card)
+        if len(board_ids) == 4:
+            runouts = [((next_card,), next_state)]
+        else:
+            rivers = range(next_card + 1, 52) if later_cards_only else range(52)
+            runouts = [((next_card, river), extend_state(next_state, river))
+                       for river in rivers if river != next_card and river not in dealt]
+
+        for runout, runout_state in runouts:
+            runout_mask = 0
+            for card_id in runout:
+                runout_mask |= 1 << card_id
+            ranked1 = [(i, card_a, card_b, mask, evaluate_with_board(runout_state, card_a, card_b))
+                       for i, (card_a, card_b, mask) in enumerate(range1_combinations) if not mask & runout_mask]
+            ranked2 = [(i, card_a, card_b, mask, evaluate_with_board(runout_state, card_a, card_b))
+                       for i, (card_a, card_b, mask) in enumerate(range2_combinations) if not mask & runout_mask]
+            wins1 = ties = outcomes = 0
+            if weighted:
+                for i, below, not_above, combo_outcomes in _compare_against(ranked1, ranked2, weights2):
+                    wins1 += weights1[i] * below
+                    ties += weights1[i] * (not_above - below)
+                    outcomes += weights1[i] * combo_outcomes
+            else:
+                for _, below, not_above, combo_outcomes in _compare_against(ranked1, ranked2):
+                    wins1 += below
+                    ties += not_above - below
+                    outcomes += combo_outcomes
+            results.append((runout, wins1, outcomes - wins1 - ties, ties, outcomes))
+    return results
+
+
+def enumerate_weighted_runouts(range1_combinations, range2_combinations, board_ids, runouts, weights1,
+                               weights2) -> Tuple[float, float, float, float]:
+    """
+    Like enumerate_runouts, with every outcome weighted by the product of the two combination weights.
+    Returns (weighted wins1, weighted wins2, weighted ties, total weight).
+    """
+    total = wins1 = wins2 = ties = 0.0
+    for runout in runouts:
+        runout_mask = 0
+        for card_id in runout:
+            runout_mask |= 1 << card_id
+        state = board_state(board_ids + list(runout))
+        ranked2 = [(evaluate_with_board(state, card2a, card2b), mask2, weight2)
+                   for (card2a, card2b, mask2), weight2 in zip(range2_combinations, weights2)
+                   if not mask2 & runout_mask]
+
+        for (card1a, card1b, mask1), weight1 in zip(range1_combinations, weights1):
+            if mask1 & runout_mask:
+                continue
+            strength1 = evaluate_with_board(state, card1a, card1b)
+            for strength2, mask2, weight2 in ranked2:
+                if mask1 & mask2:
+                    continue
+                weight = weight1 * weight2
+                total += weight
+                if strength1 > strength2:
+                    wins1 += weight
+                elif strength1 < strength2:
+                    wins2 += weight
+                else:
+                    ties += weight
+
+    return wins1, wins2, ties, total
+
+
+def enumerate_runouts(range1_combinations, range2_combinations, board_ids, runouts) -> Tuple[int, int, int, int]:
+    """
+    Exact counts over the given runouts: every live combination is ranked once per runout and every pair of
+    non-overlapping combinations is compared. Each (combo pair, runout) outcome carries the same weight,
+    which is the distribution the Monte Carlo simulation samples from.
+    Returns (wins1, wins2, ties, outcomes).
+    """
+    outcomes = 0
+    wins1 = wins2 = ties = 0
+    for runout in runouts:
+        runout_mask = 0
+        for card_id in runout:
+            runout_mask |= 1 << card_id
+        state = board_state(board_ids + list(runout))
+        ranked2 = [(evaluate_with_board(state, card2a, card2b), mask2)
+                   for card2a, card2b, mask2 in range2_combinations if not mask2 & runout_mask]
+
+        for card1a, card1b, mask1 in range1_combinations:
+            if mask1 & runout_mask:
+                continue
+            strength1 = evaluate_with_board(state, card1a, card1b)
+            for strength2, mask2 in ranked2:
+                if mask1 & mask2:
+                    continue
+                outcomes += 1
+                if strength1 > strength2:
+                    wins1 += 1
+                elif strength1 < strength2:
+                    wins2 += 1
+                else:
+                    ties += 1
+
+    return wins1, wins2, ties, outcomes
@@ -0,0 +1,216 @@
+from bisect import bisect_right
+from itertools import accumulate
+from typing import List, Tuple
+
+
+class ComboPairSampler:
+    """
+    Draws (combo1, combo2) pairs uniformly from the pairs of non-overlapping combinations of two ranges,
+    without ever rejecting a draw.
+    Combinations are (card1 id, card2 id, mask) tuples as returned by RangeParser.generate_combination_ids.
+    """
+
+    def __init__(self, range1_combinations, range2_combinations):
+        self.range1_combinations = range1_combinations
+        self.range2_combinations = range2_combinations
+
+        # Indices of the range2 combinations holding each card, in increasing order
+        blockers = [[] for _ in range(52)]
+        same_mask = {}
+        for j, (card_a, card_b, mask) in enumerate(range2_combinations):
+            blockers[card_a].append(j)
+            blockers[card_b].append(j)
+            same_mask.setdefault(mask, []).append(j)
+
+        # For each range1 combination: the range2 indices blocked by its first card, by its second card,
+        # and the ones blocked by both (same two cards), which are listed twice.
+        self.blocked = []
+        counts = []
+        for card_a, card_b, mask in range1_combinations:
+            blocked = (blockers[card_a], blockers[card_b], same_mask.get(mask, []))
+            self.blocked.append(blocked)
+            counts.append(len(range2_combinations) - len(blocked[0]) - len(blocked[1]) + len(blocked[2]))
+        self.cumulative = list(accumulate(counts))
+        self.num_pairs = self.cumulative[-1] if counts else 0
+
+    def index_pair(self, pair_index: int) -> Tuple[int, int]:
+        """
+        Map an index in [0, num_pairs) to the (range1 index, range2 index) of a compatible pair.
+        Every compatible pair has exactly one index.
+        """
+        i = bisect_right(self.cumulative, pair_index)
+        local = pair_index - (self.cumulative[i - 1] if i else 0)
+        first, second, both = self.blocked[i]
+
+        # The local-th unblocked range2 index j is the smallest fixed point of j = local + #blocked <= j
+        j = local
+        while True:
+            shifted = local + bisect_right(first, j) + bisect_right(second, j) - bisect_right(both, j)
+            if shifted == j:
+                return i, j
+            j = shifted
+
+    def sample(self, random) -> Tuple[Tuple, Tuple]:
+        """Draw a compatible pair of combinations; random is a random.random-like function."""
+        i, j = self.index_pair(int(random() * self.num_pairs))
+        return self.range1_combinations[i], self.range2_combinations[j]
+
+
+class RunoutDealer:
+    """
+    Deals the missing community cards from the live deck (the deck without the board),
+    skipping the hole cards in play, without ever rejecting a draw.
+    The dealer keeps a working permutation of the live deck between deals: the dead cards are swapped to its
+    end and a partial Fisher-Yates shuffle of the front deals the runout, so no per-deal copy is needed.
+    """
+
+    def __init__(self, live_deck: List[int], num_cards: int):
+        self.deck = list(live_deck)
+        self.num_cards = num_cards
+        self.position = [0] * 52
+        for position, card_id in enumerate(self.deck):
+            self.position[card_id] = position
+
+    def deal(self, random, dead_ids) -> List[int]:
+        """
+        Return num_cards distinct live cards that are not in dead_ids, every such set being equally likely.
+        random is a random.random-like function.
+        """
+        deck = self.deck
+        position = self.position
+
+        end = len(deck)
+        for card_id in dead_ids:
+            end -= 1
+            current, other = position[card_id], deck[end]
+            deck[current] = other
+            position[other] = current
+            deck[end] = card_id
+            position[card_id] = end
+
+        for top in range(self.num_cards):
+            pick = top + int(random() * (end - top))
+            picked, other = deck[pick], deck[top]
+            deck[top] = picked
+            position[picked] = top
+            deck[pick] = other
+            position[other] = pick
+        return deck[:self.num_cards]
+
+
+class AliasTable:
+    """
+    Walker's alias table (built with Vose's method): draws index i with probability weights[i] / sum(weights)
+    in constant time from a single uniform number.
+    """
+
+    def __init__(self, weights):
+        n = len(weights)
+        total = sum(weights)
+        if n == 0 or total <= 0:
+            raise ValueError("An alias table needs at least one positive weight.")
+        scaled = [weight * n / total for weight in weights]
+        self.probability = [1.0] * n
+        self.alias = list(range(n))
+        small = [i for i, value in enumerate(scaled) if value < 1]
+        large = [i for i, value in enumerate(scaled) if value >= 1]
+        while small and large:
+            less, more = small.pop(), large.pop()
+            self.probability[less] = scaled[less]
+            self.alias[less] = more
+            scaled[more] -= 1 - scaled[less]
+            (small if scaled[more] < 1 else large).append(more)
+        # Whatever is left only differs from 1 by rounding errors
+        for i in small + large:
+            self.probability[i] = 1.0
+
+    def sample(self, random) -> int:
+        """Draw an index; random is a random.random-like function."""
+        u = random() * len(self.probability)
+        i = int(u)
+        return i if u - i < self.probability[i] else self.alias[i]
+
+
+def compatible_weights(range1_combinations, range2_combinations, weights2) -> List[float]:
+    """
+    Total weight of the range2 combinations sharing no card with each range1 combination, from per-card
+    weight sums: everything, minus the combinations holding either card, plus the identical ones counted twice.
+    """
+    card_weights = [0.0] * 52
+    mask_weights = {}
+    for (card_a, card_b, mask), weight in zip(range2_combinations, weights2):
+        card_weights[card_a] += weight
+        card_weights[card_b] += weight
+        mask_weights[mask] = mask_weights.get(mask, 0.0) + weight
+    total = sum(weights2)
+    return [max(total - card_weights[card_a] - card_weights[card_b] + mask_weights.get(mask, 0.0), 0.0)
+            for card_a, card_b, mask in range1_combinations]
+
+
+class WeightedPairSampler:
+    """
+    Draws (combo1, combo2) pairs of non-overlapping combinations with probability proportional to
+    weight1 * weight2, without ever rejecting a draw. The first combination is drawn from an alias table of
+    weight1 times the weight of the range2 combinations compatible with it (see compatible_weights), and the
+    second in proportion to its weight among those, by locating a uniform point in the cumulative range2
+    weights with the blocked combinations' weight skipped.
+    """
+
+    def __init__(self, range1_combinations, range2_combinations, weights1, weights2):
+        self.range1_combinations = range1_combinations
+        self.range2_combinations = range2_combinations
+        self.compatible = compatible_weights(range1_combinations, range2_combinations, weights2)
+        first_weights = [weight * compatible for weight, compatible in zip(weights1, self.compatible)]
+        # Total weight of the compatible pairs; 0 when the ranges can never be dealt together
+        self.total_weight = sum(first_weights)
+        if self.total_weight <= 0:
+            return
+        self.table1 = AliasTable(first_weights)
+
+        self.cumulative2 = list(accumulate(weights2))
+        # Indices of the range2 combinations holding each card (and with each mask), in increasing order,
+        # with the cumulative weights of those combinations
+        blockers = [([], []) for _ in range(52)]
+        same_mask = {}
+        for j, ((card_a, card_b, mask), weight) in enumerate(zip(range2_combinations, weights2)):
+            for indices, cumulative in (blockers[card_a], blockers[card_b], same_mask.setdefault(mask, ([], []))):
+                indices.append(j)
+                cumulative.append((cumulative[-1] if cumulative else 0.0) + weight)
+        empty = ([], [])
+        self.blocked = [(blockers[card_a], blockers[card_b], same_mask.get(mask, empty))
+                        for card_a, card_b, mask in range1_combinations]
+
+    def second_index(self, i: int, point: float) -> int:
+        """
+        Index of the range2 combination compatible with range1 combination i at point (0 <= point <
+        compatible[i]) of their cumulative weights.
+        """
+        cumulative2 = self.cumulative2
+        first, second, both = self.blocked[i]
+        # The answer is the first j whose cumulative weight exceeds point plus the blocked weight up to j
+        j = bisect_right(cumulative2, point)
+        while True:
+            blocked = 0.0
+            for indices, cumulative in (first, second):
+                k = bisect_right(indices, j)
+                if k:
+                    blocked += cumulative[k - 1]
+            k = bisect_right(both[0], j)
+            if k:
+                blocked -= both[1][k - 1]
+            shifted = bisect_right(cumulative2, point + blocked)
+            if shifted == j:
+                break
+            j = shifted
+        combo1 = self.range1_combinations[i]
+        if j < len(cumulative2) and not combo1[2] & self.range2_combinations[j][2]:
+            return j
+        # Rounding put the point past the last compatible combination: take the last one
+        return max(j for j, combo2 in enumerate(self.range2_combinations)
+                   if not combo1[2] & combo2[2] and cumulative2[j] > (cumulative2[j - 1] if j else 0.0))
+
+    def sample(self, random) -> Tuple[Tuple, Tuple]:
+        """Draw a compatible pair of combinations; random is a random.random-like function."""
+        i = self.table1.sample(random)
+        j = self.second_index(i, random() * self.compatible[i])
+        return self.range1_combinations[i], self.range2_combinations[j]
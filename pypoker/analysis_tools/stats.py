@@ -0,0 +1,103 @@
+import logging
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+from pypoker.analysis_tools.lookup_tables import KICKER_BITS
+
+HAND_CATEGORIES = ("High Card", "One Pair", "Two Pair", "Three of a Kind", "Straight",
+                   "Flush", "Full House", "Four of a Kind", "Straight Flush", "Royal Flush")
+# Counts appended, in this order and followed by one count per hand category, to the results of the
+# simulation functions when they are called with stats=True. Like the other counts they add up across chunks.
+WORKER_COUNTERS = ('setup_seconds', 'samples_drawn', 'samples_accepted', 'evaluations')
+NUM_WORKER_STATS = len(WORKER_COUNTERS) + len(HAND_CATEGORIES)
+
+
+class QueryStats:
+    """
+    Statistics of one query: wall time per phase, counters (samples, evaluations, cache lookups...) and the
+    frequency of each hand category among the evaluated hands. as_dict() gives them as plain data.
+    """
+
+    enabled = True
+
+    def __init__(self):
+        self.phases = {}
+        self.counters = {}
+        self.categories = [0] * len(HAND_CATEGORIES)
+
+    @contextmanager
+    def phase(self, name: str):
+        """Add the wall time spent in the with block to phase name."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - started
+
+    def add(self, name: str, count=1):
+        self.counters[name] = self.counters.get(name, 0) + count
+
+    def add_strengths(self, strengths):
+        """Count the hand category of each of the strengths."""
+        categories = self.categories
+        for strength in strengths:
+            categories[strength >> KICKER_BITS] += 1
+
+    def worker_counts(self, totals, num_counts: int):
+        """Record the worker counts following the first num_counts items of totals and return those items."""
+        extra = totals[num_counts:]
+        for name, count in zip(WORKER_COUNTERS, extra):
+            self.add(name, count)
+        for category, count in enumerate(extra[len(WORKER_COUNTERS):]):
+            self.categories[category] += int(count)
+        return tuple(totals[:num_counts])
+
+    def as_dict(self) -> Dict:
+        """
+        {'phases': {name: seconds}, 'counters': {...}, 'categories': {category name: count}}, with
+        'samples_rejected' and the category frequencies derived from the counters when they are present.
+        """
+        counters = dict(self.counters)
+        if 'samples_drawn' in counters:
+            counters['samples_rejected'] = counters['samples_drawn'] - counters.get('samples_accepted', 0)
+        lookups = counters.get('cache_hits', 0) + counters.get('cache_misses', 0)
+        if lookups:
+            counters['cache_hit_rate'] = counters.get('cache_hits', 0) / lookups
+        evaluated = sum(self.categories)
+        return {'phases': dict(self.phases), 'counters': counters,
+                'categories': {name: count for name, count in zip(HAND_CATEGORIES, self.categories)},
+                'category_frequencies': {name: count / evaluated for name, count in
+                                         zip(HAND_CATEGORIES, self.categories)} if evaluated else {}}
+
+
+class _NoStats:
+    """Stand-in for QueryStats when statistics are off: every call does nothing."""
+
+    enabled = False
+
+    @contextmanager
+    def phase(self, name: str):
+        yield
+
+    def add(self, name: str, count=1):
+        pass
+
+    def add_strengths(self, strengths):
+        pass
+
+    @staticmethod
+    def worker_counts(totals, num_counts: int):
+        return tuple(totals)
+
+
+NO_STATS = _NoStats()
+
+
+def logging_hook(logger: Optional[logging.Logger] = None, level: int = logging.INFO) -> Callable[[Dict], None]:
+    """A stats hook writing every query's statistics to logger (the 'pypoker.stats' logger by default)."""
+    logger = logger or logging.getLogger('pypoker.stats')
+
+    def hook(stats: Dict):
+        logger.log(level, "%s", stats)
+    return hook
@@ -0,0 +1,437 @@
+"""
+External-sampling Monte Carlo CFR for heads-up limit hold'em with card abstraction.
+
+Game: blinds 1 and 2, bets of 2 preflop and on the flop and 4 on the turn and river, at most 4 bets per street
+(the big blind counts as the first preflop bet). Player 0 is the small blind/button and acts first preflop,
+player 1 acts first after the flop.
+
+Abstraction: an information set is a node of the betting tree (the whole public action history) together
+with the acting player's bucket on the current street. Preflop buckets are the 169 starting hand classes;
+on later streets a hand is bucketed by its hand strength, the equity against a random hand on the current
+board: sampled runouts on the flop and turn, exact on the river. Every information set therefore has a fixed
+row, node offset + bucket, in dense regret and average strategy tables of shape (rows, 3) float32, created
+on disk and memory-mapped, so no per-node Python objects are needed.
+
+Training: each iteration deals one set of cards and runs one external-sampling traversal for each player
+(all of the traverser's actions are explored, one sampled action for the opponent and for chance). Batches
+of iterations run in a process pool; workers read the shared tables and return their regret and strategy
+increments, which the parent alone adds to the tables after each round, so no locks are needed and a seed
+gives the same result for a fixed number of workers. Before a round is merged, the current values of the
+rows it touches are written to journal.npz; the tables are then updated and flushed, the number of iterations
+committed to meta.json (the checkpoint training resumes from) and the journal removed. Opening a checkpoint
+whose journal is newer than meta.json restores those rows, so a crash in the middle of a merge never leaves
+an increment applied twice or half applied.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from pypoker.utils import DECK, derive_seed
+from pypoker.analysis_tools.lookup_tables import board_state, evaluate_with_board
+from pypoker.analysis_tools.preflop_table import HAND_CLASSES, NUM_CLASSES, hand_class_index
+from pypoker.analysis_tools.sampling import RunoutDealer
+
+BLINDS = (1, 2)
+BET_SIZES = (2, 2, 4, 4)  # By street: preflop, flop, turn, river
+MAX_BETS = 4
+FOLD, CALL, RAISE = 0, 1, 2
+ACTION_CHARS = 'fcr'  # Fold, check/call, bet/raise
+NUM_ACTIONS = 3
+STREET_CARDS = (0, 3, 4, 5)  # Board cards seen on each street
+
+CHECKPOINT_VERSION = 1
+META_FILENAME = 'meta.json'
+REGRETS_FILENAME = 'regrets.f32'
+STRATEGY_FILENAME = 'strategy.f32'
+JOURNAL_FILENAME = 'journal.npz'
+
+
+class BettingTree:
+    """
+    The betting tree of heads-up limit hold'em, in flat lists indexed by node id. children[node][action] is
+    a node id, a terminal as -(terminal index + 1), or None for an illegal action. Terminals hold
+    (folding player or -1 for a showdown, chips each player lost if it loses). Histories use 'f', 'c' and 'r'
+    for the actions and '/' between streets.
+    """
+
+    def __init__(self):
+        self.player = []
+        self.street = []
+        self.children = []
+        self.history = []
+        self.terminals = []
+        self._add_node(0, 0, list(BLINDS), 1, 0, '')
+        self.node_ids = {history: node for node, history in enumerate(self.history)}
+
+    def _add_node(self, street, player, contributions, bets, num_actions, history) -> int:
+        node = len(self.player)
+        self.player.append(player)
+        self.street.append(street)
+        self.history.append(history)
+        children = [None] * NUM_ACTIONS
+        self.children.append(children)
+
+        to_call = contributions[1 - player] - contributions[player]
+        if to_call > 0:
+            children[FOLD] = self._add_terminal(player, contributions[player])
+        called = list(contributions)
+        called[player] += to_call
+        # The first action of a street never closes it: a check can be bet into, a limp can be raised
+        if num_actions == 0:
+            children[CALL] = self._add_node(street, 1 - player, called, bets, 1, history + 'c')
+        elif street == 3:
+            children[CALL] = self._add_terminal(-1, called[0])
+        else:
+            children[CALL] = self._add_node(street + 1, 1, called, 0, 0, history + 'c/')
+        if bets < MAX_BETS:
+            raised = list(called)
+            raised[player] += BET_SIZES[street]
+            children[RAISE] = self._add_node(street, 1 - player, raised, bets + 1, num_actions + 1, history + 'r')
+        return node
+
+    def _add_terminal(self, folder: int, amount: int) -> int:
+        self.terminals.append((folder, amount))
+        return -len(self.terminals)
+
+    def legal_actions(self, node: int) -> List[int]:
+        return [action for action, child in enumerate(self.children[node]) if child is not None]
+
+
+@lru_cache(maxsize=1)
+def betting_tree() -> BettingTree:
+    return BettingTree()
+
+
+def hand_strength(hole: Tuple[int, int], board: List[int], rng: random.Random, num_samples: int) -> float:
+    """
+    Equity of hole cards against a uniformly random opposing hand on board (3 to 5 cards): exact on the
+    river, from num_samples sampled (opposing hand, runout) deals on the flop and turn.
+    """
+    board_mask = 0
+    for card_id in board + list(hole):
+        board_mask |= 1 << card_id
+    live_deck = [card.id for card in DECK if not card.mask & board_mask]
+    points = 0
+    if len(board) == 5:
+        state = board_state(board)
+        strength = evaluate_with_board(state, *hole)
+        outcomes = 0
+        for i, card1 in enumerate(live_deck):
+            for card2 in live_deck[i + 1:]:
+                opposing = evaluate_with_board(state, card1, card2)
+                points += 2 if strength > opposing else strength == opposing
+                outcomes += 1
+        return points / (2 * outcomes)
+
+    dealer = RunoutDealer(live_deck, 2 + 5 - len(board))
+    for _ in range(num_samples):
+        card1, card2, *runout = dealer.deal(rng.random, ())
+        state = board_state(board + runout)
+        strength = evaluate_with_board(state, *hole)
+        opposing = evaluate_with_board(state, card1, card2)
+        points += 2 if strength > opposing else strength == opposing
+    return points / (2 * num_samples)
+
+
+class _Traversal:
+    """One worker's external-sampling traversals, reading the shared tables and collecting increments."""
+
+    def __init__(self, regrets: np.ndarray, offsets: List[int], config: Dict, rng: random.Random):
+        self.tree = betting_tree()
+        self.regrets = regrets
+        self.offsets = offsets
+        self.config = config
+        self.rng = rng
+        self.regret_deltas = {}
+        self.strategy_deltas = {}
+
+    def deal(self):
+        """Deal both hands and the board, and bucket both hands on every street."""
+        cards = self.rng.sample(range(52), 9)
+        holes = (tuple(cards[0:2]), tuple(cards[2:4]))
+        board = cards[4:]
+        self.buckets = []
+        for hole in holes:
+            buckets = [hand_class_index(*hole)]
+            for street in (1, 2, 3):
+                strength = hand_strength(hole, board[:STREET_CARDS[street]], self.rng, self.config['hs_samples'])
+                buckets.append(min(int(strength * self.config['buckets'][street]), self.config['buckets'][street] - 1))
+            self.buckets.append(buckets)
+        state = board_state(board)
+        strengths = [evaluate_with_board(state, *hole) for hole in holes]
+        self.showdown = (strengths[0] > strengths[1]) - (strengths[0] < strengths[1])  # For player 0
+
+    def strategy(self, node: int, row: int) -> List[float]:
+        """Regret matching over the legal actions, on the shared regrets plus this worker's increments."""
+        regrets = self.regrets[row].tolist()
+        delta = self.regret_deltas.get(row)
+        children = self.tree.children[node]
+        positive = [max(regret + (delta[a] if delta else 0.0), 0.0) if children[a] is not None else 0.0
+                    for a, regret in enumerate(regrets)]
+        total = sum(positive)
+        if total > 0:
+            return [value / total for value in positive]
+        legal = sum(child is not None for child in children)
+        return [1 / legal if child is not None else 0.0 for child in children]
+
+    def walk(self, node: int, traverser: int) -> float:
+        """Sampled counterfactual value of node for traverser, updating regrets and strategy sums."""
+        if node < 0:
+            folder, amount = self.tree.terminals[-node - 1]
+            if folder < 0:
+                return amount * (self.showdown if traverser == 0 else -self.showdown)
+            return -amount if folder == traverser else amount
+
+        player = self.tree.player[node]
+        row = self.offsets[node] + self.buckets[player][self.tree.street[node]]
+        strategy = self.strategy(node, row)
+        children = self.tree.children[node]
+        if player != traverser:
+            # The opponent's current strategy is sampled in proportion to its reach: add it to the average
+            sums = self.strategy_deltas.setdefault(row, [0.0] * NUM_ACTIONS)
+            for a in range(NUM_ACTIONS):
+                sums[a] += strategy[a]
+            pick = self.rng.random()
+            action = max(a for a in range(NUM_ACTIONS) if children[a] is not None)
+            for a in range(NUM_ACTIONS):
+                if children[a] is not None:
+                    pick -= strategy[a]
+                    if pick < 0:
+                        action = a
+                        break
+            return self.walk(children[action], traverser)
+
+        values = [self.walk(child, traverser) if child is not None else 0.0 for child in children]
+        value = sum(p * v for p, v in zip(strategy, values))
+        deltas = self.regret_deltas.setdefault(row, [0.0] * NUM_ACTIONS)
+        for a in range(NUM_ACTIONS):
+            if children[a] is not None:
+                deltas[a] += values[a] - value
+        return value
+
+
+def run_traversals(path: str, config: Dict, rows: int, num_iterations: int, seed: int) -> Tuple:
+    """
+    Worker job: num_iterations iterations against the tables at path. Returns (regret rows, regret
+    increments, strategy rows, strategy increments) as arrays.
+    """
+    regrets = np.memmap(os.path.join(path, REGRETS_FILENAME), dtype=np.float32, mode='r',
+                        shape=(rows, NUM_ACTIONS))
+    traversal = _Traversal(regrets, row_offsets(config['buckets'])[0], config, random.Random(seed))
+    for _ in range(num_iterations):
+        traversal.deal()
+        for traverser in (0, 1):
+            traversal.walk(0, traverser)
+    return (np.array(list(traversal.regret_deltas), dtype=np.int64),
+            np.array(list(traversal.regret_deltas.values()), dtype=np.float32).reshape(-1, NUM_ACTIONS),
+            np.array(list(traversal.strategy_deltas), dtype=np.int64),
+            np.array(list(traversal.strategy_deltas.values()), dtype=np.float32).reshape(-1, NUM_ACTIONS))
+
+
+def row_offsets(buckets) -> Tuple[List[int], int]:
+    """First table row of each betting node (its buckets follow) and the total number of rows."""
+    tree = betting_tree()
+    offsets = []
+    rows = 0
+    for street in tree.street:
+        offsets.append(rows)
+        rows += buckets[street]
+    return offsets, rows
+
+
+class MCCFRTrainer:
+    """
+    External-sampling MCCFR trainer whose regret and average strategy tables are memory-mapped files in a
+    checkpoint directory. Opening a directory that holds a checkpoint resumes it; a checkpoint made with a
+    different abstraction raises ValueError.
+    """
+
+    def __init__(self, path: str, flop_buckets: int = 10, turn_buckets: int = 10, river_buckets: int = 10,
+                 hs_samples: int = 100, seed: int = 0):
+        """
+        flop_buckets, turn_buckets, river_buckets: number of hand strength buckets on each street.
+        hs_samples: sampled deals behind each flop and turn hand strength.
+        """
+        self.path = path
+        self.config = {'buckets': [NUM_CLASSES, flop_buckets, turn_buckets, river_buckets],
+                       'hs_samples': hs_samples, 'seed': seed}
+        self.offsets, self.rows = row_offsets(self.config['buckets'])
+        os.makedirs(path, exist_ok=True)
+
+        meta = self._read_meta()
+        if meta is None:
+            self.iterations = 0
+            mode = 'w+'
+        else:
+            if meta['config'] != self.config or meta['rows'] != self.rows:
+                raise ValueError(f"{path} holds a checkpoint of another configuration; use another path.")
+            self.iterations = meta['iterations']
+            mode = 'r+'
+        self.regrets = np.memmap(os.path.join(path, REGRETS_FILENAME), dtype=np.float32, mode=mode,
+                                 shape=(self.rows, NUM_ACTIONS))
+        self.strategy_sum = np.memmap(os.path.join(path, STRATEGY_FILENAME), dtype=np.float32, mode=mode,
+                                      shape=(self.rows, NUM_ACTIONS))
+        if meta is None:
+            self.checkpoint()
+        else:
+            self._recover()
+        self.iterations_per_second = 0.0
+
+    def _read_meta(self) -> Optional[Dict]:
+        try:
+            with open(os.path.join(self.path, META_FILENAME)) as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            return None
+        if meta.get('version') != CHECKPOINT_VERSION:
+            raise ValueError(f"Unsupported checkpoint version {meta.get('version')!r} in {self.path}.")
+        return meta
+
+    def _recover(self):
+        """Undo a merge interrupted before its iterations were committed to meta.json."""
+        journal_path = os.path.join(self.path, JOURNAL_FILENAME)
+        try:
+            journal = np.load(journal_path)
+        except FileNotFoundError:
+            return
+        with journal:
+            if int(journal['iterations']) > self.iterations:
+                self.regrets[journal['regret_rows']] = journal['regrets']
+                self.strategy_sum[journal['strategy_rows']] = journal['strategy_sum']
+                self.regrets.flush()
+                self.strategy_sum.flush()
+        os.remove(journal_path)
+
+    def _write_journal(self, regret_rows: np.ndarray, strategy_rows: np.ndarray, iterations: int):
+        """Durably save the current values of the rows a merge reaching iterations is about to change."""
+        tmp_path = os.path.join(self.path, f"{JOURNAL_FILENAME}.{os.getpid()}.tmp")
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, iterations=iterations, regret_rows=regret_rows, regrets=self.regrets[regret_rows],
+                     strategy_rows=strategy_rows, strategy_sum=self.strategy_sum[strategy_rows])
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, os.path.join(self.path, JOURNAL_FILENAME))
+
+    def _merge(self, results: List[Tuple], round_iterations: int):
+        """Add the increments of a round to the tables and commit them, journaling the rows first."""
+        regret_rows = np.unique(np.concatenate([result[0] for result in results]))
+        strategy_rows = np.unique(np.concatenate([result[2] for result in results]))
+        self._write_journal(regret_rows, strategy_rows, self.iterations + round_iterations)
+        for regret_rows, regret_deltas, strategy_rows, strategy_deltas in results:
+            np.add.at(self.regrets, regret_rows, regret_deltas)
+            np.add.at(self.strategy_sum, strategy_rows, strategy_deltas)
+        self.iterations += round_iterations
+        self.checkpoint()
+        os.remove(os.path.join(self.path, JOURNAL_FILENAME))
+
+    def checkpoint(self):
+        """Flush the tables, then commit the number of iterations they hold."""
+        self.regrets.flush()
+        self.strategy_sum.flush()
+        meta = {'version': CHECKPOINT_VERSION, 'config': self.config, 'rows': self.rows,
+                'iterations': self.iterations}
+        tmp_path = os.path.join(self.path, f"{META_FILENAME}.{os.getpid()}.tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f, indent=1)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, os.path.join(self.path, META_FILENAME))
+
+    def train(self, num_iterations: int, workers: int = 1, iterations_per_job: int = 100,
+              progress=None) -> Dict:
+        """
+        Run num_iterations more iterations in rounds of one job of iterations_per_job iterations per worker,
+        merging the increments and checkpointing after every round. progress, if given, is called with
+        info() after each round. Returns info().
+        """
+        executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+        started = time.perf_counter()
+        done = 0
+        try:
+            while done < num_iterations:
+                jobs = []
+                for _ in range(workers):
+                    size = min(iterations_per_job, num_iterations - done - sum(job[3] for job in jobs))
+                    if size <= 0:
+                        break
+                    first = self.iterations + sum(job[3] for job in jobs)
+                    jobs.append((self.path, self.config, self.rows, size, derive_seed(self.config['seed'], first)))
+                if executor is not None:
+                    results = list(executor.map(run_traversals, *zip(*jobs)))
+                else:
+                    results = [run_traversals(*job) for job in jobs]
+                round_iterations = sum(job[3] for job in jobs)
+                self._merge(results, round_iterations)
+                done += round_iterations
+                self.iterations_per_second = done / (time.perf_counter() - started)
+                if progress is not None:
+                    progress(self.info())
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        return self.info()
+
+    def info(self) -> Dict:
+        """Iterations, training speed, and the size of the tables: rows, rows visited, bytes per row."""
+        bytes_per_infoset = 2 * NUM_ACTIONS * np.dtype(np.float32).itemsize
+        return {'iterations': self.iterations, 'iterations_per_second': self.iterations_per_second,
+                'infosets': self.rows,
+                'visited_infosets': int(np.count_nonzero(np.asarray(self.strategy_sum).any(axis=1))),
+                'bytes_per_infoset': bytes_per_infoset, 'table_bytes': self.rows * bytes_per_infoset,
+                'betting_nodes': len(betting_tree().player)}
+
+    def average_strategy(self, history: str, bucket: int) -> Dict[str, float]:
+        """
+        Average strategy at the betting node reached by history (e.g. '' for the first preflop decision,
+        'rc/' for the big blind's first flop decision after a raised pot) for a hand in bucket, by action.
+        """
+        tree = betting_tree()
+        node = tree.node_ids.get(history)
+        if node is None:
+            raise ValueError(f"No decision node after {history!r}.")
+        sums = np.asarray(self.strategy_sum[self.offsets[node] + bucket], dtype=np.float64)
+        legal = tree.legal_actions(node)
+        total = sums[legal].sum()
+        return {ACTION_CHARS[a]: float(sums[a] / total) if total > 0 else 1 / len(legal) for a in legal}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train heads-up limit hold'em strategies with MCCFR.")
+    parser.add_argument('--out', required=True, help="Checkpoint directory (resumed if it exists).")
+    parser.add_argument('--iterations', type=int, default=10000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--iterations-per-job', type=int, default=100)
+    parser.add_argument('--buckets', type=int, nargs=3, default=(10, 10, 10), metavar=('FLOP', 'TURN', 'RIVER'))
+    parser.add_argument('--hs-samples', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    try:
+        trainer = MCCFRTrainer(args.out, *args.buckets, hs_samples=args.hs_samples, seed=args.seed)
+    except ValueError as e:
+        parser.error(str(e))
+
+    def progress(info):
+        print(f"\r{info['iterations']} iterations, {info['iterations_per_second']:.1f}/s, "
+              f"{info['visited_infosets']}/{info['infosets']} infosets visited", end='', file=sys.stderr, flush=True)
+
+    info = trainer.train(args.iterations, args.workers, args.iterations_per_job, progress)
+    print(f"\n{info['infosets']} infosets x {info['bytes_per_infoset']} bytes = "
+          f"{info['table_bytes'] / 2 ** 20:.1f} MiB over {info['betting_nodes']} betting nodes", file=sys.stderr)
+    print("Small blind opening strategy:")
+    for hand_class in ('AA', 'KK', 'AKs', 'AKo', 'QJs', 'T9s', '77', '22', 'K7o', '72o'):
+        strategy = trainer.average_strategy('', HAND_CLASSES.index(hand_class))
+        print(f"{hand_class:4} " + "  ".join(f"{action} {p:.2f}" for action, p in strategy.items()))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,29 +1,79 @@
+import hashlib
+import os
+from typing import List
+
+
+def get_cache_dir() -> str:
+    """
+    Return the directory used for generated tables and caches, creating it if needed.
+    Defaults to ~/.cache/pypoker and can be overridden with PYPOKER_CACHE_DIR.
+    """
+    cache_dir = os.environ.get('PYPOKER_CACHE_DIR') or os.path.join(os.path.expanduser('~'), '.cache', 'pypoker')
+    os.makedirs(cache_dir, exist_ok=True)
+    return cache_dir
+
+
+def derive_seed(seed, *keys) -> int:
+    """
+    Derive a 64-bit seed for an independent random stream from a root seed and stream keys
+    (e.g. a chunk index). The result only depends on the arguments, not on the process or run.
+    """
+    digest = hashlib.sha256(repr((seed,) + keys).encode()).digest()
+    return int.from_bytes(digest[:8], 'little')
 
 
 class Card:
+    """
+    A playing card. The 52 cards are interned singletons, so Card('K', 'Hearts') always returns
+    the same object and cards can be compared by identity.
+    Each card carries an integer id in 0..51 (rank index * 4 + suit index) and a 64-bit mask
+    with only bit `id` set; sets of cards are represented as the OR of their masks.
+    """
+    __slots__ = ('rank', 'suit', 'value', 'id', 'mask')
+
     SUITS = ('Hearts', 'Diamonds', 'Clubs', 'Spades')
     RANKS = ('2', '3', '4', '5', '6', '7', '8', '9', 'T', 'J', 'Q', 'K', 'A')
+    SUIT_CHARS = ('h', 'd', 'c', 's')
 
     RANK_VALUES = {rank: value for value, rank in enumerate(RANKS, start=2)}
 
-    def __init__(self, rank: str, suit: str):
-        assert rank in Card.RANKS, f"Invalid rank: {rank}"
-        assert suit in Card.SUITS, f"Invalid suit: {suit}"
-        self.rank = rank
-        self.suit = suit
-        self.value = Card.RANK_VALUES[rank]
+    _interned = {}
+
+    def __new__(cls, rank: str, suit: str):
+        card = Card._interned.get((rank, suit))
+        if card is None:
+            assert rank in Card.RANKS, f"Invalid rank: {rank}"
+            assert suit in Card.SUITS, f"Invalid suit: {suit}"
+            card = object.__new__(cls)
+            card.rank = rank
+            card.suit = suit
+            card.value = Card.RANK_VALUES[rank]
+            card.id = (card.value - 2) * len(Card.SUITS) + Card.SUITS.index(suit)
+            card.mask = 1 << card.id
+            Card._interned[(rank, suit)] = card
+        return card
+
+    def __reduce__(self):
+        return Card, (self.rank, self.suit)
 
     def __str__(self):
         return f"{self.rank} of {self.suit}"
 
+    def __repr__(self):
+        return f"Card('{self.rank}', '{self.suit}')"
+
     def __eq__(self, other):
-        return self.rank == other.rank and self.suit == other.suit
+        return self is other
 
     def __lt__(self, other):
         return self.value < other.value
 
     def __hash__(self):
-        return hash((self.rank, self.suit))
+        return self.id
+
+    def to_string(self) -> str:
+        """Return the short notation of the card, e.g. 'Kh' for King of Hearts."""
+        return f"{self.rank}{Card.SUIT_CHARS[self.id % len(Card.SUITS)]}"
 
     @staticmethod
     def from_string(card_str: str):
@@ -36,6 +86,45 @@ class Card:
         assert suit_char in suit_map, f"Invalid suit character: {suit_char}"
         return Card(rank, suit_map[suit_char])
 
+    @staticmethod
+    def from_id(card_id: int):
+        """Return the card with the given 0..51 id."""
+        return DECK[card_id]
+
+
+# All 52 cards indexed by id.
+DECK = tuple(Card(rank, suit) for rank in Card.RANKS for suit in Card.SUITS)
+FULL_DECK_MASK = (1 << len(DECK)) - 1
+
+
+def cards_to_mask(cards) -> int:
+    """Return the bitmask of a collection of Card objects."""
+    mask = 0
+    for card in cards:
+        mask |= card.mask
+    return mask
+
+
+def mask_to_ids(mask: int) -> List[int]:
+    """Return the ids of the cards set in a bitmask, in increasing order."""
+    ids = []
+    while mask:
+        low_bit = mask & -mask
+        ids.append(low_bit.bit_length() - 1)
+        mask ^= low_bit
+    return ids
+
+
+def combo_index(card1_id: int, card2_id: int) -> int:
+    """Return the 0..1325 index of the two card combination made of two distinct card ids."""
+    low, high = (card1_id, card2_id) if card1_id < card2_id else (card2_id, card1_id)
+    return low * (103 - low) // 2 + high - low - 1
+
+
+def mask_to_cards(mask: int) -> List[Card]:
+    """Return the Card objects set in a bitmask, in increasing id order."""
+    return [DECK[card_id] for card_id in mask_to_ids(mask)]
+
 
 class Hand:
     def __init__(self, cards=None):
@@ -52,6 +141,16 @@ class Hand:
         if card in self.cards:
             self.cards.remove(card)
 
+    @property
+    def mask(self) -> int:
+        """Return the bitmask of the cards in the hand."""
+        return cards_to_mask(self.cards)
+
+    @property
+    def ids(self) -> List[int]:
+        """Return the 0..51 ids of the cards in the hand."""
+        return [card.id for card in self.cards]
+
     def get_ranks(self):
         """Return a list of ranks for the current cards in the hand."""
         return [card.rank for card in self.cards]
@@ -71,3 +170,9 @@ class Hand:
     def sort(self):
         """Sort cards in the hand based on their rank value."""
         self.cards.sort(key=lambda card: card.value)
+
+    @staticmethod
+    def from_string(cards_str: str):
+        """Create a hand from a string of concatenated cards like 'AsKd7c'."""
+        cards_str = cards_str.replace(' ', '').replace(',', '')
+        return Hand([Card.from_string(cards_str[i:i + 2]) for i in range(0, len(cards_str), 2)])
@@ -0,0 +1,68 @@
+"""Columnar tables only expose committed rows and resume where the last flush left off."""
+import json
+import os
+
+import pytest
+
+from pypoker.analysis_tools.columnar import ColumnarWriter, read_columns
+
+COLUMNS = {'index': 'q', 'equity': 'd'}
+
+
+def test_rows_are_committed_on_flush(tmp_path):
+    path = str(tmp_path / 'table')
+    writer = ColumnarWriter(path, COLUMNS, {'query': 'AA vs KK'})
+    writer.append((0, 0.5))
+    with pytest.raises(FileNotFoundError):
+        read_columns(str(tmp_path / 'missing'))
+    assert read_columns(path)[1]['index'].tolist() == []
+    writer.flush()
+    metadata, columns = read_columns(path)
+    assert metadata == {'query': 'AA vs KK'}
+    assert columns['index'].tolist() == [0] and columns['equity'].tolist() == [0.5]
+
+
+def test_reopening_cuts_uncommitted_bytes_and_resumes(tmp_path):
+    path = str(tmp_path / 'table')
+    with ColumnarWriter(path, COLUMNS) as writer:
+        for index in range(3):
+            writer.append((index, index / 10))
+    # A run interrupted between writing the columns and committing the metadata
+    with open(os.path.join(path, 'index.bin'), 'ab') as f:
+        f.write(b'\x01' * 8)
+    with open(os.path.join(path, 'equity.bin'), 'ab') as f:
+        f.write(b'\x02' * 5)
+
+    writer = ColumnarWriter(path, COLUMNS)
+    assert writer.rows == 3
+    writer.append((3, 0.3))
+    writer.close()
+    _, columns = read_columns(path)
+    assert columns['index'].tolist() == [0, 1, 2, 3]
+    assert columns['equity'].tolist() == [0.0, 0.1, 0.2, 0.3]
+    assert read_columns(path, ['index'], start=2)[1] == {'index': columns['index'][2:]}
+
+
+def test_truncate_drops_later_rows(tmp_path):
+    path = str(tmp_path / 'table')
+    with ColumnarWriter(path, COLUMNS) as writer:
+        for index in range(5):
+            writer.append((index, 0.0))
+        writer.flush()
+        writer.append((5, 0.0))
+        writer.truncate(2)
+        with pytest.raises(ValueError):
+            writer.truncate(3)
+    assert read_columns(path)[1]['index'].tolist() == [0, 1]
+    assert os.path.getsize(os.path.join(path, 'equity.bin')) == 2 * 8
+    with open(os.path.join(path, 'meta.json')) as f:
+        assert json.load(f)['rows'] == 2
+
+
+def test_reopening_with_other_columns_raises(tmp_path):
+    path = str(tmp_path / 'table')
+    ColumnarWriter(path, COLUMNS, {'query': 'AA vs KK'}).close()
+    with pytest.raises(ValueError):
+        ColumnarWriter(path, {'index': 'q'}, {'query': 'AA vs KK'})
+    with pytest.raises(ValueError):
+        ColumnarWriter(path, COLUMNS, {'query': 'QQ vs KK'})
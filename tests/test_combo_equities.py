@@ -0,0 +1,41 @@
+"""Per-combination equities against brute-force enumeration of each combination against the opposing range."""
+import pytest
+
+from benchmarks.benchmark_suite import brute_force_equity
+from pypoker.analysis_tools.range_vs_range_equity import EquityCalculator
+
+RANGE1 = "QQ+, AKs:0.5"
+RANGE2 = "JJ+, AQo:0.5, KQs:0.25"
+TURN = "Ah7d2c5s"
+FLOP = "Ah7d2c"
+
+
+def test_combo_equities_match_brute_force():
+    result = EquityCalculator(preflop_table=None).calculate_combo_equities(RANGE1, RANGE2, TURN)
+    assert result['runouts'] == 48
+    # Aces are blocked down to three combinations by the Ah on the board
+    assert len(result['range1']) == 6 + 6 + 3 + 3
+    for combo, equity in result['range1'].items():
+        assert equity == pytest.approx(brute_force_equity(combo, RANGE2, TURN)['range1'], abs=1e-9)
+    for combo, equity in result['range2'].items():
+        assert equity == pytest.approx(brute_force_equity(RANGE1, combo, TURN)['range2'], abs=1e-9)
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_sampled_runouts_approach_the_exact_equities(workers):
+    with EquityCalculator(preflop_table=None, seed=2, workers=workers) as calculator:
+        exact = calculator.calculate_combo_equities(RANGE1, RANGE2, FLOP)
+        sampled = calculator.calculate_combo_equities(RANGE1, RANGE2, FLOP, num_runouts=800, exact=False)
+        assert calculator.calculate_combo_equities(RANGE1, RANGE2, FLOP, num_runouts=800, exact=False) == sampled
+    assert exact['runouts'] == 1176
+    assert sampled['runouts'] == 800
+    assert sampled['range1'].keys() == exact['range1'].keys()
+    for side in ('range1', 'range2'):
+        for combo, equity in exact[side].items():
+            assert sampled[side][combo] == pytest.approx(equity, abs=5)
+
+
+def test_combinations_without_opponents_are_left_out():
+    result = EquityCalculator(preflop_table=None).calculate_combo_equities("KhKd, QQ", "KhKs", TURN)
+    assert 'KhKd' not in result['range1']
+    assert len(result['range1']) == 6
@@ -0,0 +1,74 @@
+"""The equity engines against brute-force enumeration, and the backends and worker counts against each other."""
+import pytest
+
+from benchmarks.benchmark_suite import brute_force_equity
+from pypoker.analysis_tools.range_vs_range_equity import EquityCalculator
+
+MATCHUPS = [
+    ("AKs, AQs, KQs, QJs", "AQo, KQo, JTs, T9s", "AhKhQd"),
+    ("77, 22", "AhQh, KhJh, Th9h", "7h2h4c"),
+    ("QQ+, AKs:0.5", "JJ+, AQo:0.5, KQs:0.25", "Ah7d2c5s"),
+]
+
+
+def calculate(calculator, range1, range2, board, num_simulations, exact):
+    if len(board) == 6:
+        return calculator.calculate_flop_equity(range1, range2, board, num_simulations, exact=exact)
+    return calculator.calculate_turn_equity(range1, range2, board, num_simulations, exact=exact)
+
+
+@pytest.mark.parametrize('range1, range2, board', MATCHUPS)
+def test_exact_equity_matches_brute_force(range1, range2, board):
+    reference = brute_force_equity(range1, range2, board)
+    result = calculate(EquityCalculator(preflop_table=None, cache_size=0), range1, range2, board, 0, exact=True)
+    for key in ('range1', 'range2', 'ties'):
+        assert result[key] == pytest.approx(reference[key], abs=1e-9)
+
+
+@pytest.mark.parametrize('backend', ['python', 'numpy'])
+@pytest.mark.parametrize('range1, range2, board', MATCHUPS)
+def test_simulation_agrees_with_brute_force(backend, range1, range2, board):
+    if backend == 'numpy':
+        pytest.importorskip('numpy')
+    reference = brute_force_equity(range1, range2, board)
+    calculator = EquityCalculator(backend=backend, seed=11, preflop_table=None, cache_size=0)
+    result = calculate(calculator, range1, range2, board, 20000, exact=False)
+    stderr = 100 * (0.25 / result['simulations']) ** 0.5
+    assert abs(result['range1'] - reference['range1']) < 4 * stderr
+
+
+@pytest.mark.parametrize('backend', ['python', 'numpy'])
+def test_seeded_result_does_not_depend_on_workers(backend):
+    if backend == 'numpy':
+        pytest.importorskip('numpy')
+    results = []
+    for workers in (1, 2):
+        with EquityCalculator(backend=backend, workers=workers, seed=5, preflop_table=None,
+                              cache_size=0) as calculator:
+            results.append(calculator.calculate_flop_equity("TT+, AKs", "AQs, KQs, JTs", "Td8c3s", 40000,
+                                                            exact=False))
+    assert results[0] == results[1]
+
+
+@pytest.mark.parametrize('backend', ['python', 'numpy'])
+def test_multiway_ranges_that_cannot_be_dealt_raise(backend):
+    if backend == 'numpy':
+        pytest.importorskip('numpy')
+    calculator = EquityCalculator(backend=backend, seed=3, cache_size=0)
+    with pytest.raises(ValueError):
+        calculator.calculate_equity(["AA", "AA", "AA"], None, 100)
+    assert calculator.calculate_equity(["AA", "KK", "QQ"], None, 100)['simulations'] == 100
+
+
+@pytest.mark.parametrize('range1, range2', [('AsAh', 'AsKs'), ('AsAh:0.5', 'AsKs, AhKh')])
+def test_adaptive_query_without_compatible_pairs_returns_empty_result(range1, range2):
+    estimates = list(EquityCalculator(seed=1, cache_size=0).iter_equity(range1, range2, target_stderr=0.1))
+    assert len(estimates) == 1
+    assert estimates[0]['simulations'] == 0 and estimates[0]['range1'] == 0
+
+
+def test_adaptive_query_stops_at_target_stderr():
+    calculator = EquityCalculator(seed=1, cache_size=0)
+    result = calculator.calculate_equity_adaptive("QQ+, AKs", "JJ, TT, AQs", target_stderr=0.5)
+    assert 0 < result['stderr'] <= 0.5
+    assert result['simulations'] % calculator.CHUNK_SIZE == 0
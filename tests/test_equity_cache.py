@@ -0,0 +1,83 @@
+"""Suit-isomorphic query keys and the LRU result cache of EquityCalculator."""
+from pypoker.utils import Hand
+from pypoker.analysis_tools.equity_cache import EquityCache, canonical_query, is_suit_symmetric
+from pypoker.analysis_tools.range_parser import Range, RangeParser
+from pypoker.analysis_tools.range_vs_range_equity import EquityCalculator
+
+
+def query_key(range1, range2, board):
+    board_mask = Hand.from_string(board).mask
+    ranges = [Range.parse(range1), Range.parse(range2)]
+    return canonical_query([RangeParser.generate_combination_ids(r, board_mask) for r in ranges],
+                           Hand.from_string(board).ids,
+                           [RangeParser.generate_combination_weights(r, board_mask) for r in ranges])
+
+
+def test_canonical_query_identifies_suit_relabellings():
+    # Hearts -> spades, diamonds -> clubs, clubs -> diamonds
+    assert query_key("JhTh, QQ", "JJ+", "AhKdQc") == query_key("JsTs, QQ", "JJ+", "AsKcQd")
+    assert query_key("AA, KQs", "TT", "2c7d9h") == query_key("AA, KQs", "TT", "2s7h9d")
+    # The same suits in another role are a different query
+    assert query_key("JhTh", "QQ", "AhKdQc") != query_key("JdTd", "QQ", "AhKdQc")
+    # And so are different weights
+    assert query_key("AA:0.5, KK", "QQ", "2c7d9h") != query_key("AA, KK", "QQ", "2c7d9h")
+
+
+def test_is_suit_symmetric():
+    assert is_suit_symmetric(RangeParser.generate_combination_ids("AA, KQs, T9o"))
+    assert not is_suit_symmetric(RangeParser.generate_combination_ids("AA, AhKh"))
+
+
+def test_lru_counters_and_eviction():
+    cache = EquityCache(maxsize=2)
+    assert cache.get('a') is None
+    cache.put('a', {'range1': 1})
+    cache.put('b', {'range1': 2})
+    assert cache.get('a') == {'range1': 1}
+    cache.put('c', {'range1': 3})  # Evicts 'b', the least recently used
+    assert cache.get('b') is None
+    assert cache.info() == {'hits': 1, 'misses': 2, 'evictions': 1, 'size': 2, 'maxsize': 2}
+
+    # Callers get copies and cannot change the cached result
+    cache.get('a')['range1'] = 100
+    assert cache.get('a') == {'range1': 1}
+
+    cache.clear()
+    assert cache.info() == {'hits': 0, 'misses': 0, 'evictions': 0, 'size': 0, 'maxsize': 2}
+    assert EquityCache(maxsize=0).info()['size'] == 0
+
+
+def test_persistent_store_survives_restarts(tmp_path):
+    path = str(tmp_path / 'equity')
+    cache = EquityCache(path=path)
+    cache.put(('exact', 1), {'range1': 60.0})
+    cache.close()
+    cache = EquityCache(path=path)
+    assert cache.get(('exact', 1)) == {'range1': 60.0}
+    assert cache.info()['hits'] == 1
+    cache.close()
+
+
+def test_isomorphic_queries_share_a_cache_entry():
+    calculator = EquityCalculator(preflop_table=None)
+    first = calculator.calculate_turn_equity("JhTh, QQ", "JJ+", "AhKdQc2s", exact=True)
+    second = calculator.calculate_turn_equity("JsTs, QQ", "JJ+", "AsKcQd2h", exact=True)
+    assert second == first
+    assert calculator.cache_info()['hits'] == 1
+    assert calculator.cache_info()['size'] == 1
+
+
+def test_only_reproducible_simulations_are_cached():
+    unseeded = EquityCalculator(preflop_table=None)
+    unseeded.calculate_flop_equity("AA", "KK", "2c7d9h", 500, exact=False)
+    unseeded.calculate_flop_equity("AA", "KK", "2c7d9h", 500, exact=False)
+    assert unseeded.cache_info()['size'] == 0
+    assert unseeded.cache_info()['hits'] == 0
+
+    seeded = EquityCalculator(preflop_table=None, seed=4)
+    first = seeded.calculate_flop_equity("AA", "KK", "2c7d9h", 500, exact=False)
+    assert seeded.calculate_flop_equity("AA", "KK", "2c7d9h", 500, exact=False) == first
+    # Another simulation count is another query
+    seeded.calculate_flop_equity("AA", "KK", "2c7d9h", 600, exact=False)
+    assert seeded.cache_info()['hits'] == 1
+    assert seeded.cache_info()['size'] == 2
@@ -0,0 +1,79 @@
+"""Equity distributions of every combination against per-combination equities and brute-force enumeration."""
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from benchmarks.benchmark_suite import brute_force_equity
+from pypoker.utils import DECK, Hand, combo_index
+from pypoker.analysis_tools.equity_distribution import cache_path, equity_distributions, range_weights
+from pypoker.analysis_tools.range_parser import Range
+from pypoker.analysis_tools.range_vs_range_equity import EquityCalculator
+
+TURN = "Ah7d2c5s"
+RANGE = "QQ+, AKs:0.5, 76s"
+
+
+def index(combo):
+    return combo_index(*Hand.from_string(combo).ids)
+
+
+def test_means_match_combo_equities_against_a_random_hand():
+    # Against a random hand every river leaves the same number of opposing combinations, so the mean over
+    # runouts equals the equity against the range that calculate_combo_equities reports
+    expected = EquityCalculator(preflop_table=None).calculate_combo_equities("AA, KQs, 72o, 65s",
+                                                                             Range([1.0] * 1326), TURN)
+    result = equity_distributions(TURN, None, cache=False)
+    for combo, equity in expected['range1'].items():
+        assert result['equity'][index(combo)] * 100 == pytest.approx(equity, abs=1e-9)
+
+
+def test_means_match_brute_force_per_runout_against_a_weighted_range():
+    # Runouts weigh the same here, whereas the equity against the range weighs them by the range
+    # combinations they leave, so the reference is the plain mean of the river equities
+    result = equity_distributions(TURN, RANGE, cache=False)
+    turn_ids = Hand.from_string(TURN).ids
+    for combo in ("KsKd", "8s6s", "Ac3c"):
+        combo_ids = Hand.from_string(combo).ids
+        equities = []
+        for river in range(52):
+            if river in turn_ids or river in combo_ids:
+                continue
+            reference = brute_force_equity(combo, RANGE, TURN + DECK[river].to_string())
+            equities.append(reference['range1'] / 100)
+        assert result['runouts'][index(combo)] == len(equities) == 46
+        assert result['equity'][index(combo)] == pytest.approx(np.mean(equities), abs=1e-9)
+        histogram = np.bincount(np.minimum((np.array(equities) * 50).astype(int), 49), minlength=50)
+        assert result['counts'][index(combo)].tolist() == histogram.tolist()
+
+
+def test_histograms_and_blocked_combinations():
+    result = equity_distributions(TURN, RANGE, bins=10, cache=False)
+    live = result['runouts'] > 0
+    assert result['histograms'].shape == (1326, 10)
+    assert np.allclose(result['histograms'][live].sum(axis=1), 1)
+    assert (result['counts'].sum(axis=1) == result['runouts']).all()
+    # The combinations holding a board card have no distribution
+    assert np.count_nonzero(live) == 48 * 47 // 2
+    assert np.isnan(result['equity'][index("AhKh")])
+    assert not result['histograms'][index("AhKh")].any()
+
+
+def test_isomorphic_boards_share_a_cache_file(tmp_path):
+    cache_dir = str(tmp_path)
+    # Hearts <-> spades relabels the board and the range together
+    first = equity_distributions("Ah7d2c5s", "AKs, 76s, 5h5d", bins=10, cache_dir=cache_dir)
+    second = equity_distributions("As7d2c5h", "AKs, 76s, 5s5d", bins=10, cache_dir=cache_dir)
+    assert len(list(tmp_path.iterdir())) == 1
+    assert cache_path(Hand.from_string("Ah7d2c5s").ids, range_weights("AKs, 76s, 5h5d"), 10, cache_dir) == \
+        cache_path(Hand.from_string("As7d2c5h").ids, range_weights("AKs, 76s, 5s5d"), 10, cache_dir)
+    uncached = equity_distributions("As7d2c5h", "AKs, 76s, 5s5d", bins=10, cache=False)
+    for key in ('counts', 'runouts'):
+        assert (second[key] == uncached[key]).all()
+    assert first['equity'][index("KhQh")] == pytest.approx(second['equity'][index("KsQs")])
+
+
+def test_invalid_boards_raise():
+    with pytest.raises(ValueError):
+        equity_distributions("AhAh7d", cache=False)
+    with pytest.raises(ValueError):
+        equity_distributions("Ah7d", cache=False)
@@ -0,0 +1,68 @@
+"""The equity service: the JSON-lines protocol, deduplication of queries in flight and worker failures."""
+import asyncio
+import json
+import subprocess
+import sys
+
+import pytest
+
+from pypoker.analysis_tools.equity_service import EquityService, run_query
+from pypoker.analysis_tools.range_vs_range_equity import EquityCalculator
+
+
+def test_stdio_round_trip():
+    requests = [{'id': 1, 'ranges': ['AA', 'KK'], 'board': 'AhKd7c5s', 'exact': True},
+                {'id': 2, 'ranges': ['AA', 'KK'], 'board': 'AhKd'},
+                {'id': 3, 'method': 'adaptive', 'ranges': ['AsAh', 'AsKs']}]
+    lines = '\n'.join(json.dumps(request) for request in requests) + '\nnot json\n'
+    completed = subprocess.run([sys.executable, '-m', 'pypoker.analysis_tools.equity_service', '--workers', '1',
+                                '--seed', '1'], input=lines, capture_output=True, text=True, timeout=120)
+    assert completed.returncode == 0
+    responses = [json.loads(line) for line in completed.stdout.splitlines()]
+    by_id = {response['id']: response for response in responses}
+    assert set(by_id) == {1, 2, 3, None}
+    expected = EquityCalculator(preflop_table=None).calculate_turn_equity('AA', 'KK', 'AhKd7c5s', exact=True)
+    assert by_id[1]['result']['range1'] == pytest.approx(expected['range1'])
+    assert 'error' in by_id[2] and 'error' in by_id[None]
+    assert by_id[3]['result']['simulations'] == 0
+
+
+def test_identical_queries_in_flight_are_computed_once():
+    async def run():
+        service = EquityService(0, seed=1, preflop_table=None)
+        query = {'ranges': ['QQ+', 'AKs'], 'board': 'Td8c3s', 'simulations': 20000, 'exact': False}
+        results = await asyncio.gather(*(service.submit(dict(query, id=index)) for index in range(5)))
+        info = service.info()
+        await service.close()
+        return results, info
+
+    results, info = asyncio.run(run())
+    assert all(result == results[0] for result in results)
+    assert info['queries'] == 5 and info['deduplicated'] == 4 and info['batches'] == 1
+
+
+def test_broken_pool_is_replaced():
+    async def run():
+        service = EquityService(1, seed=1, preflop_table=None)
+        query = {'ranges': ['AA', 'KK'], 'board': 'AhKd7c5s'}
+        first = await service.submit(query)
+        for process in list(service._executor._processes.values()):
+            process.kill()
+            process.join()
+        with pytest.raises(ValueError, match='BrokenProcessPool'):
+            await service.submit(dict(query, board='AhKd7c2s'))
+        again = await service.submit(query)
+        await service.close()
+        return first, again
+
+    first, again = asyncio.run(run())
+    assert first == again
+
+
+def test_invalid_queries_raise():
+    calculator = EquityCalculator(preflop_table=None)
+    for query in ({'ranges': ['AA']}, {'ranges': ['AA', 'KK'], 'board': 'AhKd7c5s2d'},
+                  {'ranges': ['AA', 'KK', 'QQ'], 'method': 'next_card', 'board': 'AhKd7c'},
+                  {'ranges': ['AA', 'KK'], 'method': 'unknown'}):
+        with pytest.raises(ValueError):
+            run_query(calculator, query)
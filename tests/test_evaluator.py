@@ -0,0 +1,99 @@
+"""The hand evaluators against a naive evaluator that tries every 5 card subset."""
+import random
+from collections import Counter
+from itertools import combinations
+
+import pytest
+
+from pypoker.utils import DECK, Hand
+from pypoker.analysis_tools.hand_evaluator import HandEvaluator
+from pypoker.analysis_tools.lookup_tables import evaluate_ids
+
+
+def naive_five_card_key(ids) -> tuple:
+    """(category, tie-break ranks) of a 5 card hand, comparable between hands; categories 0 to 9 (royal flush)."""
+    ranks = sorted((card_id // 4 for card_id in ids), reverse=True)
+    counts = Counter(ranks)
+    order = tuple(sorted(counts, key=lambda rank: (counts[rank], rank), reverse=True))
+    shape = sorted(counts.values(), reverse=True)
+    flush = len({card_id % 4 for card_id in ids}) == 1
+    straight_high = None
+    if len(counts) == 5:
+        if ranks[0] - ranks[4] == 4:
+            straight_high = ranks[0]
+        elif ranks == [12, 3, 2, 1, 0]:  # The wheel, five high
+            straight_high = 3
+    if straight_high is not None and flush:
+        return (9 if straight_high == 12 else 8), (straight_high,)
+    if shape == [4, 1]:
+        return 7, order
+    if shape == [3, 2]:
+        return 6, order
+    if flush:
+        return 5, order
+    if straight_high is not None:
+        return 4, (straight_high,)
+    return {(3, 1, 1): 3, (2, 2, 1): 2, (2, 1, 1, 1): 1}.get(tuple(shape), 0), order
+
+
+def naive_key(ids) -> tuple:
+    return max(naive_five_card_key(hand) for hand in combinations(ids, 5))
+
+
+def test_categories_match_naive_evaluator():
+    rng = random.Random(1)
+    for _ in range(3000):
+        ids = rng.sample(range(52), 7)
+        assert evaluate_ids(ids) >> 20 == naive_key(ids)[0]
+
+
+def test_hand_order_matches_naive_evaluator():
+    rng = random.Random(2)
+    for _ in range(3000):
+        ids1, ids2 = rng.sample(range(52), 7), rng.sample(range(52), 7)
+        strength1, strength2 = evaluate_ids(ids1), evaluate_ids(ids2)
+        key1, key2 = naive_key(ids1), naive_key(ids2)
+        assert (strength1 > strength2) == (key1 > key2)
+        assert (strength1 == strength2) == (key1 == key2)
+
+
+def test_every_category_is_reached():
+    hands = ['AhKhQhJhTh', '9s8s7s6s5s', 'Ah2h3h4h5h', '7c7d7h7s2c', 'KcKdKh2s2c', 'Ac9c7c5c3c', '5d4c3h2sAs',
+             'QcQdQh9s2c', 'JcJd4h4s2c', 'TcTd8h4s2c', 'Kc9d7h4s2c']
+    categories = [evaluate_ids(Hand.from_string(hand).ids) >> 20 for hand in hands]
+    assert categories == [9, 8, 8, 7, 6, 5, 4, 3, 2, 1, 0]
+
+
+def test_card_evaluator_matches_id_evaluator():
+    rng = random.Random(3)
+    for _ in range(1000):
+        cards = rng.sample(DECK, 7)
+        assert HandEvaluator.hand_strength(cards) == evaluate_ids([card.id for card in cards])
+
+
+def test_numpy_evaluator_matches_python_evaluator():
+    np = pytest.importorskip('numpy')
+    from pypoker.analysis_tools import numpy_backend
+
+    rng = random.Random(4)
+    hands = [rng.sample(range(52), 7) for _ in range(5000)]
+    strengths = numpy_backend.evaluate_batch(np.array(hands)).tolist()
+    assert strengths == [evaluate_ids(hand) for hand in hands]
+
+
+def test_stats_count_only_while_enabled():
+    plain = HandEvaluator.evaluate_ids
+    HandEvaluator.enable_stats()
+    HandEvaluator.hand_strength(Hand.from_string('AhKhQhJhTh2c3d').cards)
+    HandEvaluator.evaluate_ids(Hand.from_string('7c7d7h7s2c').ids)
+    stats = HandEvaluator.disable_stats()
+    assert stats['counters']['evaluations'] == 2
+    assert stats['categories']['Royal Flush'] == 1 and stats['categories']['Four of a Kind'] == 1
+    assert HandEvaluator.evaluate_ids is plain is evaluate_ids
+
+
+def test_evaluate_hand_returns_fresh_kickers():
+    cards = Hand.from_string('AhKdQc9s7h3d2c').cards
+    first = HandEvaluator.evaluate_hand(cards)
+    first[1].append(99)
+    assert HandEvaluator.evaluate_hand(cards) == (0, [14, 13, 12, 9, 7])
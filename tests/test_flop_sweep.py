@@ -0,0 +1,71 @@
+"""Flop sweeps: canonical flops, per-flop results, the weighted total and resuming an interrupted sweep."""
+import pytest
+
+from benchmarks.benchmark_suite import brute_force_equity
+from pypoker.utils import Hand
+from pypoker.analysis_tools.flop_sweep import canonical_flops, load_sweep, run_sweep, sweep_equity, sweep_flops
+from pypoker.analysis_tools.range_parser import RangeParser
+from pypoker.analysis_tools.range_vs_range_equity import EquityCalculator
+
+
+class Interrupted(Exception):
+    pass
+
+
+def test_canonical_flops():
+    flops = canonical_flops()
+    assert len(flops) == 1755
+    assert sum(weight for _, weight in flops) == 22100
+    assert flops == sorted(flops)
+
+
+@pytest.mark.parametrize("range1, range2", [("AA, KQs", "KK, AQs"), ("AA:0.5, KQs", "KK, AQs:0.25")])
+def test_sweep_flops_match_brute_force(range1, range2):
+    combinations1 = RangeParser.generate_combination_ids(range1)
+    combinations2 = RangeParser.generate_combination_ids(range2)
+    weights1 = RangeParser.generate_combination_weights(range1)
+    weights2 = RangeParser.generate_combination_weights(range2)
+    flops = ["AhKd7c", "QsJs2s"]
+    ids = [tuple(Hand.from_string(flop).ids) for flop in flops]
+    exact = sweep_flops(combinations1, combinations2, ids, None, 'python', 0, weights1, weights2)
+    simulated = sweep_flops(combinations1, combinations2, ids, 4000, 'python', 0, weights1, weights2)
+    for flop, (equity, ties, outcomes), (simulated_equity, _, simulated_outcomes) in zip(flops, exact, simulated):
+        reference = brute_force_equity(range1, range2, flop)
+        assert equity * 100 == pytest.approx(reference['range1'], abs=1e-9)
+        assert ties * 100 == pytest.approx(reference['ties'], abs=1e-9)
+        # Simulated flops stand for as many outcomes as enumerated ones, so both weigh the same in a total
+        assert simulated_outcomes == pytest.approx(outcomes)
+        assert simulated_equity == pytest.approx(equity, abs=0.05)
+
+
+def test_simulated_sweep_total_matches_preflop_equity(tmp_path):
+    assert run_sweep("AA", "KK", str(tmp_path / 'sweep'), num_simulations=40, seed=1) == 1755
+    metadata, rows = load_sweep(str(tmp_path / 'sweep'))
+    assert metadata['num_simulations'] == 40
+    preflop = EquityCalculator(preflop_table=None, seed=1, cache_size=0).calculate_preflop_equity("AA", "KK", 100000)
+    # Flops with an ace or a king leave fewer pairs and must count less; weighting flops equally gives about 77%
+    assert sweep_equity(rows) * 100 == pytest.approx(preflop['range1'], abs=1)
+
+
+def test_interrupted_sweep_resumes(tmp_path):
+    complete = str(tmp_path / 'complete')
+    resumed = str(tmp_path / 'resumed')
+    run_sweep("AA", "KK", complete, num_simulations=10, seed=2)
+
+    def interrupt(done, total):
+        if done >= 100:
+            raise Interrupted
+
+    with pytest.raises(Interrupted):
+        run_sweep("AA", "KK", resumed, num_simulations=10, seed=2, progress=interrupt)
+    assert 100 <= len(load_sweep(resumed)[1]) < 1755
+
+    progress = []
+    assert run_sweep("AA", "KK", resumed, num_simulations=10, seed=2,
+                     progress=lambda done, total: progress.append(done)) == 1755
+    assert progress[0] > 100
+    assert load_sweep(resumed) == load_sweep(complete)
+
+    # Resuming with other arguments would mix two sweeps in one table
+    with pytest.raises(ValueError):
+        run_sweep("AA", "KK", resumed, num_simulations=20, seed=2)
@@ -0,0 +1,55 @@
+"""All-in EV of parsed hands splits the side pots among their eligible players."""
+import pytest
+
+from pypoker.analysis_tools.hand_history import all_in_equities, expected_collected, parse_hand, side_pots
+from pypoker.analysis_tools.range_vs_range_equity import EquityCalculator
+
+# A short stack all-in preflop with two callers who get all-in on the flop, after a fourth player folded
+SIDE_POT_HAND = """PokerStars Hand #7:  Hold'em No Limit ($0.01/$0.02 USD) - 2020/01/01 12:00:00 ET
+Table 'Alpha' 6-max Seat #1 is the button
+Seat 1: shorty ($0.50 in chips)
+Seat 2: big ($3.00 in chips)
+Seat 3: deep ($3.00 in chips)
+Seat 4: folder ($3.00 in chips)
+big: posts small blind $0.01
+deep: posts big blind $0.02
+*** HOLE CARDS ***
+folder: raises $0.08 to $0.10
+shorty: raises $0.40 to $0.50 and is all-in
+big: calls $0.49
+deep: calls $0.48
+folder: folds
+*** FLOP *** [2c 7d Th]
+big: bets $2.50 and is all-in
+deep: calls $2.50 and is all-in
+*** TURN *** [2c 7d Th] [Js]
+*** RIVER *** [2c 7d Th Js] [3s]
+*** SHOW DOWN ***
+shorty: shows [Ah Ad] (a pair of Aces)
+big: shows [7h 7c] (three of a kind, Sevens)
+deep: shows [Kh Qh] (high card King)
+big collected $1.55 from main pot
+big collected $5.00 from side pot
+*** SUMMARY ***
+Total pot $6.60 | Rake $0.05
+Board [2c 7d Th Js 3s]
+"""
+
+
+def test_side_pots_follow_contribution_levels():
+    hand = parse_hand(SIDE_POT_HAND)
+    assert hand.all_in_street == 1
+    assert side_pots(hand) == [(pytest.approx(1.6), [0, 1, 2]), (pytest.approx(5.0), [1, 2])]
+
+
+def test_expected_collected_splits_each_pot_among_its_players():
+    hand = parse_hand(SIDE_POT_HAND)
+    calculator = EquityCalculator(seed=1)
+    equities = all_in_equities(hand, calculator, 20000)
+    expected = expected_collected(hand, equities, calculator, 20000)
+    side_equities = calculator.calculate_equity(['7h7c', 'KhQh'], '2c7dTh', 20000)
+    paid_out = sum(hand.collected) / sum(hand.invested)
+    assert sum(expected.values()) == pytest.approx(sum(hand.collected))
+    # The short stack only shares in the main pot
+    assert expected[0] == pytest.approx(1.6 * paid_out * equities[0])
+    assert expected[2] == pytest.approx(paid_out * (1.6 * equities[2] + 5.0 * side_equities['range2'] / 100))
@@ -0,0 +1,20 @@
+"""CFR on Kuhn poker converges to the known equilibrium value of -1/18."""
+import pytest
+
+pytest.importorskip('numpy')
+
+from pypoker.poker_bot.cfr_kuhn_poker import GAME_VALUE, KuhnSolver, exploitability, game_value
+
+
+@pytest.mark.parametrize('variant', KuhnSolver.VARIANTS)
+def test_average_strategy_reaches_game_value(variant):
+    solver = KuhnSolver(variant)
+    solver.solve(1000)
+    strategy = solver.average_strategy()
+    assert GAME_VALUE == pytest.approx(-1 / 18)
+    assert game_value(strategy) == pytest.approx(-1 / 18, abs=2e-3)
+    assert 0 <= exploitability(strategy) < 2e-3
+
+
+def test_uniform_strategy_is_exploitable():
+    assert exploitability(KuhnSolver().average_strategy()) == pytest.approx(0.458, abs=1e-3)
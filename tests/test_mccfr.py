@@ -0,0 +1,49 @@
+"""MCCFR checkpoints resume to the same tables as an uninterrupted run, even after a crash mid-merge."""
+import os
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from pypoker.poker_bot.mccfr_limit_holdem import JOURNAL_FILENAME, MCCFRTrainer
+
+OPTIONS = dict(flop_buckets=3, turn_buckets=3, river_buckets=3, hs_samples=10, seed=5)
+
+
+def test_resume_matches_uninterrupted_run(tmp_path):
+    uninterrupted = MCCFRTrainer(str(tmp_path / 'a'), **OPTIONS)
+    uninterrupted.train(40, iterations_per_job=20)
+    MCCFRTrainer(str(tmp_path / 'b'), **OPTIONS).train(20, iterations_per_job=20)
+    resumed = MCCFRTrainer(str(tmp_path / 'b'), **OPTIONS)
+    assert resumed.iterations == 20
+    resumed.train(20, iterations_per_job=20)
+    assert np.array_equal(uninterrupted.regrets, resumed.regrets)
+    assert np.array_equal(uninterrupted.strategy_sum, resumed.strategy_sum)
+
+
+def test_merge_interrupted_before_commit_is_undone(tmp_path, monkeypatch):
+    uninterrupted = MCCFRTrainer(str(tmp_path / 'a'), **OPTIONS)
+    uninterrupted.train(40, iterations_per_job=20)
+    path = str(tmp_path / 'b')
+    trainer = MCCFRTrainer(path, **OPTIONS)
+    trainer.train(20, iterations_per_job=20)
+
+    def crash(self):
+        # The increments reach the table files, but meta.json is never committed
+        self.regrets.flush()
+        self.strategy_sum.flush()
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(MCCFRTrainer, 'checkpoint', crash)
+    with pytest.raises(KeyboardInterrupt):
+        trainer.train(20, iterations_per_job=20)
+    monkeypatch.undo()
+    del trainer
+    assert os.path.exists(os.path.join(path, JOURNAL_FILENAME))
+
+    resumed = MCCFRTrainer(path, **OPTIONS)
+    assert resumed.iterations == 20
+    assert not os.path.exists(os.path.join(path, JOURNAL_FILENAME))
+    resumed.train(20, iterations_per_job=20)
+    assert np.array_equal(uninterrupted.regrets, resumed.regrets)
+    assert np.array_equal(uninterrupted.strategy_sum, resumed.strategy_sum)
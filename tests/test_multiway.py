@@ -0,0 +1,70 @@
+"""Multiway equity, split pots included, against brute-force enumeration of every deal."""
+import random
+from itertools import product
+
+import pytest
+
+from pypoker.utils import Hand
+from pypoker.analysis_tools.lookup_tables import evaluate_ids
+from pypoker.analysis_tools.range_parser import RangeParser
+from pypoker.analysis_tools.range_vs_range_equity import EquityCalculator, simulate_multiway_python
+
+# On this turn any ten makes Broadway, so pots are often split two or three ways
+RANGES = ["TT, AK", "T9s, 99", "AK, T8o"]
+BOARD = "AhKdQcJs"
+
+
+def brute_force_multiway(ranges, board):
+    """Pot shares (percent, split pots divided equally) and split pot percentage over every deal and river."""
+    board_ids = Hand.from_string(board).ids
+    combinations_ = [RangeParser.generate_combination_ids(notation, Hand.from_string(board).mask)
+                     for notation in ranges]
+    shares = [0.0] * len(ranges)
+    ties = total = 0
+    for hands in product(*combinations_):
+        used = 0
+        for _, _, mask in hands:
+            if mask & used:
+                break
+            used |= mask
+        else:
+            for river in range(52):
+                if river in board_ids or used >> river & 1:
+                    continue
+                strengths = [evaluate_ids(board_ids + [river, card_a, card_b]) for card_a, card_b, _ in hands]
+                winners = [player for player, strength in enumerate(strengths) if strength == max(strengths)]
+                for player in winners:
+                    shares[player] += 1 / len(winners)
+                ties += len(winners) > 1
+                total += 1
+    return [share / total * 100 for share in shares], ties / total * 100
+
+
+def test_reference_has_split_pots():
+    shares, ties = brute_force_multiway(RANGES, BOARD)
+    assert sum(shares) == pytest.approx(100)
+    assert ties > 10
+
+
+@pytest.mark.parametrize('backend', ['python', 'numpy'])
+def test_multiway_equity_matches_brute_force(backend):
+    if backend == 'numpy':
+        pytest.importorskip('numpy')
+    shares, ties = brute_force_multiway(RANGES, BOARD)
+    result = EquityCalculator(backend=backend, seed=2, cache_size=0).calculate_equity(RANGES, BOARD, 40000)
+    tolerance = 4 * 50 / result['simulations'] ** 0.5
+    for player, share in enumerate(shares, start=1):
+        assert abs(result[f'range{player}'] - share) < tolerance
+    assert abs(result['ties'] - ties) < tolerance
+
+
+def test_python_multiway_loop_matches_brute_force():
+    shares, ties = brute_force_multiway(RANGES, BOARD)
+    board = Hand.from_string(BOARD)
+    combinations_ = [RangeParser.generate_combination_ids(notation, board.mask) for notation in RANGES]
+    *simulated, simulated_ties, valid = simulate_multiway_python(combinations_, board.ids, 40000, random.Random(3))
+    assert valid == 40000
+    tolerance = 4 * 50 / valid ** 0.5
+    for share, simulated_share in zip(shares, simulated):
+        assert abs(simulated_share / valid * 100 - share) < tolerance
+    assert abs(simulated_ties / valid * 100 - ties) < tolerance
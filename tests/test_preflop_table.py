@@ -0,0 +1,85 @@
+"""Preflop table loading, class pair weights and the queries the table is allowed to answer."""
+import os
+from collections import Counter
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from pypoker.analysis_tools.preflop_table import (NUM_CLASSES, PreflopEquityTable, hand_class_index,
+                                                  is_class_union)
+from pypoker.analysis_tools.range_parser import Range, RangeParser
+from pypoker.analysis_tools.range_vs_range_equity import EquityCalculator
+
+
+def constant_table(equity):
+    data = np.zeros((3, NUM_CLASSES, NUM_CLASSES), dtype=np.float32)
+    data[0] = equity
+    data[2] = 1
+    return PreflopEquityTable(data)
+
+
+@pytest.mark.parametrize("range1, range2", [
+    ("AA, AKs, KK", "AK, QQ, AQs"),
+    ("AA:0.5, AKo, 72o", "AK:0.25, AA, 27s"),
+])
+def test_pair_weights_match_brute_force(range1, range2):
+    combinations1 = RangeParser.generate_combination_ids(range1)
+    combinations2 = RangeParser.generate_combination_ids(range2)
+    weights1 = Range.parse(range1).combination_weights() or [1.0] * len(combinations1)
+    weights2 = Range.parse(range2).combination_weights() or [1.0] * len(combinations2)
+    expected = Counter()
+    for (card1a, card1b, mask1), weight1 in zip(combinations1, weights1):
+        for (card2a, card2b, mask2), weight2 in zip(combinations2, weights2):
+            if not mask1 & mask2:
+                expected[hand_class_index(card1a, card1b), hand_class_index(card2a, card2b)] += weight1 * weight2
+
+    weights = constant_table(0.5).pair_weights(combinations1, combinations2, weights1, weights2)
+    actual = {(int(row), int(col)): weights[row, col] for row, col in zip(*np.nonzero(weights))}
+    assert actual.keys() == expected.keys()
+    for pair, weight in expected.items():
+        assert actual[pair] == pytest.approx(weight)
+
+
+@pytest.mark.parametrize("notation, expected", [
+    ("QQ+, AKs", True),
+    ("AA:0.5, KK:0.5", True),
+    ("AhKh", False),
+    ("AKs:0.5, QQ", False),
+    ("AhAd, AhAc, AhAs, AdAc, AdAs", False),
+])
+def test_is_class_union(notation, expected):
+    combinations = RangeParser.generate_combination_ids(notation)
+    assert is_class_union(combinations, Range.parse(notation).combination_weights()) is expected
+
+
+def test_only_class_unions_are_looked_up():
+    calculator = EquityCalculator(seed=3, preflop_table=constant_table(0.9), cache_size=0)
+    assert calculator.calculate_preflop_equity("AA", "KK")['range1'] == pytest.approx(90)
+    # A single combination is simulated: AA wins about 82% against KK, never exactly the table's 90%
+    simulated = calculator.calculate_preflop_equity("AhAd", "KK", 2000)
+    assert simulated['simulations'] == 2000
+    assert simulated['range1'] != pytest.approx(90)
+
+
+def test_invalid_table_files_are_ignored_in_auto_mode(tmp_path, monkeypatch):
+    monkeypatch.setenv('PYPOKER_CACHE_DIR', str(tmp_path))
+    path = PreflopEquityTable.default_path()
+    assert PreflopEquityTable.load() is None
+
+    for write in (lambda: (tmp_path / os.path.basename(path)).write_bytes(b'not a table'),
+                  lambda: np.save(path, np.zeros((3, 10, 10), dtype=np.float32))):
+        write()
+        assert PreflopEquityTable.load(path) is None
+        calculator = EquityCalculator(seed=1, cache_size=0)
+        assert calculator.preflop_table is None
+        assert calculator.calculate_preflop_equity("AA", "KK", 500)['simulations'] == 500
+        with pytest.raises(ValueError):
+            EquityCalculator(preflop_table=path)
+
+    # A truncated table, as left by an interrupted write
+    constant_table(0.5).save(path)
+    assert PreflopEquityTable.load(path) is not None
+    with open(path, 'r+b') as f:
+        f.truncate(4096)
+    assert PreflopEquityTable.load(path) is None
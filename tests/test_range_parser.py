@@ -0,0 +1,57 @@
+"""Range notation: combination counts of every token form, weights and rejected notation."""
+import pytest
+
+from pypoker.utils import Card
+from pypoker.analysis_tools.range_parser import Range, RangeParser
+
+
+@pytest.mark.parametrize("notation, count", [
+    ("AA", 6),
+    ("AKs", 4),
+    ("AKo", 12),
+    ("AK", 16),
+    ("AhKh", 1),
+    ("TT+", 30),
+    ("ATs+", 16),
+    ("KTo+", 36),
+    ("22-55", 24),
+    ("A2s-A5s", 16),
+    ("A5s-A2s", 16),
+    ("22+, AK, AhKh", 94),
+])
+def test_combination_counts(notation, count):
+    hand_range = Range.parse(notation)
+    assert len(hand_range) == count
+    assert len(RangeParser.generate_combination_ids(notation)) == count
+
+
+def test_dead_cards_remove_combinations():
+    dead_mask = 1 << Card.from_string('Ah').id
+    assert len(RangeParser.generate_combination_ids("AA, AK", dead_mask)) == 3 + 12
+
+
+def test_weights():
+    hand_range = Range.parse("AA:0.5, AKs, AhKh:0.25")
+    ace_hearts, king_hearts = Card.from_string('Ah').id, Card.from_string('Kh').id
+    ace_spades, king_spades = Card.from_string('As').id, Card.from_string('Ks').id
+    assert hand_range.weighted
+    assert hand_range.weight(ace_hearts, king_hearts) == 0.25  # A later token overrides an earlier one
+    assert hand_range.weight(ace_spades, king_spades) == 1
+    assert hand_range.weight(ace_hearts, ace_spades) == 0.5
+    weights = RangeParser.generate_combination_weights(hand_range)
+    assert sorted(weights) == [0.25] + [0.5] * 6 + [1.0] * 3
+
+    # Weight 0 removes combinations and weight 1 is the same as no weight at all
+    assert len(Range.parse("AA, AhAd:0")) == 5
+    assert Range.parse("AA:1, KK") == Range.parse("AA, KK")
+    assert RangeParser.generate_combination_weights("AA:1, KK") is None
+
+
+@pytest.mark.parametrize("notation", [
+    "", ",", " , ", "AA,,KK", "AA,",
+    "AKx", "A", "AKso", "1K", "AAs", "AKs:2", "AKs:-0.5", "AKs:half",
+    "AhAh", "AhXx", "22-AKs", "AKs-AQo", "AKs-QJs", "AKs+-",
+])
+def test_invalid_notation_raises(notation):
+    with pytest.raises(ValueError):
+        Range.parse(notation)
@@ -0,0 +1,55 @@
+"""Equity by next card and runout distributions against the overall equity and brute-force enumeration."""
+import pytest
+
+from benchmarks.benchmark_suite import brute_force_equity
+from pypoker.analysis_tools.range_vs_range_equity import EquityCalculator
+
+RANGE1 = "AA:0.1, KK"
+RANGE2 = "AKs, QQ"
+FLOP = "Ah7d2c"
+
+
+def test_equity_by_next_card_matches_brute_force():
+    calculator = EquityCalculator(preflop_table=None)
+    by_card = calculator.equity_by_next_card(RANGE1, RANGE2, FLOP)
+    assert len(by_card) == 49
+    assert 'Ah' not in by_card
+    for card in ('Kc', 'Qs', '3d'):
+        reference = brute_force_equity(RANGE1, RANGE2, FLOP + card)
+        for key in ('range1', 'range2', 'ties'):
+            assert by_card[card][key] == pytest.approx(reference[key], abs=1e-9)
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_reports_average_to_the_overall_equity(workers):
+    with EquityCalculator(preflop_table=None, workers=workers) as calculator:
+        overall = calculator.calculate_flop_equity(RANGE1, RANGE2, FLOP, exact=True)
+        by_card = calculator.equity_by_next_card(RANGE1, RANGE2, FLOP)
+        distribution = calculator.runout_distribution(RANGE1, RANGE2, FLOP)
+    # Each next card counts in proportion to the weight of the outcomes behind it
+    total = sum(result['simulations'] for result in by_card.values())
+    mean = sum(result['range1'] * result['simulations'] for result in by_card.values()) / total
+    assert mean == pytest.approx(overall['range1'])
+    assert overall['range1'] == pytest.approx(75.27504342790822)
+
+    assert distribution['equity'] == pytest.approx(overall['range1'])
+    assert distribution['runouts'] == 49 * 48 // 2
+    assert sum(distribution['histogram']) == pytest.approx(100)
+    percentiles = [distribution['percentiles'][p] for p in (10, 25, 50, 75, 90)]
+    assert percentiles == sorted(percentiles)
+    assert distribution['worst'][1] <= percentiles[0] <= percentiles[-1] <= distribution['best'][1]
+
+
+def test_runout_distribution_of_a_turn():
+    distribution = EquityCalculator(preflop_table=None).runout_distribution(RANGE1, RANGE2, FLOP + "Kc", bins=4)
+    assert distribution['runouts'] == 48
+    assert len(distribution['histogram']) == 4
+    assert distribution['equity'] == pytest.approx(brute_force_equity(RANGE1, RANGE2, FLOP + "Kc")['range1'])
+
+
+def test_reports_need_a_flop_or_turn():
+    calculator = EquityCalculator(preflop_table=None)
+    with pytest.raises(ValueError):
+        calculator.equity_by_next_card(RANGE1, RANGE2, "")
+    with pytest.raises(ValueError):
+        calculator.runout_distribution(RANGE1, RANGE2, "Ah7d2c5s9h")
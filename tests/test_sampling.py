@@ -0,0 +1,113 @@
+"""The samplers draw every compatible pair of combinations, and every runout, with the right probability."""
+import random
+from collections import Counter
+
+import pytest
+
+from pypoker.analysis_tools.range_parser import Range, RangeParser
+from pypoker.analysis_tools.sampling import ComboPairSampler, RunoutDealer, WeightedPairSampler
+
+# Overlapping ranges with different weights, so blocked pairs and uneven weights both matter
+RANGE1 = "AA:0.3, AKs, KK"
+RANGE2 = "AK:0.5, AA, QQ:0.2"
+DRAWS = 60000
+
+
+def weighted_ranges():
+    combinations1 = RangeParser.generate_combination_ids(RANGE1)
+    combinations2 = RangeParser.generate_combination_ids(RANGE2)
+    weights1 = Range.parse(RANGE1).combination_weights()
+    weights2 = Range.parse(RANGE2).combination_weights()
+    return combinations1, combinations2, weights1, weights2
+
+
+def expected_frequencies(combinations1, combinations2, weights1, weights2):
+    """Probability of each compatible (range1 index, range2 index) pair, in proportion to weight1 * weight2."""
+    weights = {(i, j): weight1 * weight2
+               for i, (combo1, weight1) in enumerate(zip(combinations1, weights1))
+               for j, (combo2, weight2) in enumerate(zip(combinations2, weights2))
+               if not combo1[2] & combo2[2]}
+    total = sum(weights.values())
+    return {pair: weight / total for pair, weight in weights.items()}
+
+
+def assert_matches(counts, expected, draws):
+    """Chi-square test of the drawn pair counts against the expected probabilities, far in the tail."""
+    assert set(counts) <= set(expected)
+    chi_square = sum((counts.get(pair, 0) - draws * p) ** 2 / (draws * p) for pair, p in expected.items())
+    degrees = len(expected) - 1
+    assert chi_square < degrees + 6 * (2 * degrees) ** 0.5
+
+
+def test_weighted_pair_sampler_matches_weight_products():
+    combinations1, combinations2, weights1, weights2 = weighted_ranges()
+    sampler = WeightedPairSampler(combinations1, combinations2, weights1, weights2)
+    index1 = {combo: i for i, combo in enumerate(combinations1)}
+    index2 = {combo: j for j, combo in enumerate(combinations2)}
+    rng = random.Random(5)
+    counts = Counter()
+    for _ in range(DRAWS):
+        combo1, combo2 = sampler.sample(rng.random)
+        assert not combo1[2] & combo2[2]
+        counts[index1[combo1], index2[combo2]] += 1
+    assert_matches(counts, expected_frequencies(*weighted_ranges()), DRAWS)
+
+
+def test_numpy_weighted_pairs_match_weight_products():
+    np = pytest.importorskip("numpy")
+    from pypoker.analysis_tools import numpy_backend
+
+    combinations1, combinations2, weights1, weights2 = weighted_ranges()
+    _, masks1 = numpy_backend.combination_arrays(combinations1)
+    _, masks2 = numpy_backend.combination_arrays(combinations2)
+    table = numpy_backend.weighted_pair_table(masks1, masks2, weights1, weights2)
+    index1, index2 = numpy_backend.weighted_pairs(np.random.default_rng(5), DRAWS, table)
+    assert not np.any(masks1[index1] & masks2[index2])
+    counts = Counter(zip(index1.tolist(), index2.tolist()))
+    assert_matches(counts, expected_frequencies(*weighted_ranges()), DRAWS)
+
+
+def test_weighted_pair_sampler_without_compatible_pairs():
+    combinations = RangeParser.generate_combination_ids("AhAd")
+    sampler = WeightedPairSampler(combinations, combinations, [0.5], [1.0])
+    assert sampler.total_weight == 0
+
+
+def test_combo_pair_sampler_indexes_every_compatible_pair_once():
+    combinations1 = RangeParser.generate_combination_ids("AA, AK, KQs")
+    combinations2 = RangeParser.generate_combination_ids("AK, KK, AhQh")
+    sampler = ComboPairSampler(combinations1, combinations2)
+    expected = {(i, j) for i, combo1 in enumerate(combinations1) for j, combo2 in enumerate(combinations2)
+                if not combo1[2] & combo2[2]}
+    pairs = [sampler.index_pair(pair_index) for pair_index in range(sampler.num_pairs)]
+    assert sampler.num_pairs == len(expected)
+    assert set(pairs) == expected
+
+
+def test_combo_pair_sampler_is_uniform_over_compatible_pairs():
+    combinations1 = RangeParser.generate_combination_ids(RANGE1)
+    combinations2 = RangeParser.generate_combination_ids(RANGE2)
+    sampler = ComboPairSampler(combinations1, combinations2)
+    index1 = {combo: i for i, combo in enumerate(combinations1)}
+    index2 = {combo: j for j, combo in enumerate(combinations2)}
+    rng = random.Random(7)
+    counts = Counter()
+    for _ in range(DRAWS):
+        combo1, combo2 = sampler.sample(rng.random)
+        counts[index1[combo1], index2[combo2]] += 1
+    unweighted = [1.0] * len(combinations1), [1.0] * len(combinations2)
+    assert_matches(counts, expected_frequencies(combinations1, combinations2, *unweighted), DRAWS)
+
+
+def test_runout_dealer_never_deals_dead_cards():
+    live_deck = list(range(3, 52))
+    dealer = RunoutDealer(live_deck, 2)
+    rng = random.Random(3)
+    counts = Counter()
+    for _ in range(20000):
+        runout = dealer.deal(rng.random, (10, 20, 30, 40))
+        assert len(set(runout)) == 2 and not set(runout) & {0, 1, 2, 10, 20, 30, 40}
+        counts.update(runout)
+    # 45 cards can be dealt, each in 2 / 45 of the deals
+    assert len(counts) == 45
+    assert max(abs(count - 20000 * 2 / 45) for count in counts.values()) < 150
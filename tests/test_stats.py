@@ -0,0 +1,83 @@
+"""Query statistics: phase timings, sample, evaluation and cache counters and hand categories."""
+import logging
+
+import pytest
+
+from pypoker.analysis_tools.range_vs_range_equity import EquityCalculator
+from pypoker.analysis_tools.stats import HAND_CATEGORIES, QueryStats, logging_hook
+
+
+@pytest.mark.parametrize('backend', ['python', 'numpy'])
+def test_heads_up_simulation_counters(backend):
+    if backend == 'numpy':
+        pytest.importorskip("numpy")
+    calculator = EquityCalculator(backend=backend, seed=1, stats=True, preflop_table=None)
+    result = calculator.calculate_flop_equity("AA:0.5, KK", "QQ+, AKs", "Ah7d2c", 1000, exact=False)
+    stats = result['stats']
+    assert stats == calculator.last_stats
+    assert {'expand_ranges', 'canonicalize', 'cache_lookup', 'simulate'} <= stats['phases'].keys()
+    counters = stats['counters']
+    # Both pair samplers are rejection-free, weighted or not
+    assert counters['samples_drawn'] == counters['samples_accepted'] == 1000
+    assert counters['samples_rejected'] == 0
+    assert counters['evaluations'] == sum(stats['categories'].values()) == 2000
+    assert counters['cache_misses'] == 1
+    assert sum(stats['category_frequencies'].values()) == pytest.approx(1)
+    assert list(stats['categories']) == list(HAND_CATEGORIES)
+
+    repeated = calculator.calculate_flop_equity("AA:0.5, KK", "QQ+, AKs", "Ah7d2c", 1000, exact=False)
+    assert repeated['stats']['counters']['cache_hits'] == 1
+    assert repeated['stats']['counters']['cache_hit_rate'] == 1
+    assert 'simulate' not in repeated['stats']['phases']
+
+
+@pytest.mark.parametrize('backend', ['python', 'numpy'])
+def test_multiway_rejections_are_counted(backend):
+    if backend == 'numpy':
+        pytest.importorskip("numpy")
+    calculator = EquityCalculator(backend=backend, seed=2, stats=True, preflop_table=None)
+    counters = calculator.calculate_equity(["AK", "AQ", "KQ"], "2c7d9h", 500)['stats']['counters']
+    # Many deals of these ranges share an ace, a king or a queen and are dealt again
+    assert counters['samples_accepted'] == 500
+    assert counters['samples_drawn'] > 1.5 * counters['samples_accepted']
+    assert counters['samples_rejected'] == counters['samples_drawn'] - counters['samples_accepted']
+    assert counters['evaluations'] == 3 * 500
+
+
+def test_exact_queries_count_runouts():
+    calculator = EquityCalculator(stats=True, preflop_table=None)
+    stats = calculator.calculate_flop_equity("AA", "KK", "Ah7d2c", exact=True)['stats']
+    assert stats['counters']['runouts'] == 49 * 48 // 2
+    assert 'enumerate' in stats['phases']
+
+
+def test_stats_are_off_by_default_and_hooks_receive_them(caplog):
+    calculator = EquityCalculator(seed=1, preflop_table=None)
+    assert 'stats' not in calculator.calculate_flop_equity("AA", "KK", "Ah7d2c", 200, exact=False)
+    assert calculator.last_stats is None
+
+    received = []
+    calculator = EquityCalculator(seed=1, preflop_table=None, stats_hook=received.append)
+    result = calculator.calculate_flop_equity("AA", "KK", "Ah7d2c", 200, exact=False)
+    assert received == [result['stats']]
+
+    with caplog.at_level(logging.INFO, logger='pypoker.stats'):
+        EquityCalculator(seed=1, preflop_table=None, stats_hook=logging_hook()).calculate_flop_equity(
+            "AA", "KK", "Ah7d2c", 200, exact=False)
+    assert "samples_drawn" in caplog.text
+
+
+def test_query_stats_derived_counters():
+    stats = QueryStats()
+    totals = stats.worker_counts((10, 5, 1, 16, 0.5, 20, 16, 32) + (32,) + (0,) * 9, 4)
+    assert totals == (10, 5, 1, 16)
+    stats.add('cache_hits')
+    stats.add('cache_misses', 3)
+    with stats.phase('simulate'):
+        pass
+    result = stats.as_dict()
+    assert result['counters']['samples_rejected'] == 4
+    assert result['counters']['cache_hit_rate'] == 0.25
+    assert result['categories']['High Card'] == 32
+    assert result['category_frequencies']['High Card'] == 1
+    assert result['phases']['simulate'] >= 0